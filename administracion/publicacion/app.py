@@ -2,18 +2,34 @@ from __future__ import annotations
 
 import html
 import hmac
+import json
 import os
 import re
 import secrets
+import sys
+import time
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Iterator, Optional, Tuple
 from urllib.parse import quote
 
 from flask import Flask, Response, abort, redirect, request, send_file, url_for
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
+# log_archive.py está en la raíz del proyecto (lectura de los logs archivados .gz)
+_ROOT = str(Path(__file__).resolve().parents[2])
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+import log_archive  # noqa: E402
+
+try:
+    from . import log_bisect, log_index, log_search  # administracion.publicacion.app (waitress)
+except ImportError:
+    import log_bisect  # python administracion/publicacion/app.py
+    import log_index
+    import log_search
+
 
 # =========================
 # Config mínima (hardcode)
@@ -31,9 +47,34 @@ LOGS_DIR = (BASE_DIR / "logs").resolve()
 MAX_TAIL_LINES = 20000
 MAX_TAIL_BYTES = 2_000_000  # ~2MB del final del archivo
 
+# Seguimiento en vivo (SSE): cada cuánto se mira el tamaño del archivo, keepalive, duración
+# máxima de una conexión (el navegador reconecta solo con Last-Event-ID) y bytes por lectura
+STREAM_POLL_SECONDS = 0.5
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = 600
+STREAM_MAX_CHUNK = 256 * 1024
+
 # Extensiones permitidas (podés ampliar)
 ALLOWED_EXTS = {".log", ".txt"}
 
+# Índices equipo → offsets de cada log (ver log_index.py); carpeta oculta, no se lista
+INDEX_DIR = LOGS_DIR / ".index"
+# Días hacia atrás que se pueden consultar juntos por equipo
+MAX_DEVICE_DAYS = 31
+
+# Logs diarios: prefijo + fecha + extensión (para buscar un equipo en días anteriores);
+# los de días anteriores pueden estar archivados como `<nombre>.gz` (log_archive.py)
+_DAILY_SERIES = (
+    ("Reenvios_", "%Y%m%d", ".log"),
+    ("LOG_", "%d%m%y", ".txt"),
+)
+_DAILY_LOG_NAMES = tuple(
+    (re.compile(rf"^({re.escape(prefix)})(\d{{{8 if fmt == '%Y%m%d' else 6}}})({re.escape(ext)})(?:\.gz)?$"), fmt)
+    for prefix, fmt, ext in _DAILY_SERIES
+)
+# Búsqueda en varios días (/search): líneas en la vista HTML (la exportación no tiene límite)
+SEARCH_DEFAULT_LINES = 2000
+
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("TQ_WEB_SECRET", "dev-secret-change-me")
@@ -104,8 +145,16 @@ def _require_auth() -> Optional[Response]:
     return redirect(url_for("login_form", next=nxt))
 
 
+def _log_ext(name: str) -> str:
+    """Extensión del log (la del original si es un `.gz` archivado)."""
+    name = name.lower()
+    if name.endswith(log_archive.ARCHIVE_SUFFIX):
+        name = name[: -len(log_archive.ARCHIVE_SUFFIX)]
+    return os.path.splitext(name)[1]
+
+
 def _is_allowed_file(p: Path) -> bool:
-    if p.suffix.lower() not in ALLOWED_EXTS:
+    if _log_ext(p.name) not in ALLOWED_EXTS:
         return False
     try:
         # Asegura que p esté dentro de LOGS_DIR (anti path traversal)
@@ -122,7 +171,7 @@ def _list_logs() -> list[LogFile]:
     for entry in LOGS_DIR.iterdir():
         if not entry.is_file():
             continue
-        if entry.suffix.lower() not in ALLOWED_EXTS:
+        if _log_ext(entry.name) not in ALLOWED_EXTS:
             continue
         try:
             st = entry.stat()
@@ -141,9 +190,9 @@ def _list_logs() -> list[LogFile]:
 
 
 def _tail_bytes(path: Path, max_bytes: int) -> bytes:
-    size = path.stat().st_size
+    size = log_archive.log_size(path)
     read_size = min(size, max_bytes)
-    with path.open("rb") as f:
+    with log_archive.open_log(path) as f:
         if read_size < size:
             f.seek(size - read_size)
         return f.read()
@@ -158,7 +207,7 @@ def _tail_lines_text(path: Path, lines: int) -> str:
     text = text.replace("\r\n", "\n").replace("\r", "\n")
     parts = text.split("\n")
     # Si leímos un chunk parcial, la primera línea puede estar cortada.
-    if len(parts) > 1 and path.stat().st_size > len(data):
+    if len(parts) > 1 and log_archive.log_size(path) > len(data):
         parts = parts[1:]
     tail = parts[-lines:]
     return "\n".join(tail)
@@ -181,6 +230,172 @@ def _device_filter_needle(raw: str) -> Optional[str]:
     return s
 
 
+def _device_index_key(raw: str) -> Optional[str]:
+    """ID de equipo a buscar en el índice (solo dígitos); None para búsquedas por texto."""
+    s = (raw or "").strip()
+    return s if re.fullmatch(r"\d+", s) else None
+
+
+def _log_day(p: Path) -> datetime:
+    """Día del log según su nombre (`Reenvios_YYYYMMDD.log`, `LOG_DDMMYY.txt`) o su mtime."""
+    for rx, fmt in _DAILY_LOG_NAMES:
+        m = rx.match(p.name)
+        if m:
+            try:
+                return datetime.strptime(m.group(2), fmt)
+            except ValueError:
+                break
+    return datetime.fromtimestamp(p.stat().st_mtime).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _parse_when(raw: str, day: datetime) -> Optional[datetime]:
+    """`HH:MM[:SS]` (en el día del log) o `YYYY-MM-DD HH:MM[:SS]` / `YYYY-MM-DDTHH:MM`."""
+    s = (raw or "").strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M"):
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            t = datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+        return day.replace(hour=t.hour, minute=t.minute, second=t.second)
+    return None
+
+
+def _is_time_only(raw: str) -> bool:
+    """Si `raw` es solo `HH:MM[:SS]` (sin fecha)."""
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            datetime.strptime(raw.strip(), fmt)
+            return True
+        except ValueError:
+            continue
+    return False
+
+
+def _series_file(directory: Path, name: str) -> Optional[Path]:
+    """Log `name` de `directory`, tal cual o ya archivado (`.gz`); None si no existe."""
+    for q in (directory / name, directory / (name + log_archive.ARCHIVE_SUFFIX)):
+        if q.is_file() and _is_allowed_file(q):
+            return q
+    return None
+
+
+def _daily_siblings(p: Path, days: int) -> list[Path]:
+    """`p` y los logs de la misma serie de los `days - 1` días anteriores (más viejo primero)."""
+    if days <= 1:
+        return [p]
+    for rx, fmt in _DAILY_LOG_NAMES:
+        m = rx.match(p.name)
+        if not m:
+            continue
+        try:
+            day = datetime.strptime(m.group(2), fmt)
+        except ValueError:
+            break
+        out = []
+        for back in range(days - 1, 0, -1):
+            q = _series_file(p.parent, f"{m.group(1)}{(day - timedelta(days=back)).strftime(fmt)}{m.group(3)}")
+            if q is not None:
+                out.append(q)
+        out.append(p)
+        return out
+    return [p]
+
+
+def _next_daily_log(p: Path) -> Optional[Path]:
+    """Log del día siguiente de la misma serie (si ya existe)."""
+    for rx, fmt in _DAILY_LOG_NAMES:
+        m = rx.match(p.name)
+        if not m:
+            continue
+        try:
+            day = datetime.strptime(m.group(2), fmt)
+        except ValueError:
+            return None
+        return _series_file(p.parent, f"{m.group(1)}{(day + timedelta(days=1)).strftime(fmt)}{m.group(3)}")
+    return None
+
+
+def _stream_start_offset(p: Path, raw: str) -> int:
+    """Offset inicial: N (absoluto), -N (N bytes antes del final, desde la línea siguiente) o el final."""
+    size = p.stat().st_size
+    try:
+        off = int(raw)
+    except (TypeError, ValueError):
+        return size
+    if off >= 0:
+        return min(off, size)
+    start = max(0, size + off)
+    if start == 0:
+        return 0
+    with p.open("rb") as f:
+        f.seek(start - 1)
+        return start - 1 + len(f.readline())
+
+
+def _follow_log(p: Path, offset: int, device_key: Optional[str], needle: Optional[str]) -> Iterator[str]:
+    """
+    Eventos SSE con las líneas que se agregan a `p` desde `offset` (solo líneas completas).
+    `id` es el offset hasta donde se leyó, así la reconexión (Last-Event-ID) sigue sin huecos.
+    """
+    yield "retry: 3000\n\n"
+    started = last_sent = time.monotonic()
+    try:
+        ino = p.stat().st_ino
+    except OSError:
+        return
+    n = needle.lower() if needle else None
+    while time.monotonic() - started < STREAM_MAX_SECONDS:
+        try:
+            st = p.stat()
+        except OSError:
+            yield "event: gone\ndata: \n\n"
+            return
+        if st.st_ino != ino or st.st_size < offset:
+            # Archivo truncado o reemplazado: se sigue desde el comienzo
+            ino = st.st_ino
+            offset = 0
+            yield "event: reset\nid: 0\ndata: \n\n"
+        if st.st_size > offset:
+            with p.open("rb") as f:
+                f.seek(offset)
+                data = f.read(min(st.st_size - offset, STREAM_MAX_CHUNK))
+            cut = data.rfind(b"\n")
+            if cut < 0 and len(data) >= STREAM_MAX_CHUNK:
+                cut = len(data) - 1  # línea gigante: se corta
+            if cut >= 0:
+                data = data[:cut + 1]
+                offset += len(data)
+                out = []
+                for raw in data.split(b"\n")[:-1]:
+                    if device_key and not log_index.line_has_device(raw, device_key):
+                        continue
+                    line = raw.decode("utf-8", errors="replace").replace("\r", "")
+                    if n and n not in line.lower():
+                        continue
+                    out.append(f"data: {line}\n")
+                if out:
+                    yield f"id: {offset}\n" + "".join(out) + "\n"
+                    last_sent = time.monotonic()
+                if offset < st.st_size:
+                    continue
+        else:
+            nxt = _next_daily_log(p)
+            if nxt is not None:
+                # Cambio de día: el cliente pasa al archivo nuevo
+                yield f"event: rotate\ndata: {nxt.name}\n\n"
+                return
+        if time.monotonic() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+            # Comentario (mantiene viva la conexión) + offset aunque el filtro no dejara líneas
+            yield f"id: {offset}\n: keepalive\n\n"
+            last_sent = time.monotonic()
+        time.sleep(STREAM_POLL_SECONDS)
+
+
 def _filter_lines_by_needle(text: str, needle: str) -> Tuple[str, int, int]:
     """Devuelve (texto_filtrado, líneas_matched, líneas_totales_en_tail)."""
     lines = text.split("\n")
@@ -221,6 +436,8 @@ def _html_page(title: str, body: str) -> str:
       <div class="row" style="margin-top: 6px;">
         <a href="{url_for('logs')}">Logs</a>
         <span class="muted">·</span>
+        <a href="{url_for('search')}">Buscar equipo</a>
+        <span class="muted">·</span>
         <a href="/admin/">Admin reenvíos</a>
         <span class="muted">·</span>
         <a href="{url_for('logout')}">Cerrar sesión</a>
@@ -341,20 +558,103 @@ def view_log(name: str) -> Response:
         n = 400
     n = max(1, min(n, MAX_TAIL_LINES))
     device_raw = (request.args.get("device") or "").strip()
+    try:
+        days = int(request.args.get("days") or "1")
+    except ValueError:
+        days = 1
+    days = max(1, min(days, MAX_DEVICE_DAYS))
+    device_key = _device_index_key(device_raw)
     needle = _device_filter_needle(device_raw)
-
-    text = _tail_lines_text(p, n)
-    total_in_tail = len(text.split("\n")) if text else 0
-    matched = total_in_tail
-    if needle:
-        text, matched, total_in_tail = _filter_lines_by_needle(text, needle)
+    # Rango horario (from/to): bisección por offsets en vez de leer el final del archivo
+    from_raw = (request.args.get("from") or "").strip()
+    to_raw = (request.args.get("to") or "").strip()
+    day = _log_day(p)
+    since = _parse_when(from_raw, day) if from_raw else None
+    until = _parse_when(to_raw, day) if to_raw else None
+    bad_when = [r for r, v in ((from_raw, since), (to_raw, until)) if r and v is None]
+    # Con varios días, HH:MM sería del día del log abierto y no de cada día: se pide la fecha
+    undated_when = [r for r in (from_raw, to_raw) if r and days > 1 and device_key and _is_time_only(r)]
+    if undated_when:
+        since = None if from_raw in undated_when else since
+        until = None if to_raw in undated_when else until
+    time_range = since is not None or until is not None
+    truncated = False
+
+    if device_key:
+        # Índice por equipo: todas las líneas del día (o de varios días), no solo el final
+        files = _daily_siblings(p, days)
+        ranges = {f: log_bisect.byte_range(f, since, until) for f in files} if time_range else None
+        lines, matched = log_index.device_lines(files, device_key, INDEX_DIR, limit=n, byte_ranges=ranges)
+        if time_range:
+            # El rango en bytes incluye un margen de segundos: filtro exacto, también en el total
+            lines = log_bisect.filter_lines(lines, since, until)
+            matched = sum(
+                log_bisect.count_in_range(
+                    f, log_index.get_index(f, INDEX_DIR).offsets(device_key), ranges[f], since, until
+                )
+                for f in files
+            )
+        text = "\n".join(lines)
+        total_in_tail = len(lines)
+    elif time_range:
+        files = [p]
+        lines, truncated = log_bisect.read_range(p, since, until, n)
+        text = "\n".join(lines)
+        total_in_tail = matched = len(lines)
+        if needle:
+            text, matched, total_in_tail = _filter_lines_by_needle(text, needle)
+    else:
+        files = [p]
+        text = _tail_lines_text(p, n)
+        total_in_tail = len(text.split("\n")) if text else 0
+        matched = total_in_tail
+        if needle:
+            text, matched, total_in_tail = _filter_lines_by_needle(text, needle)
 
     safe_name = p.name
+    # En vivo: seguir desde el tamaño actual con el mismo filtro de equipo
+    archived = log_archive.is_archive(p)
+    stream_url = url_for("stream_log", name=safe_name, offset=log_archive.log_size(p), device=device_raw)
+    live_attr = " disabled title='log archivado: ya no cambia'" if archived else ""
     dev_attr = html.escape(device_raw, quote=True)
     lines_attr = html.escape(str(n), quote=True)
+    days_attr = html.escape(str(days), quote=True)
+    from_attr = html.escape(from_raw, quote=True)
+    to_attr = html.escape(to_raw, quote=True)
+    if device_key:
+        base_note = f"Últimas <b>{n}</b> líneas del equipo"
+    elif time_range:
+        base_note = f"Primeras <b>{n}</b> líneas del rango{'; luego filtro por texto' if needle else ''}"
+    else:
+        base_note = f"Base: últimas <b>{n}</b> líneas del archivo{'; luego filtro por texto' if needle else ''}"
     filter_note = ""
-    if needle:
-        filter_note = (
+    if bad_when:
+        filter_note += (
+            f"<div style='color:#b91c1c; margin-top:6px;'>Hora inválida: "
+            f"<code>{_escape_html(', '.join(bad_when))}</code> (use HH:MM[:SS] o YYYY-MM-DD HH:MM[:SS]).</div>"
+        )
+    if undated_when:
+        filter_note += (
+            f"<div style='color:#b91c1c; margin-top:6px;'>Con Días &gt; 1 indique la fecha: "
+            f"<code>{_escape_html(', '.join(undated_when))}</code> no se aplicó (use YYYY-MM-DD HH:MM[:SS]).</div>"
+        )
+    if time_range:
+        desde = since.strftime("%Y-%m-%d %H:%M:%S") if since else "inicio"
+        hasta = until.strftime("%Y-%m-%d %H:%M:%S") if until else "fin"
+        filter_note += (
+            f"<div class='muted' style='margin-top:6px;'>Rango: <code>{desde}</code> → <code>{hasta}</code>"
+            f"{' · <b>cortado</b> en el máximo de líneas' if truncated else ''}</div>"
+        )
+    if device_key:
+        span = f"{len(files)} archivo(s): {files[0].name} … {files[-1].name}" if len(files) > 1 else "todo el archivo"
+        filter_note += (
+            f"<div class='muted' style='margin-top:6px;'>"
+            f"Equipo <code>{_escape_html(device_key)}</code> (índice, {_escape_html(span)}) · "
+            f"<b>{matched}</b> líneas; se muestran las últimas <b>{total_in_tail}</b>."
+            f"</div>"
+        )
+    elif needle:
+        filter_note += (
             f"<div class='muted' style='margin-top:6px;'>"
             f"Filtro equipo: <code>{_escape_html(needle)}</code> · "
             f"<b>{matched}</b> líneas coinciden (sobre <b>{total_in_tail}</b> en el bloque mostrado)."
@@ -364,13 +664,16 @@ def view_log(name: str) -> Response:
     body = f"""
   <div class="row" style="margin-bottom: 10px;">
     <div style="font-weight: 700;"><code>{safe_name}</code></div>
-    <div class="muted">Base: últimas <b>{n}</b> líneas del archivo{'; luego filtro por equipo' if needle else ''}</div>
+    <div class="muted">{base_note}</div>
   </div>
   {filter_note}
   <div class="row" style="margin-bottom: 10px;">
     <a href="{url_for('logs')}">← volver</a>
     <span class="muted">·</span>
     <a href="{url_for('download_log', name=safe_name)}">descargar</a>
+    <span class="muted">·</span>
+    <button type="button" id="live"{live_attr}>En vivo</button>
+    <span class="muted" id="live-status"></span>
   </div>
   <div class="row" style="margin-bottom: 10px;">
     <form method="get" action="{url_for('view_log', name=safe_name)}" class="row">
@@ -378,22 +681,204 @@ def view_log(name: str) -> Response:
       <input name="lines" value="{lines_attr}" style="width: 120px;" />
       <label class="muted">Equipo</label>
       <input name="device" placeholder="ej. 95999" value="{dev_attr}" style="width: 140px;" />
+      <label class="muted">Días</label>
+      <input name="days" value="{days_attr}" style="width: 60px;" />
+      <label class="muted">Desde</label>
+      <input name="from" placeholder="HH:MM" value="{from_attr}" style="width: 140px;" />
+      <label class="muted">Hasta</label>
+      <input name="to" placeholder="HH:MM" value="{to_attr}" style="width: 140px;" />
       <button type="submit">Aplicar</button>
-      <span class="muted">máx {MAX_TAIL_LINES} líneas · si Equipo son solo dígitos se busca <code>device_id=…</code></span>
+      <span class="muted">máx {MAX_TAIL_LINES} líneas · si Equipo son solo dígitos se buscan sus líneas en todo el archivo (y en los días anteriores según Días); si no, se filtra el final del archivo por texto · Desde/Hasta: HH:MM[:SS] del día del log o YYYY-MM-DD HH:MM (con Días &gt; 1, solo con fecha)</span>
     </form>
   </div>
-  <pre>{_escape_html(text)}</pre>
+  <pre id="log">{_escape_html(text)}</pre>
+  <script>
+    (function () {{
+      var btn = document.getElementById("live"), status = document.getElementById("live-status");
+      var pre = document.getElementById("log"), es = null;
+      function stop(msg) {{ if (es) {{ es.close(); es = null; }} btn.textContent = "En vivo"; status.textContent = msg || ""; }}
+      btn.onclick = function () {{
+        if (es) {{ stop(); return; }}
+        es = new EventSource({json.dumps(stream_url)});
+        btn.textContent = "Detener";
+        status.textContent = "siguiendo…";
+        es.onmessage = function (e) {{
+          pre.appendChild(document.createTextNode("\n" + e.data));
+          window.scrollTo(0, document.body.scrollHeight);
+        }};
+        es.addEventListener("rotate", function (e) {{ stop("archivo nuevo: " + e.data); }});
+        es.addEventListener("gone", function () {{ stop("el archivo ya no existe"); }});
+      }};
+    }})();
+  </script>
 """
     return Response(_html_page(f"Ver {safe_name}", body), mimetype="text/html; charset=utf-8")
 
 
+@app.get("/logs/<path:name>/stream")
+def stream_log(name: str) -> Response:
+    """
+    Server-Sent Events con las líneas nuevas del log. Query: `offset` (byte desde donde
+    seguir; -N = últimos N bytes; default: el final) y `device` (mismo filtro que la vista).
+    Al reconectar, el navegador manda Last-Event-ID (offset) y se sigue desde ahí.
+    """
+    p = (LOGS_DIR / name)
+    if not _is_allowed_file(p) or not p.exists() or not p.is_file() or log_archive.is_archive(p):
+        abort(404)
+    device_raw = (request.args.get("device") or "").strip()
+    device_key = _device_index_key(device_raw)
+    needle = None if device_key else _device_filter_needle(device_raw)
+    offset = _stream_start_offset(p, request.headers.get("Last-Event-ID") or request.args.get("offset"))
+    return Response(
+        _follow_log(p, offset, device_key, needle),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _search_files(first: datetime, last: datetime, series: str) -> list[list[str]]:
+    """Logs diarios (tal cual o `.gz`) de cada día de [first, last], del más viejo al más nuevo."""
+    out: list[list[str]] = []
+    day = first
+    while day <= last:
+        files = []
+        for prefix, fmt, ext in _DAILY_SERIES:
+            if series not in ("all", prefix.rstrip("_")):
+                continue
+            q = _series_file(LOGS_DIR, f"{prefix}{day.strftime(fmt)}{ext}")
+            if q is not None:
+                files.append(str(q))
+        if files:
+            out.append(files)
+        day += timedelta(days=1)
+    return out
+
+
+@app.get("/search")
+def search() -> Response:
+    """
+    Equipo (o texto) en los logs de varios días. Query: `device`, `days` (hasta hoy o hasta
+    `to`), `from`/`to` (`YYYY-MM-DD HH:MM[:SS]`, o `HH:MM` de hoy), `series` (all, Reenvios,
+    LOG) y `format`: html (primeras `lines` líneas), csv o zip (todas, en streaming).
+    """
+    device_raw = (request.args.get("device") or "").strip()
+    try:
+        days = int(request.args.get("days") or "7")
+    except ValueError:
+        days = 7
+    days = max(1, min(days, MAX_DEVICE_DAYS))
+    try:
+        n = int(request.args.get("lines") or str(SEARCH_DEFAULT_LINES))
+    except ValueError:
+        n = SEARCH_DEFAULT_LINES
+    n = max(1, min(n, MAX_TAIL_LINES))
+    series = request.args.get("series") or "all"
+    if series not in ("all",) + tuple(prefix.rstrip("_") for prefix, _fmt, _ext in _DAILY_SERIES):
+        series = "all"
+    fmt = request.args.get("format") or "html"
+    from_raw = (request.args.get("from") or "").strip()
+    to_raw = (request.args.get("to") or "").strip()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = _parse_when(from_raw, today) if from_raw else None
+    until = _parse_when(to_raw, today) if to_raw else None
+    bad_when = [r for r, v in ((from_raw, since), (to_raw, until)) if r and v is None]
+
+    last = until.replace(hour=0, minute=0, second=0, microsecond=0) if until else today
+    first = since.replace(hour=0, minute=0, second=0, microsecond=0) if since else last - timedelta(days=days - 1)
+    first = max(first, last - timedelta(days=MAX_DEVICE_DAYS - 1))
+    device_key = _device_index_key(device_raw)
+    needle = None if device_key else (device_raw or None)
+
+    def rows(limit: Optional[int]):
+        files = _search_files(first, last, series)
+        return log_search.run_search(files, device_key, needle, since, until, str(INDEX_DIR), limit)
+
+    if device_raw and not bad_when and fmt in ("csv", "zip"):
+        base = f"busqueda_{re.sub(r'[^A-Za-z0-9_-]+', '_', device_raw)[:40]}_{first:%Y%m%d}_{last:%Y%m%d}"
+        if fmt == "csv":
+            body, mimetype, filename = log_search.csv_chunks(rows(None)), "text/csv; charset=utf-8", base + ".csv"
+        else:
+            body = log_search.zip_chunks(base + ".csv", log_search.csv_chunks(rows(None)))
+            mimetype, filename = "application/zip", base + ".zip"
+        return Response(
+            body,
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={filename}", "X-Accel-Buffering": "no"},
+        )
+
+    dev_attr = html.escape(device_raw, quote=True)
+    options = "".join(
+        f"<option value='{v}'{' selected' if v == series else ''}>{v}</option>"
+        for v in ("all",) + tuple(prefix.rstrip("_") for prefix, _fmt, _ext in _DAILY_SERIES)
+    )
+    form = f"""
+  <div class="row" style="margin-bottom: 10px;">
+    <form method="get" action="{url_for('search')}" class="row">
+      <label class="muted">Equipo</label>
+      <input name="device" placeholder="ej. 95989" value="{dev_attr}" style="width: 140px;" />
+      <label class="muted">Días</label>
+      <input name="days" value="{days}" style="width: 60px;" />
+      <label class="muted">Desde</label>
+      <input name="from" placeholder="YYYY-MM-DD HH:MM" value="{html.escape(from_raw, quote=True)}" style="width: 160px;" />
+      <label class="muted">Hasta</label>
+      <input name="to" placeholder="YYYY-MM-DD HH:MM" value="{html.escape(to_raw, quote=True)}" style="width: 160px;" />
+      <label class="muted">Logs</label>
+      <select name="series">{options}</select>
+      <label class="muted">Líneas</label>
+      <input name="lines" value="{n}" style="width: 80px;" />
+      <button type="submit">Buscar</button>
+      <span class="muted">si Equipo son solo dígitos se usa el índice por equipo; si no, se busca el texto · máx {MAX_DEVICE_DAYS} días · incluye logs archivados (.gz)</span>
+    </form>
+  </div>
+"""
+    if bad_when:
+        form += (
+            f"<div style='color:#b91c1c; margin-bottom:10px;'>Hora inválida: "
+            f"<code>{_escape_html(', '.join(bad_when))}</code> (use YYYY-MM-DD HH:MM[:SS] o HH:MM).</div>"
+        )
+    if not device_raw or bad_when:
+        return Response(_html_page("Buscar", form), mimetype="text/html; charset=utf-8")
+
+    export_args = {k: v for k, v in request.args.items() if k not in ("format", "lines")}
+    form += (
+        f"<div class='row muted' style='margin-bottom: 10px;'>{first:%Y-%m-%d} a {last:%Y-%m-%d} · exportar todo: "
+        f"<a href='{html.escape(url_for('search', format='csv', **export_args), quote=True)}'>CSV</a> · "
+        f"<a href='{html.escape(url_for('search', format='zip', **export_args), quote=True)}'>ZIP</a></div>"
+    )
+    marker = "\x00resultados\x00"
+    head, tail = _html_page(f"Buscar {_escape_html(device_raw)}", form + marker).split(marker, 1)
+
+    def generate() -> Iterator[str]:
+        # Las líneas se envían a medida que termina cada día (sin armar la página entera)
+        yield head + "<pre id='log'>"
+        count = 0
+        more = False
+        batch: list[str] = []
+        for _ts, name, line in rows(n + 1):
+            if count >= n:
+                more = True
+                break
+            count += 1
+            batch.append(f"<span class='muted'>{name}</span> {_escape_html(line)}\n")
+            if len(batch) >= 200:
+                yield "".join(batch)
+                batch = []
+        yield "".join(batch) + "</pre>"
+        note = " (hay más: exportar para ver todo)" if more else ""
+        yield f"<div class='muted'><b>{count}</b> líneas{note}.</div>" + tail
+
+    return Response(generate(), mimetype="text/html; charset=utf-8", headers={"X-Accel-Buffering": "no"})
+
+
 @app.get("/download/<path:name>")
 def download_log(name: str):
     p = (LOGS_DIR / name)
     if not _is_allowed_file(p) or not p.exists() or not p.is_file():
         abort(404)
-    # send_file maneja streaming; as_attachment fuerza descarga
-    return send_file(p, as_attachment=True, download_name=p.name)
+    # send_file maneja streaming; as_attachment fuerza descarga.
+    # conditional: ETag/Last-Modified (304 si no cambió) y Range (206 con lo pedido), así un
+    # tablero puede pedir solo lo agregado con `Range: bytes=<offset>-`. max_age=0: revalidar.
+    return send_file(p, as_attachment=True, download_name=p.name, conditional=True, etag=True, max_age=0)
 
 
 def _escape_html(s: str) -> str:
@@ -0,0 +1,197 @@
+"""
+Búsqueda por rango horario en los logs diarios por bisección de offsets.
+
+Cada línea de `LOG_DDMMYY.txt` (`17/10/2026 9:5:3: ...` de guardarLog o
+`2026-10-17 09:05:03 - INFO - ...` del logger) y de `Reenvios_YYYYMMDD.log`
+(`2026-10-17 09:05:03<TAB>...`) empieza con la hora, y los archivos se escriben en orden.
+Para un rango `[desde, hasta]` se busca el offset de la primera línea >= desde saltando a la
+mitad del tramo, descartando la línea cortada y leyendo la primera con hora: O(log tamaño)
+lecturas de pocos KB aunque el archivo tenga varios GB.
+
+Las líneas sin hora (continuación de un mensaje multilínea) siguen a la anterior. Como varios
+procesos escriben el mismo log en lotes, el orden puede tener un desorden de fracciones de
+segundo: la bisección usa un margen de `SLACK` y el filtro final es exacto.
+
+Los logs archivados (`.gz` de log_archive.py) se leen por offsets sin comprimir: cada salto
+descomprime solo el bloque que toca.
+"""
+
+from __future__ import annotations
+
+import bisect
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Callable, List, Optional, Sequence, Tuple
+
+import log_archive
+
+SLACK = timedelta(seconds=2)
+# Debajo de este tamaño de tramo se termina con lectura secuencial
+_PROBE_BYTES = 16 * 1024
+
+_TS_ISO = re.compile(rb"(\d{4})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2}):(\d{2})")
+_TS_DMY = re.compile(rb"(\d{1,2})/(\d{1,2})/(\d{4}) (\d{1,2}):(\d{1,2}):(\d{1,2})")
+
+
+def line_timestamp(line: bytes) -> Optional[datetime]:
+    """Hora al comienzo de la línea (None si no empieza con una)."""
+    m = _TS_ISO.match(line)
+    try:
+        if m:
+            return datetime(*map(int, m.groups()))
+        m = _TS_DMY.match(line)
+        if m:
+            d, mo, y, h, mi, s = map(int, m.groups())
+            return datetime(y, mo, d, h, mi, s)
+    except ValueError:
+        return None
+    return None
+
+
+def _first_stamped_line(f: BinaryIO, mid: int, hi: int) -> Optional[Tuple[int, datetime, int]]:
+    """Primera línea con hora que empieza en [mid, hi): (inicio, hora, fin)."""
+    f.seek(mid)
+    pos = mid
+    if mid > 0:
+        pos += len(f.readline())  # línea cortada por el salto
+    while pos < hi:
+        line = f.readline()
+        if not line:
+            return None
+        ts = line_timestamp(line)
+        if ts is not None:
+            return pos, ts, pos + len(line)
+        pos += len(line)
+    return None
+
+
+def find_offset(f: BinaryIO, size: int, reached: Callable[[datetime], bool]) -> int:
+    """
+    Offset de la primera línea con hora que cumple `reached` (`size` si ninguna). `reached`
+    es monótono: falso al principio del archivo y verdadero desde algún punto.
+    """
+    lo, hi = 0, size
+    # Invariante: lo es inicio de línea y la respuesta está en [lo, hi]
+    while hi - lo > _PROBE_BYTES:
+        mid = (lo + hi) // 2
+        found = _first_stamped_line(f, mid, hi)
+        if found is None:
+            hi = mid
+            continue
+        start, ts, end = found
+        if reached(ts):
+            hi = start
+        else:
+            lo = end
+    f.seek(lo)
+    pos = lo
+    while pos < size:
+        line = f.readline()
+        if not line:
+            break
+        ts = line_timestamp(line)
+        if ts is not None and reached(ts):
+            return pos
+        pos += len(line)
+    return size
+
+
+def byte_range(path: Path, since: Optional[datetime], until: Optional[datetime]) -> Tuple[int, int]:
+    """[inicio, fin) en bytes que contiene todas las líneas con hora en [since, until] (+ margen)."""
+    size = log_archive.log_size(path)
+    with log_archive.open_log(path, _PROBE_BYTES) as f:
+        start = find_offset(f, size, lambda ts: ts >= since - SLACK) if since is not None else 0
+        end = find_offset(f, size, lambda ts: ts > until + SLACK) if until is not None else size
+    return start, max(start, end)
+
+
+def in_range(ts: Optional[datetime], since: Optional[datetime], until: Optional[datetime]) -> bool:
+    return (since is None or ts >= since) and (until is None or ts <= until)
+
+
+def read_range(
+    path: Path, since: Optional[datetime], until: Optional[datetime], limit: int
+) -> Tuple[List[str], bool]:
+    """Líneas con hora en [since, until] (máx `limit`, las primeras) y si se cortó por el límite."""
+    start, end = byte_range(path, since, until)
+    out: List[str] = []
+    keep = False
+    with log_archive.open_log(path) as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            ts = line_timestamp(line)
+            if ts is not None:
+                keep = in_range(ts, since, until)
+            if keep:
+                if len(out) >= limit:
+                    return out, True
+                out.append(line.rstrip(b"\r\n").decode("utf-8", errors="replace"))
+    return out, False
+
+
+def filter_lines(lines: List[str], since: Optional[datetime], until: Optional[datetime]) -> List[str]:
+    """Filtro exacto por hora de líneas ya leídas (las sin hora siguen a la anterior)."""
+    out: List[str] = []
+    keep = False
+    for line in lines:
+        ts = line_timestamp(line.encode("utf-8", errors="replace")[:32])
+        if ts is not None:
+            keep = in_range(ts, since, until)
+        if keep:
+            out.append(line)
+    return out
+
+
+def count_in_range(
+    path: Path,
+    offsets: Sequence[int],
+    rng: Tuple[int, int],
+    since: Optional[datetime],
+    until: Optional[datetime],
+) -> int:
+    """
+    Cuántas de las líneas que empiezan en `offsets` (ordenados, p. ej. las de un equipo según
+    log_index.py) dentro de `rng` (de `byte_range`, con margen) tienen hora en [since, until].
+    Solo se lee la hora de las líneas de los bordes: pasada una línea a más de `SLACK` del
+    borde ya no puede haber líneas fuera de rango.
+    """
+    lo = bisect.bisect_left(offsets, rng[0])
+    hi = bisect.bisect_left(offsets, rng[1])
+    total = hi - lo
+    with log_archive.open_log(path, _PROBE_BYTES) as f:
+
+        def stamp(i: int) -> Optional[datetime]:
+            f.seek(offsets[i])
+            return line_timestamp(f.read(32))
+
+        if since is not None:
+            keep = False
+            while lo < hi:
+                ts = stamp(lo)
+                if ts is not None:
+                    if ts >= since + SLACK and (until is None or ts <= until):
+                        break
+                    keep = in_range(ts, since, until)
+                if not keep:
+                    total -= 1
+                lo += 1
+        if until is not None:
+            pending = 0  # líneas sin hora: siguen a la anterior con hora
+            while hi > lo:
+                ts = stamp(hi - 1)
+                hi -= 1
+                if ts is None:
+                    pending += 1
+                    continue
+                if ts > until:
+                    total -= 1 + pending
+                elif ts <= until - SLACK:
+                    break
+                pending = 0
+    return total
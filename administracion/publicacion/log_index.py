@@ -0,0 +1,318 @@
+"""
+Índice incremental equipo → offsets de línea para los logs diarios (`Reenvios_*.log`,
+`LOG_*.txt`).
+
+La vista de un log leía solo los últimos 2 MB y filtraba por subcadena: un equipo que no
+reportó en el último tramo del día no aparecía. Con el índice, la vista salta directo a las
+líneas del equipo en todo el archivo (o en varios días).
+
+- Claves: `device_id=<ID>` (Reenvios_*.log) y el ID de los paquetes de guardarLogPacket
+  (`<- [TCP, ip, puerto, ID]` en LOG_*.txt). Los IDs de 10 dígitos se indexan también por
+  sus últimos 5 (el ID RPG con el que se busca habitualmente).
+- Sidecar por log en `<logs>/.index/<nombre>.idx`: bloques `largo(4) + marshal` agregados al
+  final; el primero identifica el archivo (inodo + hash del comienzo) y cada uno de los
+  siguientes trae `(desde, hasta, {equipo: offsets})` de los bytes nuevos. Al consultar
+  primero se incorporan los bloques que otros procesos (p. ej. los de /search) agregaron al
+  sidecar y después solo se leen los bytes agregados al log desde entonces (hasta el último
+  salto de línea completo). Si dos procesos indexan el mismo tramo a la vez quedan bloques
+  repetidos: al leer se descarta todo bloque que no empieza donde terminó el anterior.
+- Si el log se truncó o se reemplazó (otro inodo, comienzo distinto, tamaño menor) el índice
+  se rehace.
+- Los logs archivados (`<nombre>.gz`, ver log_archive.py) se indexan y leen por offsets sin
+  comprimir; al archivar un log se borra su índice y el del `.gz` se arma en la primera consulta.
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import marshal
+import os
+import re
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import log_archive
+
+INDEX_VERSION = 2
+# Bytes del comienzo del log con los que se detecta un archivo reemplazado
+_PREFIX_LEN = 256
+# Lectura incremental por bloques (el índice de un log de cientos de MB se arma en partes)
+_READ_CHUNK = 8 * 1024 * 1024
+# Índices en memoria (LRU por archivo)
+_MAX_CACHED = 16
+
+_FRAME = struct.Struct("<I")
+_DEVICE_RE = re.compile(rb"device_id=(\d+)|(?:<-|->) \[(?:TCP|UDP), [^,\]\n]+, \d+, (\d+)\]")
+
+
+def line_has_device(line: bytes, device: str) -> bool:
+    """Si la línea corresponde al equipo (mismas claves que el índice)."""
+    for m in _DEVICE_RE.finditer(line):
+        dev = (m.group(1) or m.group(2)).decode("ascii")
+        if dev == device or (len(dev) == 10 and dev[-5:] == device):
+            return True
+    return False
+
+
+def _prefix_hash(path: Path, length: int) -> str:
+    with log_archive.open_log(path) as f:
+        return hashlib.blake2b(f.read(length), digest_size=16).hexdigest()
+
+
+class LogIndex:
+    """Índice de un log; `update()` incorpora lo agregado desde la última llamada."""
+
+    def __init__(self, log_path: Path, index_path: Optional[Path]):
+        self.log_path = log_path
+        self.index_path = index_path
+        self.upto = 0
+        self.postings: Dict[str, array] = {}
+        self._ident: Optional[dict] = None
+        # Parte del sidecar ya incorporada (inodo, bytes leídos)
+        self._sidecar_ino: Optional[int] = None
+        self._sidecar_pos = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Sidecar
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        """Incorpora los bloques del sidecar que todavía no se leyeron."""
+        if self.index_path is None:
+            return
+        try:
+            with self.index_path.open("rb") as f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != self._sidecar_ino or st.st_size < self._sidecar_pos:
+                    # Sidecar nuevo o rehecho por otro proceso: se relee desde el comienzo
+                    if self._sidecar_ino is not None:
+                        self.upto = 0
+                        self.postings = {}
+                        self._ident = None
+                    self._sidecar_ino = st.st_ino
+                    self._sidecar_pos = 0
+                f.seek(self._sidecar_pos)
+                data = f.read()
+        except OSError:
+            return
+        pos = 0
+        frames = []
+        while pos + _FRAME.size <= len(data):
+            (n,) = _FRAME.unpack_from(data, pos)
+            end = pos + _FRAME.size + n
+            if end > len(data):
+                break  # bloque incompleto (corte a mitad de escritura): se ignora
+            try:
+                frames.append(marshal.loads(data[pos + _FRAME.size:end]))
+            except (EOFError, ValueError, TypeError):
+                break
+            pos = end
+        if self._sidecar_pos == 0:
+            if not frames or not isinstance(frames[0], dict) or frames[0].get("v") != INDEX_VERSION:
+                return
+            self._ident = frames.pop(0)
+        self._sidecar_pos += pos
+        for frame in frames:
+            if not isinstance(frame, tuple) or len(frame) != 3:
+                continue
+            start, upto, chunk = frame
+            if start != self.upto:
+                continue  # tramo ya incorporado (indexado también por otro proceso)
+            self._merge(chunk)
+            self.upto = upto
+
+    def _append_frames(self, objs: Iterable, rewrite: bool = False) -> None:
+        if self.index_path is None:
+            return
+        blob = b"".join(_FRAME.pack(len(m)) + m for m in (marshal.dumps(o) for o in objs))
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            if rewrite:
+                tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+                tmp.write_bytes(blob)
+                os.replace(tmp, self.index_path)
+                self._sidecar_ino = self.index_path.stat().st_ino
+                self._sidecar_pos = len(blob)
+            else:
+                with self.index_path.open("ab") as f:
+                    f.write(blob)
+        except OSError:
+            # Carpeta de solo lectura: el índice queda solo en memoria
+            self.index_path = None
+
+    def _identity(self, st: os.stat_result, size: int) -> dict:
+        plen = min(_PREFIX_LEN, size)
+        return {"v": INDEX_VERSION, "ino": st.st_ino, "plen": plen, "prefix": _prefix_hash(self.log_path, plen)}
+
+    def _still_valid(self, st: os.stat_result, size: int) -> bool:
+        ident = self._ident
+        if ident is None or ident.get("ino") != st.st_ino or size < self.upto:
+            return False
+        plen = ident.get("plen", 0)
+        return plen == 0 or _prefix_hash(self.log_path, plen) == ident.get("prefix")
+
+    # ------------------------------------------------------------------
+    # Indexado
+    # ------------------------------------------------------------------
+
+    def _merge(self, chunk: Dict[str, bytes]) -> None:
+        for dev, raw in chunk.items():
+            arr = self.postings.get(dev)
+            if arr is None:
+                arr = self.postings[dev] = array("Q")
+            arr.frombytes(raw)
+
+    @staticmethod
+    def _scan(data: bytes, base: int) -> Dict[str, array]:
+        found: Dict[str, array] = {}
+        last: Dict[str, int] = {}
+        for m in _DEVICE_RE.finditer(data):
+            dev = (m.group(1) or m.group(2)).decode("ascii")
+            start = base + data.rfind(b"\n", 0, m.start()) + 1
+            keys = (dev, dev[-5:]) if len(dev) == 10 else (dev,)
+            for key in keys:
+                if last.get(key) == start:
+                    continue  # mismo equipo dos veces en la línea
+                last[key] = start
+                arr = found.get(key)
+                if arr is None:
+                    arr = found[key] = array("Q")
+                arr.append(start)
+        return found
+
+    def update(self) -> int:
+        """Indexa lo agregado al log; devuelve la cantidad de bytes nuevos procesados."""
+        with self._lock:
+            st = self.log_path.stat()
+            size = log_archive.log_size(self.log_path)
+            if size > self.upto:
+                self._load()
+            if not self._still_valid(st, size):
+                self.upto = 0
+                self.postings = {}
+                self._ident = self._identity(st, size) if size else None
+                if self._ident is not None:
+                    self._append_frames([self._ident], rewrite=True)
+            if self._ident is None or size <= self.upto:
+                return 0
+            start = self.upto
+            frames = []
+            with log_archive.open_log(self.log_path) as f:
+                f.seek(self.upto)
+                while self.upto < size:
+                    data = f.read(min(_READ_CHUNK, size - self.upto))
+                    if not data:
+                        break
+                    cut = data.rfind(b"\n")
+                    if cut < 0:
+                        if len(data) < _READ_CHUNK:
+                            break  # línea en curso: se indexa cuando termine
+                        cut = len(data) - 1
+                    data = data[:cut + 1]
+                    found = self._scan(data, self.upto)
+                    chunk = {dev: arr.tobytes() for dev, arr in found.items()}
+                    self._merge(chunk)
+                    frames.append((self.upto, self.upto + len(data), chunk))
+                    self.upto += len(data)
+                    f.seek(self.upto)
+            if frames:
+                self._append_frames(frames)
+            return self.upto - start
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def offsets(self, device: str) -> array:
+        return self.postings.get(device, array("Q"))
+
+    def read_lines(
+        self, device: str, limit: Optional[int] = None, byte_range: Optional[Tuple[int, int]] = None
+    ) -> List[str]:
+        """Líneas del equipo (las últimas `limit` si se indica; en `byte_range` si se indica), leídas por seek."""
+        offs = self.offsets(device)
+        if byte_range is not None:
+            offs = offs[bisect.bisect_left(offs, byte_range[0]):bisect.bisect_left(offs, byte_range[1])]
+        if limit is not None and len(offs) > limit:
+            offs = offs[len(offs) - limit:]
+        out: List[str] = []
+        with log_archive.open_log(self.log_path) as f:
+            for off in offs:
+                f.seek(off)
+                out.append(f.readline().rstrip(b"\r\n").decode("utf-8", errors="replace"))
+        return out
+
+    def iter_lines(
+        self, device: str, byte_range: Optional[Tuple[int, int]] = None, start: int = 0
+    ) -> Iterator[Tuple[int, str]]:
+        """(offset, línea) del equipo desde el offset `start` (en `byte_range` si se indica), de a una."""
+        offs = self.offsets(device)
+        lo = max(start, byte_range[0]) if byte_range is not None else start
+        hi = bisect.bisect_left(offs, byte_range[1]) if byte_range is not None else len(offs)
+        with log_archive.open_log(self.log_path) as f:
+            for off in offs[bisect.bisect_left(offs, lo):hi]:
+                f.seek(off)
+                yield off, f.readline().rstrip(b"\r\n").decode("utf-8", errors="replace")
+
+
+_cache: "OrderedDict[Path, LogIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_index(log_path: Path, index_dir: Optional[Path]) -> LogIndex:
+    """Índice (en memoria + sidecar en `index_dir`) del log, actualizado a lo último escrito."""
+    log_path = log_path.resolve()
+    with _cache_lock:
+        idx = _cache.get(log_path)
+        if idx is None:
+            sidecar = (index_dir / (log_path.name + ".idx")) if index_dir is not None else None
+            idx = _cache[log_path] = LogIndex(log_path, sidecar)
+            while len(_cache) > _MAX_CACHED:
+                _cache.popitem(last=False)
+        else:
+            _cache.move_to_end(log_path)
+    idx.update()
+    return idx
+
+
+def device_lines(
+    log_paths: Iterable[Path],
+    device: str,
+    index_dir: Optional[Path],
+    limit: Optional[int] = None,
+    byte_ranges: Optional[Dict[Path, Tuple[int, int]]] = None,
+) -> Tuple[List[str], int]:
+    """
+    Líneas del equipo en los logs dados (en ese orden, p. ej. del día más viejo al actual),
+    opcionalmente solo dentro de `byte_ranges[path]` (ver log_bisect.byte_range).
+    Devuelve (las últimas `limit` líneas, total de líneas del equipo).
+    """
+    byte_ranges = byte_ranges or {}
+    per_file = [(p, get_index(p, index_dir)) for p in log_paths]
+    total = 0
+    for p, idx in per_file:
+        offs = idx.offsets(device)
+        rng = byte_ranges.get(p)
+        if rng is not None:
+            total += bisect.bisect_left(offs, rng[1]) - bisect.bisect_left(offs, rng[0])
+        else:
+            total += len(offs)
+    remaining = limit if limit is not None else total
+    chunks: List[List[str]] = []
+    for p, idx in reversed(per_file):
+        if remaining <= 0:
+            break
+        lines = idx.read_lines(device, remaining, byte_ranges.get(p))
+        remaining -= len(lines)
+        chunks.append(lines)
+    out: List[str] = []
+    for lines in reversed(chunks):
+        out.extend(lines)
+    return out, total
@@ -0,0 +1,249 @@
+"""
+Búsqueda de un equipo (o un texto) en varios días de logs, repartida en procesos.
+
+Para ver "el equipo 95989 en los últimos 14 días" había que bajar cada archivo. `/search`
+arma la lista de logs diarios del período (tal cual o archivados `.gz`) y manda cada uno a
+un `ProcessPoolExecutor`:
+
+- `search_file` corre en el proceso worker: ubica el rango horario por bisección
+  (log_bisect.py), usa el índice por equipo (log_index.py) o recorre las líneas buscando el
+  texto, y devuelve **solo las líneas encontradas** con su hora, de a `SEARCH_CHUNK_ROWS`
+  como máximo, junto con el offset desde el que seguir. Nunca se carga un archivo entero (ni
+  todas sus coincidencias) en memoria.
+- `run_search` entrega los resultados en orden de tiempo: los días salen del más viejo al
+  más nuevo y las series del mismo día (LOG_ y Reenvios_) se mezclan por hora. Cada archivo
+  tiene a lo sumo una tarea pendiente (la parte siguiente se pide al recibir la anterior) y
+  solo se adelantan las tareas del día siguiente al que se está entregando.
+- El pool usa procesos `spawn`: la app corre en waitress, con threads, y un `fork` de un
+  proceso con threads puede heredar locks tomados.
+- `csv_chunks` / `zip_chunks` arman la exportación por partes para enviarla en streaming.
+"""
+
+from __future__ import annotations
+
+import atexit
+import csv
+import heapq
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import log_archive
+
+try:
+    from . import log_bisect, log_index
+except ImportError:
+    import log_bisect
+    import log_index
+
+# Procesos de búsqueda (TQ_SEARCH_WORKERS; 0 = en el mismo proceso, sin pool)
+SEARCH_WORKERS = int(os.environ.get("TQ_SEARCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Líneas que devuelve como máximo cada tarea (lo que viaja de un proceso al otro de una vez)
+SEARCH_CHUNK_ROWS = 5000
+
+# Resultado: (hora "YYYY-MM-DD HH:MM:SS", nombre del archivo, línea)
+Row = Tuple[str, str, str]
+# Estado entre partes de un mismo archivo: (hora de la última línea con hora, si está en rango)
+Carry = Tuple[str, bool]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[Executor]:
+    """Pool compartido por todas las búsquedas (None si SEARCH_WORKERS es 0)."""
+    global _pool
+    if SEARCH_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=SEARCH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def search_file(
+    path: str,
+    device: Optional[str],
+    needle: Optional[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    index_dir: Optional[str],
+    limit: Optional[int] = None,
+    start: int = 0,
+    carry: Optional[Carry] = None,
+) -> Tuple[List[Tuple[str, str]], Optional[int], Carry]:
+    """
+    Líneas de `path` del equipo `device` (por índice) o que contienen `needle` (sin distinguir
+    mayúsculas), con hora en [since, until], desde el offset `start`. Las líneas sin hora
+    llevan la de la anterior.
+
+    Devuelve ([(hora, línea)] (a lo sumo `limit`), offset desde el que seguir o None si se
+    llegó al final, estado a pasar como `carry` en la llamada siguiente).
+    """
+    p = Path(path)
+    if not p.exists() and not log_archive.is_archive(p):
+        # Archivado (log_archive.py) entre que se armó la lista y ahora
+        p = p.with_name(p.name + log_archive.ARCHIVE_SUFFIX)
+    rng = log_bisect.byte_range(p, since, until) if since is not None or until is not None else None
+    out: List[Tuple[str, str]] = []
+    if device:
+        idx = log_index.get_index(p, Path(index_dir) if index_dir else None)
+        lines: Iterable[Tuple[int, str]] = idx.iter_lines(device, rng, start)
+    else:
+        lines = _iter_lines(p, rng, start)
+    low = needle.lower() if needle else None
+    stamp, keep = carry if carry is not None else ("", since is None)
+    for off, line in lines:
+        ts = log_bisect.line_timestamp(line.encode("utf-8", errors="replace")[:32])
+        if ts is not None:
+            stamp = ts.strftime("%Y-%m-%d %H:%M:%S")
+            keep = log_bisect.in_range(ts, since, until)
+        if not keep or (low is not None and low not in line.lower()):
+            continue
+        if limit is not None and len(out) >= limit:
+            # Parte completa: la siguiente arranca en esta línea
+            return out, off, (stamp, keep)
+        out.append((stamp, line))
+    return out, None, (stamp, keep)
+
+
+def _iter_lines(p, rng: Optional[Tuple[int, int]], start: int = 0) -> Iterator[Tuple[int, str]]:
+    lo, end = rng if rng is not None else (0, log_archive.log_size(p))
+    pos = max(lo, start)
+    with log_archive.open_log(p) as f:
+        f.seek(pos)
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            yield pos, line.rstrip(b"\r\n").decode("utf-8", errors="replace")
+            pos += len(line)
+
+
+class _FileSearch:
+    """Resultados de un archivo por partes, con la parte siguiente pedida de antemano."""
+
+    def __init__(self, pool: Optional[Executor], path: str, args: tuple):
+        self.pool = pool
+        self.path = path
+        self.name = os.path.basename(path)
+        self.args = args
+        self.future: Optional[Future] = None
+
+    def submit(self, start: int = 0, carry: Optional[Carry] = None) -> None:
+        if self.pool is not None:
+            self.future = self.pool.submit(search_file, self.path, *self.args, start, carry)
+
+    def rows(self) -> Iterator[Row]:
+        start, carry = 0, None
+        while True:
+            if self.future is None and self.pool is not None:
+                self.submit(start, carry)
+            if self.future is not None:
+                found, start, carry = self.future.result()
+                self.future = None
+            else:
+                found, start, carry = search_file(self.path, *self.args, start, carry)
+            if start is not None:
+                self.submit(start, carry)
+            for ts, line in found:
+                yield ts, self.name, line
+            if start is None:
+                return
+
+    def cancel(self) -> None:
+        if self.future is not None:
+            self.future.cancel()
+
+
+def run_search(
+    days: Sequence[Sequence[str]],
+    device: Optional[str],
+    needle: Optional[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    index_dir: Optional[str],
+    limit: Optional[int] = None,
+) -> Iterator[Row]:
+    """
+    `days`: archivos de cada día, del más viejo al más nuevo. Entrega las filas en orden de
+    hora (a lo sumo `limit`) pidiendo a los procesos solo el día en curso y el siguiente. Si el
+    consumidor deja de iterar (p. ej. el navegador cortó la descarga) se cancelan las tareas
+    pendientes.
+    """
+    pool = get_pool()
+    chunk = min(limit, SEARCH_CHUNK_ROWS) if limit is not None else SEARCH_CHUNK_ROWS
+    args = (device, needle, since, until, index_dir, chunk)
+    searches = [[_FileSearch(pool, f, args) for f in files] for files in days]
+    sent = 0
+    try:
+        for i, files in enumerate(searches):
+            for ahead in searches[i:i + 2]:
+                for fs in ahead:
+                    if fs.future is None:
+                        fs.submit()
+            for row in heapq.merge(*(fs.rows() for fs in files), key=lambda r: r[0]):
+                if limit is not None and sent >= limit:
+                    return
+                sent += 1
+                yield row
+    finally:
+        for files in searches:
+            for fs in files:
+                fs.cancel()
+
+
+def csv_chunks(rows: Iterable[Row], batch: int = 500) -> Iterator[bytes]:
+    """CSV (`fecha,archivo,linea`, UTF-8 con BOM para Excel) en partes de `batch` filas."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")
+    writer.writerow(("fecha", "archivo", "linea"))
+    n = 0
+    for row in rows:
+        writer.writerow(row)
+        n += 1
+        if n % batch == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Destino no seekable para ZipFile: junta lo escrito hasta que se retira."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.parts.append(bytes(b))
+        return len(b)
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def zip_chunks(member_name: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Zip con un solo archivo `member_name` armado a partir de `chunks`, entregado por partes."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(member_name, "w", force_zip64=True) as member:
+            for chunk in chunks:
+                member.write(chunk)
+                data = sink.take()
+                if data:
+                    yield data
+    yield sink.take()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Circuit breaker por destino de reenvío, con timeout de conexión adaptativo.
+
+Estados:
+    closed     los envíos pasan normalmente.
+    open       el destino falló: `allow()` devuelve False (costo de microsegundos, sin
+               tocar la red) hasta que vence `open_seconds`.
+    half_open  vencido el plazo, se deja pasar un único envío de prueba: si sale bien el
+               circuito se cierra; si falla se vuelve a abrir con el doble de plazo
+               (hasta `max_open_seconds`). Mientras la prueba está en curso el resto
+               de los envíos se rechaza.
+
+El circuito se abre con `failure_threshold` fallas consecutivas, o si en la ventana de
+los últimos `window` resultados (con al menos `min_samples`) la proporción de fallas
+llega a `failure_ratio`. Lo segundo cubre UDP, donde un destino sin nadie escuchando
+alterna envíos "exitosos" con ECONNREFUSED diferidos.
+
+Timeout de conexión: en vez de 2.0 s fijos, se usa el percentil 95 de los RTT de
+conexión observados multiplicado por `RTT_MULTIPLIER`, acotado entre `min_timeout` y
+`max_timeout`. Hasta tener `MIN_RTT_SAMPLES` muestras se usa `max_timeout`.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+FAILURE_THRESHOLD = 3
+WINDOW = 20
+MIN_SAMPLES = 10
+FAILURE_RATIO = 0.5
+OPEN_SECONDS = 1.0
+MAX_OPEN_SECONDS = 60.0
+
+RTT_SAMPLES = 64
+MIN_RTT_SAMPLES = 5
+RTT_MULTIPLIER = 4.0
+MIN_CONNECT_TIMEOUT = 0.25
+MAX_CONNECT_TIMEOUT = 2.0
+
+
+class CircuitOpenError(ConnectionError):
+    """El circuito del destino está abierto: no se intentó el envío."""
+
+
+class CircuitBreaker:
+    """Estado de un destino. Thread-safe."""
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        window: int = WINDOW,
+        min_samples: int = MIN_SAMPLES,
+        failure_ratio: float = FAILURE_RATIO,
+        open_seconds: float = OPEN_SECONDS,
+        max_open_seconds: float = MAX_OPEN_SECONDS,
+        min_timeout: float = MIN_CONNECT_TIMEOUT,
+        max_timeout: float = MAX_CONNECT_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.min_samples = min_samples
+        self.failure_ratio = failure_ratio
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._lock = threading.Lock()
+        self._results: Deque[bool] = deque(maxlen=window)
+        self._rtts: Deque[float] = deque(maxlen=RTT_SAMPLES)
+        self._timeout_cache: Optional[float] = None
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_seconds = open_seconds
+        self.opened_at = 0.0
+        self.retry_at = 0.0
+        self.rejected = 0
+        self.opens = 0
+        self.last_error = ""
+
+    def allow(self) -> bool:
+        """True si se puede intentar el envío (cerrado, o único intento de prueba)."""
+        if self.state == CLOSED:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if now >= self.retry_at:
+                # Un único intento de prueba; si no informa resultado en `max_timeout` + 1 s
+                # (p. ej. excepción no prevista) se permite otro
+                self.state = HALF_OPEN
+                self.retry_at = now + self.max_timeout + 1.0
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self, name: str = "") -> None:
+        """Como `allow()` pero lanza `CircuitOpenError` si el circuito no deja pasar."""
+        if not self.allow():
+            wait = max(0.0, self.retry_at - time.monotonic())
+            raise CircuitOpenError(
+                f"circuito abierto{(' ' + name) if name else ''} (reintento en {wait:.1f}s; {self.last_error})"
+            )
+
+    def record_success(self, rtt: Optional[float] = None) -> None:
+        with self._lock:
+            self._results.append(True)
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self.open_seconds = self.base_open_seconds
+                self._results.clear()
+            if rtt is not None:
+                self._rtts.append(rtt)
+                self._timeout_cache = None
+
+    def record_failure(self, error: str = "") -> None:
+        with self._lock:
+            self._results.append(False)
+            self.consecutive_failures += 1
+            if error:
+                self.last_error = error
+            if self.state == HALF_OPEN:
+                # Falló la prueba: se reabre con el doble de plazo
+                self.open_seconds = min(self.max_open_seconds, self.open_seconds * 2)
+                self._open()
+                return
+            if self.state == OPEN:
+                return
+            n = len(self._results)
+            failures = n - sum(self._results)
+            if self.consecutive_failures >= self.failure_threshold or (
+                n >= self.min_samples and failures / n >= self.failure_ratio
+            ):
+                self._open()
+
+    def _open(self) -> None:
+        now = time.monotonic()
+        self.state = OPEN
+        self.opened_at = now
+        self.retry_at = now + self.open_seconds
+        self.opens += 1
+
+    def connect_timeout(self) -> float:
+        """Timeout de conexión: p95 de los RTT observados x `RTT_MULTIPLIER`, acotado."""
+        cached = self._timeout_cache
+        if cached is not None:
+            return cached
+        with self._lock:
+            samples = sorted(self._rtts)
+        if len(samples) < MIN_RTT_SAMPLES:
+            timeout = self.max_timeout
+        else:
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            timeout = min(self.max_timeout, max(self.min_timeout, p95 * RTT_MULTIPLIER))
+        self._timeout_cache = timeout
+        return timeout
+
+    def rtt_percentiles(self) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._rtts)
+        if not samples:
+            return {}
+        n = len(samples)
+        return {
+            "p50_ms": round(samples[n // 2] * 1000, 2),
+            "p95_ms": round(samples[min(n - 1, int(n * 0.95))] * 1000, 2),
+            "p99_ms": round(samples[min(n - 1, int(n * 0.99))] * 1000, 2),
+        }
+
+    def snapshot(self) -> Dict:
+        """Estado para /health."""
+        out = {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "connect_timeout_s": round(self.connect_timeout(), 3),
+        }
+        if self.state != CLOSED:
+            out["retry_in_s"] = round(max(0.0, self.retry_at - time.monotonic()), 1)
+        rtt = self.rtt_percentiles()
+        if rtt:
+            out["rtt"] = rtt
+        return out
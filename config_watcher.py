@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Vigilancia de un archivo de configuración (REENVIOS_CONFIG.txt) para recargarlo apenas cambia.
+
+En Linux se usa inotify (vía ctypes, sin dependencias) sobre el **directorio** del archivo:
+así se detectan tanto las escrituras en el lugar (IN_CLOSE_WRITE) como el reemplazo atómico
+que hacen los editores y el ABM (escribir un temporal + rename → IN_MOVED_TO). Los eventos
+se agrupan durante `debounce_seconds` (un editor puede generar varios) y se llama al
+callback una vez, a los milisegundos del cambio.
+
+Si inotify no está disponible (otro SO, límite de watches agotado) se cae a polling de
+`(mtime, tamaño, inodo)` cada `poll_interval` segundos, como antes.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+DEBOUNCE_SECONDS = 0.05
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        libc.inotify_init1  # noqa: B018 - verificar que existe
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class _Inotify:
+    """Descriptor inotify con un watch sobre un directorio."""
+
+    def __init__(self, directory: str):
+        libc = _load_libc()
+        if libc is None:
+            raise OSError("inotify no disponible")
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        wd = libc.inotify_add_watch(fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, f"inotify_add_watch({directory})")
+        self.fd = fd
+
+    def read_names(self) -> Tuple[set, bool]:
+        """Nombres de archivo con eventos pendientes y si hubo desborde de la cola del kernel."""
+        names = set()
+        overflow = False
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            offset = 0
+            while offset + _EVENT.size <= len(buf):
+                _wd, mask, _cookie, length = _EVENT.unpack_from(buf, offset)
+                offset += _EVENT.size
+                name = buf[offset:offset + length].split(b"\0", 1)[0]
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                if name:
+                    names.add(os.fsdecode(name))
+        return names, overflow
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ConfigWatcher:
+    """
+    Thread que llama a `on_change()` cuando cambia `path`.
+
+    `mode` queda en "inotify" o "polling" según lo que se pudo usar. Las excepciones del
+    callback se informan con `on_error` (si se pasó) y el watcher sigue corriendo.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        on_change: Callable[[], None],
+        poll_interval: float = 60.0,
+        debounce_seconds: float = DEBOUNCE_SECONDS,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        use_inotify: bool = True,
+    ):
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.poll_interval = max(0.1, float(poll_interval))
+        self.debounce_seconds = debounce_seconds
+        self.on_error = on_error
+        self.use_inotify = use_inotify
+        self.mode = ""
+        self.events = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+
+    def start(self) -> None:
+        if self.use_inotify:
+            try:
+                self._inotify = _Inotify(os.path.dirname(self.path) or ".")
+                self.mode = "inotify"
+            except OSError:
+                self._inotify = None
+        if self._inotify is None:
+            self.mode = "polling"
+        self._stop.clear()
+        target = self._run_inotify if self._inotify is not None else self._run_polling
+        self._thread = threading.Thread(target=target, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _fire(self) -> None:
+        self.events += 1
+        try:
+            self.on_change()
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error(e)
+
+    def _run_inotify(self) -> None:
+        name = os.path.basename(self.path)
+        fd = self._inotify.fd
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select([fd], [], [], 0.5)
+            except (OSError, ValueError):
+                return
+            if not ready:
+                continue
+            names, overflow = self._inotify.read_names()
+            if name not in names and not overflow:
+                continue
+            # Agrupar la ráfaga de eventos de una misma edición (con tope, por si hay otros
+            # archivos del directorio escribiéndose sin parar)
+            deadline = time.monotonic() + 10 * self.debounce_seconds
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                ready, _, _ = select.select([fd], [], [], self.debounce_seconds)
+                if not ready:
+                    break
+                self._inotify.read_names()
+            if not self._stop.is_set():
+                self._fire()
+
+    def _run_polling(self) -> None:
+        last = _file_signature(self.path)
+        while not self._stop.wait(self.poll_interval):
+            sig = _file_signature(self.path)
+            if sig != last:
+                last = sig
+                self._fire()
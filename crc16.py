@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+CRC-16 por tabla (256 entradas) para los protocolos de los equipos.
+
+Variantes (todas con valor inicial 0xFFFF):
+  - `crc16_x25_raw`: polinomio 0x1021 reflejado (0x8408), LSB primero, sin XOR final.
+    Es el cálculo de `funciones.calcular_crc` / `calcular_crcITU` / `calcular_crcV2`.
+  - `crc16_x25`: igual que el anterior con XOR final 0xFFFF (CRC-ITU de GT06/TQ 7878).
+  - `crc16_ccitt`: polinomio 0x1021, MSB primero, sin XOR final (CRC-16/CCITT-FALSE).
+    Es el cálculo de `funciones.crc_itu` / `protocolo.crc_itu2024`.
+
+Todas aceptan `crc` inicial para continuar un cálculo: así se cachea el estado del CRC
+tras una cabecera fija y por paquete solo se procesan los bytes que cambian.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Tuple, Union
+
+CRC16_INIT = 0xFFFF
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def _table_reflected(poly: int) -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+def _table_msb(poly: int) -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+        table.append(crc)
+    return table
+
+
+_X25_TABLE = _table_reflected(0x8408)
+_CCITT_TABLE = _table_msb(0x1021)
+
+
+def crc16_x25_raw(data: BytesLike, crc: int = CRC16_INIT) -> int:
+    table = _X25_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def crc16_x25(data: BytesLike, crc: int = CRC16_INIT) -> int:
+    """CRC-ITU de las tramas GT06 (7878/7979): X.25 con XOR final."""
+    return crc16_x25_raw(data, crc) ^ 0xFFFF
+
+
+def crc16_ccitt(data: BytesLike, crc: int = CRC16_INIT) -> int:
+    table = _CCITT_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+# ---------------------------------------------------------------------------
+# Respuestas GT06 (7878 ...)
+# ---------------------------------------------------------------------------
+
+GT06_START = b"\x78\x78"
+GT06_STOP = b"\x0d\x0a"
+
+# Máximo de cabeceras cacheadas (protocolo, terminal) antes de vaciar el cache
+HEADER_CACHE_MAX = 20000
+
+_headers: Dict[Tuple[int, bytes], Tuple[bytes, int]] = {}
+
+
+def gt06_response(protocol_number: int, terminal_id: bytes, serial_number: int) -> bytes:
+    """
+    Paquete de respuesta GT06:
+        78 78 | largo | protocolo | terminal_id (0 u 8 bytes) | serie (2) | CRC (2) | 0D 0A
+    con largo = protocolo + terminal + serie + CRC y CRC-ITU (X.25) desde el largo hasta
+    la serie. La cabecera y el estado del CRC tras ella se cachean por (protocolo, terminal):
+    por paquete solo se procesan los 2 bytes de la serie.
+    """
+    key = (protocol_number, terminal_id)
+    cached = _headers.get(key)
+    if cached is None:
+        length = 1 + len(terminal_id) + 2 + 2
+        header = GT06_START + bytes((length, protocol_number)) + terminal_id
+        cached = (header, crc16_x25_raw(header[2:]))
+        if len(_headers) >= HEADER_CACHE_MAX:
+            _headers.clear()
+        _headers[key] = cached
+    header, state = cached
+    serial = (serial_number & 0xFFFF).to_bytes(2, "big")
+    crc = crc16_x25_raw(serial, state) ^ 0xFFFF
+    return header + serial + crc.to_bytes(2, "big") + GT06_STOP
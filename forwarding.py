@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+Etapa de reenvío asíncrona: una cola acotada y un worker por destino.
+
+Antes los reenvíos corrían en el mismo thread que lee al equipo: un destino TCP caído
+(timeout de connect de 2 s) frenaba la lectura de ese tracker y demoraba sus otros
+destinos. Ahora el pipeline solo encola el payload en la cola de su destino
+`(ip, puerto, transporte)` y sigue; cada destino tiene su propio worker, así un destino
+lento o caído solo acumula (y descarta) en su propia cola.
+
+Política con la cola llena (`queue_max` mensajes por destino), sin spool:
+    - `drop_oldest` (default): se descarta el mensaje más viejo y entra el nuevo
+      (para tracking interesa la última posición).
+    - `drop_newest`: se descarta el mensaje nuevo.
+
+Con `spool_dir` (store-and-forward, ver `spool.py`) no se descarta nada mientras haya
+lugar en disco: el mensaje que falla y el más viejo de una cola llena van al spool del
+destino. Mientras el spool tenga pendientes, el worker pasa su cola al spool (para
+conservar el orden) y reenvía desde el spool a `replay_rate` mensajes/s; si el destino
+sigue caído reintenta cada `spool_retry_seconds`. Al iniciar, `resume_spooled()` retoma
+los spools que quedaron en disco.
+
+El envío en sí lo hace `send_fn(ip, puerto, payload)` (p. ej. `TcpConnectionPool.send`).
+`on_sent` se llama en el worker tras un envío exitoso (log de reenvíos); los mensajes
+reenviados desde el spool no lo llaman. Un worker sin trabajo durante
+`idle_exit_seconds` termina y se vuelve a crear con el próximo mensaje.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from circuit_breaker import CircuitOpenError
+from spool import (
+    DEFAULT_MAX_AGE_SECONDS,
+    DEFAULT_MAX_BYTES,
+    DestinationSpool,
+    find_spooled_destinations,
+    spool_dir_name,
+)
+
+DEFAULT_QUEUE_MAX = 2000
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST)
+IDLE_EXIT_SECONDS = 300.0
+DEFAULT_REPLAY_RATE = 200.0
+SPOOL_RETRY_SECONDS = 5.0
+# Registros leídos del spool (y confirmados en el checkpoint) por tanda
+REPLAY_BATCH = 50
+
+Destination = Tuple[str, int, str]
+SendFn = Callable[[str, int, bytes], None]
+# (payload, callback tras envío OK, descripción para el log de errores)
+_Item = Tuple[bytes, Optional[Callable[[], None]], str]
+
+
+class _DestinationQueue:
+    __slots__ = (
+        "dest",
+        "send_fn",
+        "queue",
+        "cond",
+        "alive",
+        "busy",
+        "spool",
+        "sent",
+        "errors",
+        "dropped",
+        "spooled",
+        "last_error",
+    )
+
+    def __init__(self, dest: Destination, send_fn: SendFn, spool: Optional[DestinationSpool]):
+        self.dest = dest
+        self.send_fn = send_fn
+        self.queue: Deque[_Item] = deque()
+        self.cond = threading.Condition()
+        self.alive = False
+        self.busy = False
+        self.spool = spool
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.spooled = 0
+        self.last_error = ""
+
+
+class ForwardingDispatcher:
+    """Colas de reenvío por destino, cada una con su worker (y opcionalmente su spool)."""
+
+    def __init__(
+        self,
+        send_fns: Dict[str, SendFn],
+        queue_max: int = DEFAULT_QUEUE_MAX,
+        drop_policy: str = DROP_OLDEST,
+        logger: Optional[logging.Logger] = None,
+        idle_exit_seconds: float = IDLE_EXIT_SECONDS,
+        spool_dir: Optional[str] = None,
+        spool_max_bytes: int = DEFAULT_MAX_BYTES,
+        spool_max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+        replay_rate: float = DEFAULT_REPLAY_RATE,
+        spool_retry_seconds: float = SPOOL_RETRY_SECONDS,
+    ):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Política de descarte inválida: {drop_policy} (usar {', '.join(DROP_POLICIES)})")
+        self.send_fns = dict(send_fns)
+        self.queue_max = max(1, int(queue_max))
+        self.drop_policy = drop_policy
+        self.logger = logger or logging.getLogger(__name__)
+        self.idle_exit_seconds = idle_exit_seconds
+        self.spool_dir = spool_dir
+        self.spool_max_bytes = spool_max_bytes
+        self.spool_max_age_seconds = spool_max_age_seconds
+        self.replay_rate = replay_rate
+        self.spool_retry_seconds = spool_retry_seconds
+        self._queues: Dict[Destination, _DestinationQueue] = {}
+        self._lock = threading.Lock()
+        self._closing = False
+
+    def _queue_for(self, dest: Destination) -> _DestinationQueue:
+        q = self._queues.get(dest)
+        if q is None:
+            with self._lock:
+                q = self._queues.get(dest)
+                if q is None:
+                    spool = None
+                    if self.spool_dir:
+                        spool = DestinationSpool(
+                            os.path.join(self.spool_dir, spool_dir_name(dest[2], dest[0], dest[1])),
+                            dest,
+                            max_bytes=self.spool_max_bytes,
+                            max_age_seconds=self.spool_max_age_seconds,
+                        )
+                    q = _DestinationQueue(dest, self.send_fns[dest[2]], spool)
+                    self._queues[dest] = q
+        return q
+
+    def _ensure_worker(self, q: _DestinationQueue) -> None:
+        """Con `q.cond` tomado: arranca el worker si no está corriendo, o lo despierta."""
+        if not q.alive:
+            q.alive = True
+            ip, port, transport = q.dest
+            threading.Thread(
+                target=self._worker, args=(q,), name=f"fwd-{ip}:{port}/{transport}", daemon=True
+            ).start()
+        else:
+            q.cond.notify()
+
+    def submit(
+        self,
+        ip: str,
+        port: int,
+        transport: str,
+        payload: bytes,
+        on_sent: Optional[Callable[[], None]] = None,
+        label: str = "",
+    ) -> bool:
+        """
+        Encola `payload` para el destino. Devuelve False si se descartó (cola llena con
+        `drop_newest` y sin spool, o dispatcher cerrándose). Nunca bloquea por la red.
+        """
+        q = self._queue_for((ip, int(port), transport))
+        with q.cond:
+            if self._closing:
+                if q.spool is not None:
+                    self._spool(q, payload)
+                    return True
+                q.dropped += 1
+                return False
+            if len(q.queue) >= self.queue_max:
+                if q.spool is not None:
+                    # El más viejo pasa al disco: el worker lo reenvía antes que la cola
+                    self._spool(q, q.queue.popleft()[0])
+                else:
+                    q.dropped += 1
+                    if self.drop_policy == DROP_NEWEST:
+                        return False
+                    q.queue.popleft()
+            q.queue.append((payload, on_sent, label))
+            self._ensure_worker(q)
+        return True
+
+    def resume_spooled(self) -> int:
+        """Arranca los workers de los destinos con spool pendiente en disco. Devuelve cuántos."""
+        resumed = 0
+        for dest in find_spooled_destinations(self.spool_dir):
+            if dest[2] not in self.send_fns:
+                continue
+            q = self._queue_for(dest)
+            if q.spool is not None and q.spool.has_pending():
+                with q.cond:
+                    self._ensure_worker(q)
+                resumed += 1
+                self.logger.info(
+                    f"Spool {dest[2]} {dest[0]}:{dest[1]}: {q.spool.pending_bytes()} bytes pendientes, "
+                    f"se reanudan los reenvíos"
+                )
+        return resumed
+
+    def _spool(self, q: _DestinationQueue, payload: bytes) -> None:
+        try:
+            q.spool.append(payload)
+            q.spooled += 1
+        except OSError as e:
+            q.dropped += 1
+            self.logger.error(f"Spool {q.dest[0]}:{q.dest[1]}: no se pudo guardar el mensaje: {e}")
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _worker(self, q: _DestinationQueue) -> None:
+        ip, port, transport = q.dest
+        while True:
+            if q.spool is not None and q.spool.has_pending():
+                with q.cond:
+                    items = list(q.queue)
+                    q.queue.clear()
+                    q.busy = True
+                for item in items:
+                    self._spool(q, item[0])
+                delivered = self._replay(q)
+                with q.cond:
+                    q.busy = False
+                    q.cond.notify_all()
+                    if not delivered and not self._closing:
+                        q.cond.wait(self.spool_retry_seconds)
+                    if self._closing and not q.queue:
+                        q.alive = False
+                        q.cond.notify_all()
+                        return
+                continue
+
+            with q.cond:
+                if not q.queue and not self._closing:
+                    q.cond.wait(self.idle_exit_seconds)
+                if not q.queue:
+                    q.alive = False
+                    q.cond.notify_all()
+                    return
+                payload, on_sent, label = q.queue.popleft()
+                q.busy = True
+            try:
+                q.send_fn(ip, port, payload)
+                q.sent += 1
+                if on_sent is not None:
+                    try:
+                        on_sent()
+                    except Exception as e:
+                        self.logger.debug(f"Reenvío {ip}:{port}: error en callback: {e}")
+            except Exception as e:
+                q.errors += 1
+                q.last_error = str(e)
+                if q.spool is not None:
+                    self.logger.warning(
+                        f"Error reenvío {label or transport} a {ip}:{port}: {e}; "
+                        f"se guarda en spool hasta que el destino vuelva"
+                    )
+                    self._spool(q, payload)
+                elif isinstance(e, CircuitOpenError):
+                    # Destino caído ya informado: sin spool se descarta sin loguear cada mensaje
+                    self.logger.debug(f"Reenvío {label or transport} a {ip}:{port} descartado: {e}")
+                else:
+                    self.logger.error(f"Error reenvío {label or transport} a {ip}:{port}: {e}")
+            finally:
+                with q.cond:
+                    q.busy = False
+                    if not q.queue:
+                        q.cond.notify_all()
+
+    def _replay(self, q: _DestinationQueue) -> bool:
+        """
+        Reenvía una tanda del spool en orden, a `replay_rate` mensajes/s, confirmando el
+        checkpoint. Devuelve False si el destino sigue sin aceptar envíos.
+        """
+        ip, port, transport = q.dest
+        spool = q.spool
+        interval = 1.0 / self.replay_rate if self.replay_rate > 0 else 0.0
+        next_at = time.monotonic()
+        last = None
+        delivered = True
+        for seq, offset, payload in spool.read_batch(REPLAY_BATCH):
+            if interval:
+                now = time.monotonic()
+                if next_at > now:
+                    time.sleep(next_at - now)
+                next_at = max(next_at, now) + interval
+            try:
+                q.send_fn(ip, port, payload)
+            except Exception as e:
+                q.errors += 1
+                q.last_error = str(e)
+                self.logger.debug(f"Spool {ip}:{port}: destino sin responder ({e})")
+                delivered = False
+                break
+            q.sent += 1
+            spool.replayed += 1
+            last = (seq, offset)
+        if last is not None:
+            spool.commit(*last)
+            if not spool.has_pending():
+                self.logger.info(
+                    f"Spool {transport} {ip}:{port}: vaciado ({spool.replayed} mensajes reenviados)"
+                )
+        return delivered
+
+    # ------------------------------------------------------------------
+    # Cierre y estado
+    # ------------------------------------------------------------------
+
+    def flush(self, timeout: float = 2.0) -> bool:
+        """Espera (hasta `timeout` en total) a que las colas en memoria se vacíen."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            queues = list(self._queues.values())
+        for q in queues:
+            with q.cond:
+                while (q.queue or q.busy) and q.alive:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    q.cond.wait(min(remaining, 0.1))
+        return True
+
+    def close(self, timeout: float = 2.0) -> None:
+        """
+        Deja de aceptar mensajes e intenta vaciar las colas; lo que quede va al spool
+        (se reenvía al reiniciar) o se descarta si no hay spool.
+        """
+        self._closing = True
+        self.flush(timeout)
+        with self._lock:
+            queues = list(self._queues.values())
+        for q in queues:
+            with q.cond:
+                pending = [item[0] for item in q.queue]
+                q.queue.clear()
+                if q.spool is not None:
+                    for payload in pending:
+                        self._spool(q, payload)
+                else:
+                    q.dropped += len(pending)
+                q.cond.notify_all()
+            if q.spool is not None:
+                q.spool.close()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Contadores por destino (`transporte ip:puerto`)."""
+        with self._lock:
+            queues = list(self._queues.values())
+        out: Dict[str, Dict] = {}
+        for q in queues:
+            entry = {
+                "queued": len(q.queue),
+                "sent": q.sent,
+                "errors": q.errors,
+                "dropped": q.dropped,
+                "last_error": q.last_error,
+            }
+            if q.spool is not None:
+                entry["spooled"] = q.spooled
+                entry["spool_bytes"] = q.spool.pending_bytes()
+            out[f"{q.dest[2]} {q.dest[0]}:{q.dest[1]}"] = entry
+        return out
@@ -1,5 +1,4 @@
 import binascii
-import socket
 import os
 import glob
 import json
@@ -8,6 +7,10 @@ import urllib.request
 from datetime import datetime, timedelta
 from typing import Union
 
+import crc16
+import log_writer
+import udp_sender
+
 def bytes2hexa(valor_bytes):
 #valor_bytes = b'xx\r\x01\x08eF\x80P\x13\x82\x16\x00\xbe\xb9\xfa\r\n'  # Valor en bytes
 # Convertir el valor en bytes a hexadecimal
@@ -77,13 +80,12 @@ def get_daily_log_filename():
     filename = f"logs/LOG_{fecha_str}.txt"
     return filename
 
+# Patrón strftime del log diario único (lo escribe log_writer en background)
+DAILY_LOG_PATTERN = os.path.join('logs', 'LOG_%d%m%y.txt')
+
 def guardarLog(cadena):
     """Guarda un mensaje en el log diario único"""
-    archivo_path = get_daily_log_filename()
-    archivo = open(archivo_path, "a", encoding='utf-8')
-    fechaHora = getFechaHora()
-    archivo.write(fechaHora + ": " + cadena + "\n")
-    archivo.close()
+    log_writer.get_writer().write(DAILY_LOG_PATTERN, getFechaHora() + ": " + cadena)
 
 def _format_packet_metadata(transport: str, ip: str = "", port: Union[int, str] = "", device_id: str = "") -> str:
     t = (transport or "").strip()
@@ -107,16 +109,42 @@ def _truncate_payload(payload: str, max_len: int) -> str:
     tail = max_len - head
     return f"{p[:head]}...(trunc)...{p[-tail:]}"
 
-def guardarLogPacket(direction: str, transport: str, ip: str, port, payload: str, device_id: str = ""):
+# Captura binaria de paquetes (packet_capture.PacketCapture); None = desactivada
+_packet_capture = None
+_packet_capture_text = True
+
+def set_packet_capture(capture, text_log=None):
+    """
+    Activa la captura binaria de guardarLogPacket (None la desactiva).
+    text_log: seguir escribiendo también la línea de texto en LOG_DDMMYY.txt
+    (default: variable LOG_PACKET_CAPTURE_TEXT, apagado).
+    """
+    global _packet_capture, _packet_capture_text
+    if text_log is None:
+        text_log = os.getenv("LOG_PACKET_CAPTURE_TEXT", "").strip() in ("1", "true", "TRUE", "yes", "YES")
+    _packet_capture = capture
+    _packet_capture_text = True if capture is None else bool(text_log)
+
+def guardarLogPacket(direction: str, transport: str, ip: str, port, payload: str, device_id: str = "",
+                     raw: bytes = None):
     """
     Loggea un paquete con orientación y metadatos.
     Formato:
       DD/MM/YYYY H:M:S: <- [TCP,ip,port,ID] <payload>
       DD/MM/YYYY H:M:S: -> [UDP,ip,port] <payload>
+    raw: bytes crudos del paquete (si `payload` es su hex) para la captura binaria.
     """
     arrow = (direction or "").strip()
     if arrow not in ("<-", "->"):
         arrow = "->" if arrow else "->"
+    capture = _packet_capture
+    if capture is not None:
+        try:
+            capture.capture(arrow, transport, ip, port, device_id, raw if raw is not None else payload)
+        except Exception:
+            pass
+        if not _packet_capture_text:
+            return
     meta = _format_packet_metadata(transport, ip, port, device_id)
     # Evitar logs gigantes por payloads crudos: truncar salvo que se pida explícitamente.
     full = os.getenv("LOG_PACKET_PAYLOAD_FULL", "").strip() in ("1", "true", "TRUE", "yes", "YES")
@@ -136,14 +164,12 @@ def guardarLogArchivo(cadena, tag=""):
     Guarda log en el archivo diario único con un tag opcional
     El tag permite identificar el tipo de mensaje
     """
-    archivo_path = get_daily_log_filename()
-    archivo = open(archivo_path, "a", encoding='utf-8')
     fechaHora = getFechaHora()
     if tag:
-        archivo.write(fechaHora + f" [{tag}]: " + cadena + "\n")
+        linea = fechaHora + f" [{tag}]: " + cadena
     else:
-        archivo.write(fechaHora + ": " + cadena + "\n")
-    archivo.close()	
+        linea = fechaHora + ": " + cadena
+    log_writer.get_writer().write(DAILY_LOG_PATTERN, linea)
 	
 def guardarLogPersonal(cadena):
     """Guarda log personal en el archivo diario único con tag [PERSONAL]"""
@@ -171,36 +197,24 @@ def getFechaHora():
     return str(dia) + "/" + str(mes) + "/" + str(anio) + " " + str(hora) + ":" + str(minutos) + ":" + str(segundos)
 
 def enviar_mensaje_udp(ip_destino, puerto_destino, mensaje):
-    # Crear un socket UDP
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
+    # Se encola en el sender compartido (socket UDP conectado por destino, ver udp_sender.py)
     try:
-        # Enviar el mensaje al destino
-        sock.sendto(mensaje.encode(), (ip_destino, puerto_destino))
-        print("Mensaje enviado correctamente.")
+        if udp_sender.get_sender().send(ip_destino, puerto_destino, mensaje.encode()):
+            print("Mensaje enviado correctamente.")
+        else:
+            print("Error al enviar el mensaje: datagrama descartado (cola llena o circuito abierto)")
+            guardarLog("Error al enviar el mensaje UDP: datagrama descartado (cola llena o circuito abierto)")
         # Logging del paquete se realiza en el nivel que llama (para evitar duplicados)
 
     except Exception as e:
         print("Error al enviar el mensaje:", str(e))
         # guardando datos en archivo de LOG
         guardarLog(f"Error al enviar el mensaje UDP: {str(e)}")
-    finally:
-        # Cerrar el socket
-        sock.close()
 
 
 def calcular_crc(data):
-    crc = 0xFFFF  # Valor inicial del CRC
-
-    for byte in data:
-        crc ^= byte
-        for _ in range(8):
-            if crc & 0x0001:
-                crc = (crc >> 1) ^ 0x8408
-            else:
-                crc >>= 1
-
-    return crc
+    # CRC-16 reflejado (0x8408), valor inicial 0xFFFF, sin XOR final (por tabla, ver crc16.py)
+    return crc16.crc16_x25_raw(data)
 """
 # Datos de ejemplo
 datos = b"123456789"
@@ -213,28 +227,14 @@ print(hex(checksum))
 """
 
 def calcular_crcITU(data):
-    crc = 0xFFFF  # Valor inicial del CRC-ITU
-    for byte in data:
-        crc ^= byte
-        for _ in range(8):
-            if crc & 0x0001:
-                crc = (crc >> 1) ^ 0x8408
-            else:
-                crc >>= 1
+    crc = crc16.crc16_x25_raw(data)
     crc = crc.to_bytes(2, byteorder='big')
     crc = binascii.hexlify(crc).decode('utf-8').upper()
     return crc
 
 def calcular_crcV2(data):
-    crc = 0xFFFF  # Valor inicial del CRC-ITU
     data_bytes = binascii.unhexlify(data)  # Convertir cadena hexadecimal a bytes
-    for byte in data_bytes:
-        crc ^= byte
-        for _ in range(8):
-            if crc & 0x0001:
-                crc = (crc >> 1) ^ 0x8408
-            else:
-                crc >>= 1
+    crc = crc16.crc16_x25_raw(data_bytes)
     crc = crc.to_bytes(2, byteorder='big')
     crc = binascii.hexlify(crc).decode('utf-8').upper()
     return crc
@@ -264,16 +264,8 @@ def completaCero3(dato):
         return xdato
 
 def crc_itu(data: bytes) -> int:
-    crc = 0xFFFF
-    for byte in data:
-        crc ^= byte << 8
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = (crc << 1) ^ 0x1021
-            else:
-                crc <<= 1
-            crc &= 0xFFFF  # Asegura que el CRC se mantenga en 16 bits
-    return crc
+    # CRC-16/CCITT (0x1021, MSB primero, inicial 0xFFFF) por tabla, ver crc16.py
+    return crc16.crc16_ccitt(data)
 
 # Ejemplo de uso:
 # data = b"123456789"
@@ -331,6 +323,10 @@ def cleanup_old_logs(days_to_keep: int = 30, log_dir: str = "logs") -> dict:
                     if file_mtime < cutoff_date:
                         file_size = os.path.getsize(log_file)
                         os.remove(log_file)
+                        # Índice por equipo del visor de logs (administracion/publicacion/log_index.py)
+                        sidecar = os.path.join(log_dir, ".index", os.path.basename(log_file) + ".idx")
+                        if os.path.exists(sidecar):
+                            os.remove(sidecar)
                         deleted_files.append(os.path.basename(log_file))
                         total_size_freed += file_size
                         print(f"Log eliminado: {os.path.basename(log_file)} "
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Codificador GEO5 (RPG) con checksum incremental.
+
+Formato:
+    >RGP[ddmmyyhhmmss][±GGMM.MMMM][±GGGMM.MMMM][vel 3][rumbo 3][estado]000001;&[evento];ID=[id];#0001*[XX]<
+
+El checksum es el XOR de todos los bytes desde '>' hasta '*' inclusive. Como el XOR es
+asociativo, se calcula por segmentos a medida que se arma el mensaje: el prefijo `>RGP`
+es constante y la cola `000001;&EE;ID=<id>;#0001*` se cachea (bytes + XOR) por equipo y
+evento, así por cada posición solo se recorre la parte variable (~40 bytes).
+
+Las coordenadas se formatean igual que antes (`%07.4f` de los minutos en float, sin
+acarreo a grados): el mensaje sale byte a byte idéntico al de la versión en texto.
+
+`Geo5Message` reescribe campos de un mensaje ya armado (fecha/hora, ID) sin recalcular
+el XOR completo: como el XOR es reversible, se quitan los bytes del campo viejo y se
+agregan los del nuevo.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+GEO5_PREFIX = b">RGP"
+# Segmento constante entre el campo estado y el evento
+GEO5_FIXED = b"000001;&"
+# Secuencia de mensaje (siempre 0001 en este servidor)
+GEO5_SEQ = b"0001"
+
+# Máximo de colas cacheadas (equipo, evento) antes de vaciar el cache
+TAIL_CACHE_MAX = 20000
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def xor_bytes(data: BytesLike) -> int:
+    """XOR de todos los bytes de `data` (plegado del entero por desplazamientos, sin loop por byte)."""
+    n = len(data)
+    if n == 0:
+        return 0
+    x = int.from_bytes(data, "little")
+    if n <= 16:
+        # Campos sueltos (fecha/hora, ID)
+        x ^= x >> 64
+        x ^= x >> 32
+        x ^= x >> 16
+        x ^= x >> 8
+        return x & 0xFF
+    if n <= 128:
+        # Caso GEO5 (mensajes completos < 128 bytes): plegado fijo 1024 -> 8 bits
+        x ^= x >> 512
+        x ^= x >> 256
+        x ^= x >> 128
+        x ^= x >> 64
+        x ^= x >> 32
+        x ^= x >> 16
+        x ^= x >> 8
+        return x & 0xFF
+    shift = 8
+    while (shift >> 3) < n:
+        shift <<= 1
+    while shift > 8:
+        shift >>= 1
+        x ^= x >> shift
+    return x & 0xFF
+
+
+def checksum_hex(value: int) -> bytes:
+    """Checksum como 2 dígitos hex en mayúsculas (igual que `protocolo.sacar_checksum`)."""
+    return b"%02X" % value
+
+
+def format_coord(value: float, deg_digits: int) -> bytes:
+    """
+    Coordenada decimal con signo -> `±GGMM.MMMM` (lat, deg_digits=2) o `±GGGMM.MMMM` (lon, 3).
+    '+' Norte/Este, '-' Sur/Oeste.
+    """
+    a = abs(float(value))
+    deg = int(a)
+    return b"%s%0*d%07.4f" % (b"-" if value < 0 else b"+", deg_digits, deg, (a - deg) * 60.0)
+
+
+class Geo5Encoder:
+    """Arma mensajes GEO5 en bytes; cachea la cola constante y su XOR por (ID, evento)."""
+
+    def __init__(self):
+        self._tails: Dict[Tuple[str, str], Tuple[bytes, int]] = {}
+        self._lock = threading.Lock()
+        self._prefix_xor = xor_bytes(GEO5_PREFIX)
+
+    def _tail(self, device_id: str, evento: str) -> Tuple[bytes, int]:
+        key = (device_id, evento)
+        cached = self._tails.get(key)
+        if cached is not None:
+            return cached
+        tail = GEO5_FIXED + evento.encode("ascii") + b";ID=" + device_id.encode("ascii") + b";#" + GEO5_SEQ + b"*"
+        cached = (tail, xor_bytes(tail))
+        with self._lock:
+            if len(self._tails) >= TAIL_CACHE_MAX:
+                self._tails.clear()
+            self._tails[key] = cached
+        return cached
+
+    def encode(
+        self,
+        timestamp: str,
+        latitude: float,
+        longitude: float,
+        speed: int,
+        heading: int,
+        status: str,
+        evento: str,
+        device_id: str,
+    ) -> bytes:
+        """
+        Mensaje GEO5 completo. `timestamp` en ddmmyyhhmmss; `speed` y `heading` enteros
+        (3 dígitos); `status` '1'/'0'; `evento` 2 dígitos ('01', '08').
+        """
+        body = b"%s%s%s%03d%03d%s" % (
+            timestamp.encode("ascii"),
+            format_coord(latitude, 2),
+            format_coord(longitude, 3),
+            int(speed),
+            int(heading),
+            status.encode("ascii"),
+        )
+        tail, tail_xor = self._tail(str(device_id), evento)
+        cs = self._prefix_xor ^ xor_bytes(body) ^ tail_xor
+        return GEO5_PREFIX + body + tail + checksum_hex(cs) + b"<"
+
+
+# Instancia compartida (el cache de colas es por proceso)
+encoder = Geo5Encoder()
+
+
+def encode_position(
+    timestamp: str,
+    latitude: float,
+    longitude: float,
+    speed: int,
+    heading: int,
+    status: str = "1",
+    evento: str = "01",
+    device_id: str = "",
+) -> bytes:
+    return encoder.encode(timestamp, latitude, longitude, speed, heading, status, evento, device_id)
+
+
+# Offsets de fecha/hora tras ">RGP": ddmmyy (4-10) + hhmmss (10-16)
+_TS_START = 4
+_TS_END = 16
+
+
+class Geo5Message:
+    """
+    Mensaje GEO5 en un `bytearray` con los offsets de ID y checksum ya ubicados y el XOR
+    (desde '>' hasta '*' inclusive) calculado una sola vez.
+
+    Las reescrituras ajustan ese XOR con los bytes que salen y entran, sin recorrer de
+    nuevo el mensaje. `parse()` devuelve None si el texto no tiene la forma esperada
+    (un solo '*' seguido del checksum y '<'); en ese caso usar las funciones de
+    `protocolo` que recalculan todo.
+    """
+
+    __slots__ = ("buf", "xor", "star", "declared")
+
+    def __init__(self, buf: bytearray, xor: int, star: int, declared: bytes):
+        self.buf = buf
+        self.xor = xor
+        self.star = star
+        self.declared = declared
+
+    @classmethod
+    def parse(cls, message: Union[str, BytesLike]) -> Optional["Geo5Message"]:
+        if isinstance(message, str):
+            try:
+                raw = message.encode("ascii")
+            except UnicodeEncodeError:
+                return None
+        else:
+            raw = bytes(message)
+        if not raw.startswith(b">") or not raw.endswith(b"<"):
+            return None
+        star = raw.find(b"*")
+        if star < 0 or star >= len(raw) - 1 or raw.find(b"*", star + 1) >= 0:
+            return None
+        return cls(bytearray(raw), xor_bytes(raw[: star + 1]), star, raw[star + 1 : -1])
+
+    def checksum_ok(self) -> bool:
+        """True si el checksum declarado coincide con el XOR calculado."""
+        return self.declared.strip().upper() == checksum_hex(self.xor)
+
+    def replace_datetime(self, ddmmyy: str, hhmmss: str) -> bool:
+        """
+        Reemplaza en el lugar fecha y hora tras ">RGP" y ajusta el checksum.
+        Devuelve False si el mensaje no es >RGP o es demasiado corto.
+        """
+        if len(ddmmyy) != 6 or len(hhmmss) != 6 or self.star < _TS_END:
+            return False
+        if not self.buf.startswith(GEO5_PREFIX):
+            return False
+        buf = self.buf
+        new = (ddmmyy + hhmmss).encode("ascii")
+        self.xor ^= xor_bytes(buf[_TS_START:_TS_END]) ^ xor_bytes(new)
+        buf[_TS_START:_TS_END] = new
+        buf[self.star + 1 :] = b"%02X<" % self.xor
+        return True
+
+    def _id_span(self) -> Optional[Tuple[int, int]]:
+        t = self.buf.find(b";ID=")
+        if t < 0:
+            return None
+        id_start = t + 4
+        h = self.buf.find(b";#", id_start)
+        if h < 0 or h >= self.star:
+            return None
+        return id_start, h
+
+    def id_variants(self, new_ids: Iterable[str]) -> Dict[str, bytes]:
+        """
+        Una copia del mensaje por cada ID de `new_ids`, con `ID=` reemplazado y su checksum.
+        Cabecera y cola se comparten; por variante solo se hace XOR del ID nuevo.
+        Devuelve {} si el mensaje no tiene campo ID.
+        """
+        span = self._id_span()
+        if span is None:
+            return {}
+        id_start, id_end = span
+        buf = self.buf
+        head = bytes(buf[:id_start])
+        mid = bytes(buf[id_end : self.star + 1])
+        base_xor = self.xor ^ xor_bytes(buf[id_start:id_end])
+        out: Dict[str, bytes] = {}
+        for new_id in new_ids:
+            if new_id in out:
+                continue
+            nid = str(new_id).encode("ascii")
+            out[new_id] = head + nid + mid + checksum_hex(base_xor ^ xor_bytes(nid)) + b"<"
+        return out
+
+    def with_id(self, new_id: str) -> Optional[bytes]:
+        return self.id_variants((new_id,)).get(new_id)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.buf)
+
+    def text(self) -> str:
+        return self.buf.decode("ascii")
@@ -15,11 +15,24 @@ import os
 import socket
 import sys
 import threading
+import time
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import List, Optional
 
+import log_writer
 import protocolo
-from reenvios_config import ForwardingRule, append_reenvio_log, load_reenvios_config, normalize_equipo_key
+import udp_sender
+from config_watcher import ConfigWatcher
+from geo5_codec import Geo5Message
+from log_archive import LogArchiver
+from reenvios_config import (
+    EMPTY_ROUTE_PLAN,
+    RouteIndex,
+    RoutePlan,
+    append_reenvio_log,
+    load_reenvios_config,
+    normalize_equipo_key,
+)
 
 LOG_DIR = "logsUDP"
 DEFAULT_LISTEN_PORT = 6003
@@ -44,9 +57,7 @@ def _daily_log_path(log_dir: str = LOG_DIR) -> str:
 
 def _append_line(log_dir: str, line: str) -> None:
     try:
-        path = _daily_log_path(log_dir)
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
+        log_writer.get_writer().write(log_writer.daily_pattern(log_dir or LOG_DIR, "LOG_%d%m%y.txt"), line)
     except Exception:
         pass
 
@@ -107,10 +118,14 @@ class Geo5UdpRelayServer:
         reload_interval_seconds: int = 60,
         log_dir: str = LOG_DIR,
         general_destinations: Optional[List[tuple]] = None,
+        log_archive_days: int = 365,
     ):
         self.host = host
         self.port = int(port)
         self.log_dir = log_dir
+        # Logs de días anteriores comprimidos a .gz (log_archive.py); 0 = no archivar
+        self.log_archive_days = int(log_archive_days)
+        self._archiver: Optional[LogArchiver] = None
         if general_destinations is None:
             self.general_destinations = list(DEFAULT_GENERAL_DESTINATIONS)
         else:
@@ -125,10 +140,10 @@ class Geo5UdpRelayServer:
             config_path if config_path is not None else os.path.join(base_dir, DEFAULT_CONFIG_NAME)
         )
         self._config_lock = threading.RLock()
-        self._rules_by_device: Dict[str, List[ForwardingRule]] = {}
+        # Índice de planes por equipo; se reemplaza entero al recargar
+        self._route_index = RouteIndex({})
         self._config_last_mtime: Optional[float] = None
-        self._reload_stop = threading.Event()
-        self._reload_thread: Optional[threading.Thread] = None
+        self._watcher: Optional[ConfigWatcher] = None
         self._sock: Optional[socket.socket] = None
         self.running = False
         self.message_count = 0
@@ -136,7 +151,7 @@ class Geo5UdpRelayServer:
         self.logger = self._setup_logging()
 
         rules, warnings = load_reenvios_config(self.config_path)
-        self._rules_by_device = rules
+        self._route_index = RouteIndex(rules)
         for w in warnings:
             self.logger.warning(w)
         try:
@@ -153,19 +168,18 @@ class Geo5UdpRelayServer:
             sh = logging.StreamHandler(sys.stdout)
             sh.setFormatter(fmt)
             logger.addHandler(sh)
-            log_file = os.path.join(self.log_dir, f"Relay_{datetime.now().strftime('%Y%m%d')}.log")
-            fh = logging.FileHandler(log_file, encoding="utf-8")
+            fh = log_writer.DailyLogHandler(log_writer.daily_pattern(self.log_dir, "Relay_%Y%m%d.log"))
             fh.setFormatter(fmt)
             logger.addHandler(fh)
         return logger
 
-    def _rules_for(self, equipo_5: str) -> List[ForwardingRule]:
-        if not equipo_5:
-            return []
-        with self._config_lock:
-            return list(self._rules_by_device.get(equipo_5, []))
+    def _plan_for(self, equipo_5: str, full_id: str = "") -> RoutePlan:
+        if not equipo_5 and not full_id:
+            return EMPTY_ROUTE_PLAN
+        return self._route_index.lookup(equipo_5, full_id)
 
     def reload_config_if_changed(self, force: bool = False) -> bool:
+        t0 = time.perf_counter()
         try:
             mtime = os.path.getmtime(self.config_path)
         except Exception:
@@ -185,42 +199,44 @@ class Geo5UdpRelayServer:
             return False
 
         with self._config_lock:
-            self._rules_by_device = by_device
+            index = RouteIndex(by_device, previous=self._route_index)
+            self._route_index = index
             self._config_last_mtime = mtime
+        elapsed_ms = (time.perf_counter() - t0) * 1000
 
         for w in warnings:
             self.logger.warning(w)
         n_rules = sum(len(v) for v in by_device.values())
         self.logger.info(
-            f"Reenvíos UDP: reglas recargadas ({n_rules} reglas, {len(by_device)} equipos) "
-            f"desde {self.config_path}"
+            f"Reenvíos UDP: reglas recargadas ({n_rules} reglas, {len(by_device)} equipos, "
+            f"{index.changed} con cambios) en {elapsed_ms:.1f} ms desde {self.config_path}"
         )
         return True
 
-    def _reload_loop(self) -> None:
-        while not self._reload_stop.is_set():
-            if self.running:
-                try:
-                    self.reload_config_if_changed(force=False)
-                except Exception as e:
-                    self.logger.error(f"Reenvíos UDP: error recargando configuración: {e}")
-            if self._reload_stop.wait(self.reload_interval_seconds):
-                break
-
     def _start_reload_thread(self) -> None:
         if self.reload_interval_seconds <= 0:
             return
-        self._reload_stop = threading.Event()
-        self._reload_thread = threading.Thread(target=self._reload_loop, daemon=True)
-        self._reload_thread.start()
-        self.logger.info(
-            f"Reenvíos UDP: recarga automática cada {self.reload_interval_seconds}s ({self.config_path})"
+
+        def on_error(e: Exception) -> None:
+            self.logger.error(f"Reenvíos UDP: error recargando configuración: {e}")
+
+        self._watcher = ConfigWatcher(
+            self.config_path,
+            on_change=lambda: self.reload_config_if_changed(force=True),
+            poll_interval=self.reload_interval_seconds,
+            on_error=on_error,
         )
+        self._watcher.start()
+        if self._watcher.mode == "inotify":
+            detail = "inotify"
+        else:
+            detail = f"polling cada {self.reload_interval_seconds}s"
+        self.logger.info(f"Reenvíos UDP: recarga automática ({detail}) de {self.config_path}")
 
     def _stop_reload_thread(self) -> None:
-        self._reload_stop.set()
-        if self._reload_thread and self._reload_thread.is_alive():
-            self._reload_thread.join(timeout=2.0)
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
 
     def _send_one_udp(
         self,
@@ -230,12 +246,16 @@ class Geo5UdpRelayServer:
         tipo: str,
         cliente: str,
         dev_log: str,
+        payload_b: Optional[bytes] = None,
     ) -> bool:
-        payload_b = message.encode("utf-8")
+        if payload_b is None:
+            payload_b = message.encode("utf-8")
         try:
             guardar_log_packet(self.log_dir, "->", "UDP", dest_ip, dest_port, message, dev_log)
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                sock.sendto(payload_b, (dest_ip, dest_port))
+            if not udp_sender.get_sender().send(dest_ip, dest_port, payload_b):
+                # Cola llena o circuito abierto (contadores en udp_sender.stats())
+                self.logger.debug(f"Reenvío UDP GEO5 a {dest_ip}:{dest_port} descartado")
+                return False
             append_reenvio_log(
                 dev_log,
                 tipo,
@@ -252,7 +272,7 @@ class Geo5UdpRelayServer:
             self.logger.error(f"Error reenvío UDP GEO5 a {dest_ip}:{dest_port}: {e}")
             return False
 
-    def _forward_geo5(self, message: str, device_id: str) -> int:
+    def _forward_geo5(self, message: str, device_id: str, payload_b: Optional[bytes] = None) -> int:
         """
         Reenvía el GEO5 ajustado:
           - destinos generales 179.43.115.190:7007 y 34.95.160.245:5032 si no hay SERVICIO
@@ -260,27 +280,24 @@ class Geo5UdpRelayServer:
         """
         dev5 = _equipo_5_digitos(device_id)
         dev_log = dev5 or device_id
-        rules = self._rules_for(dev5)
-        has_servicio = any(r.tipo == "SERVICIO" for r in rules)
+        plan = self._plan_for(dev5, (device_id or "").strip())
 
         sent = 0
-        if not has_servicio:
+        if plan.general:
             for g_host, g_port in self.general_destinations:
                 if self._send_one_udp(
-                    message, g_host, g_port, "GENERAL", "GENERAL", dev_log
+                    message, g_host, g_port, "GENERAL", "GENERAL", dev_log, payload_b
                 ):
                     sent += 1
 
-        for rule in rules:
-            if rule.protocolo_gps != "GEO5":
-                continue
+        for rule in plan.geo5 + plan.geo5_id:
             if rule.transporte != "UDP":
                 self.logger.warning(
                     f"Reenvíos UDP: regla línea {rule.line_no} ignorada (solo UDP GEO5 en este relay)."
                 )
                 continue
             if self._send_one_udp(
-                message, rule.ip, rule.port, rule.tipo, rule.cliente, dev_log
+                message, rule.ip, rule.port, rule.tipo, rule.cliente, dev_log, payload_b
             ):
                 sent += 1
         return sent
@@ -292,7 +309,10 @@ class Geo5UdpRelayServer:
             self.logger.warning(f"Paquete descartado (no GEO5 RGP) desde {src_ip}:{src_port}")
             return
 
-        if not protocolo.geo5_verify_checksum(message):
+        # XOR del mensaje calculado una vez: sirve para verificar y para ajustar fecha/hora
+        parsed = Geo5Message.parse(message)
+        checksum_ok = parsed.checksum_ok() if parsed else protocolo.geo5_verify_checksum(message)
+        if not checksum_ok:
             self.logger.warning(
                 f"Checksum GEO5 inválido desde {src_ip}:{src_port}; se procesa igualmente."
             )
@@ -305,12 +325,18 @@ class Geo5UdpRelayServer:
         )
 
         ddmmyy, hhmmss = _utc_timestamp_geo5()
-        adjusted = protocolo.geo5_replace_datetime_and_recompute_checksum(message, ddmmyy, hhmmss)
+        payload_b = None
+        if parsed and parsed.replace_datetime(ddmmyy, hhmmss):
+            # Checksum ajustado en el lugar (XOR del campo viejo fuera, el nuevo dentro)
+            payload_b = parsed.to_bytes()
+            adjusted = payload_b.decode("ascii")
+        else:
+            adjusted = protocolo.geo5_replace_datetime_and_recompute_checksum(message, ddmmyy, hhmmss)
         if not adjusted:
             self.logger.warning(f"No se pudo ajustar fecha/hora GEO5 (equipo {dev_log})")
             return
 
-        n = self._forward_geo5(adjusted, device_id)
+        n = self._forward_geo5(adjusted, device_id, payload_b)
         if n == 0:
             self.logger.info(
                 f"Mensaje de {dev_log} sin destinos "
@@ -324,8 +350,10 @@ class Geo5UdpRelayServer:
         self.running = True
         self.start_time = datetime.now()
         self._start_reload_thread()
+        self._archiver = LogArchiver.for_days([self.log_dir], self.log_archive_days, logger=self.logger)
+        self._archiver.start()
 
-        n_rules = sum(len(v) for v in self._rules_by_device.values())
+        n_rules = self._route_index.n_rules
         self.logger.info(f"Relay GEO5 UDP escuchando en {self.host}:{self.port}")
         self.logger.info(f"Config: {self.config_path} ({n_rules} reglas)")
         for g_host, g_port in self.general_destinations:
@@ -350,13 +378,18 @@ class Geo5UdpRelayServer:
     def stop(self) -> None:
         self.running = False
         self._stop_reload_thread()
+        if self._archiver is not None:
+            self._archiver.stop()
         if self._sock:
             try:
                 self._sock.close()
             except Exception:
                 pass
             self._sock = None
+        # Vaciar los reenvíos encolados antes de salir
+        udp_sender.get_sender().flush(timeout=1.0)
         self.logger.info("Relay GEO5 UDP detenido")
+        log_writer.get_writer().flush()
 
 
 def main() -> None:
@@ -375,6 +408,12 @@ def main() -> None:
         help="Segundos entre recargas del CSV (0 = desactivar)",
     )
     parser.add_argument("--log-dir", default=LOG_DIR, help=f"Carpeta de logs (default {LOG_DIR})")
+    parser.add_argument(
+        "--log-archive-days",
+        type=int,
+        default=365,
+        help="Días que se conservan los logs comprimidos (0 = no archivar; se borran a los 30 días)",
+    )
     parser.add_argument("--daemon", action="store_true", help="Modo daemon (sin prompts)")
     args = parser.parse_args()
 
@@ -388,6 +427,7 @@ def main() -> None:
         config_path=args.config,
         reload_interval_seconds=args.reload_interval,
         log_dir=args.log_dir,
+        log_archive_days=args.log_archive_days,
     )
 
     try:
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+"""
+Archivo comprimido por bloques de los logs diarios cerrados.
+
+`cleanup_old_logs` borraba los logs a los 30 días (y corría en `start()`, bloqueando el
+arranque). `LogArchiver` corre en background: comprime los archivos de días anteriores
+(`LOG_*`, `RPG_*`, `Reenvios_*`, `Relay_*`, en `logs/` y `logsUDP/`) a `<nombre>.gz` y borra
+el original; los `.gz` se conservan `keep_days` días (365 por defecto). Con el archivado
+apagado (`archive=False`, `--log-archive-days=0`) el mismo thread solo borra los logs de más
+de `PLAIN_KEEP_DAYS` días, como hacía `cleanup_old_logs`.
+
+Formato: gzip multi-miembro (se lee con `zcat`/`zgrep` como cualquier .gz). Cada miembro es
+un bloque de ~1 MB de líneas completas que se descomprime solo; al final, miembros vacíos
+con la tabla de bloques en el campo FEXTRA (offset sin comprimir → offset comprimido) y un
+pie de largo fijo que dice dónde empieza la tabla. `open_log(path)` devuelve un archivo
+seekable por offsets **sin comprimir** que descomprime solo los bloques que se leen: el visor
+de logs, el índice por equipo y la bisección por hora funcionan igual sobre un `.gz`.
+"""
+
+from __future__ import annotations
+
+import bisect
+import io
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+ARCHIVE_SUFFIX = ".gz"
+BLOCK_SIZE = 1024 * 1024
+COMPRESS_LEVEL = 6
+# Días que se conservan los archivos comprimidos
+DEFAULT_KEEP_DAYS = 365
+# Días que se conservan los logs sin comprimir cuando el archivado está apagado
+PLAIN_KEEP_DAYS = 30
+# Un log de un día anterior se considera cerrado si no se escribe hace tanto
+CLOSE_GRACE_SECONDS = 600
+
+# Series diarias: prefijo, formato de fecha, extensión
+DAILY_SERIES = (
+    ("LOG_", "%d%m%y", ".txt"),
+    ("RPG_", "%d%m%y", ".txt"),
+    ("Reenvios_", "%Y%m%d", ".log"),
+    ("Relay_", "%Y%m%d", ".log"),
+)
+_SERIES_RE = [
+    (re.compile(rf"^{re.escape(prefix)}(\d{{{6 if fmt == '%d%m%y' else 8}}}){re.escape(ext)}(\.gz)?$"), fmt)
+    for prefix, fmt, ext in DAILY_SERIES
+]
+
+_MAGIC = b"TQLOGARC"
+_ENTRY = struct.Struct("<QQ")
+_FOOTER = struct.Struct("<8sQQQ")  # magic, tamaño sin comprimir, inicio de la tabla, bloques
+_ENTRIES_PER_MEMBER = 4000  # 64000 bytes: entra en un FEXTRA (máx 65535)
+_EMPTY_DEFLATE = b"\x03\x00"
+
+
+def _extra_member(si: bytes, data: bytes) -> bytes:
+    """Miembro gzip vacío con un subcampo FEXTRA (`zcat` no produce salida para él)."""
+    extra = si + struct.pack("<H", len(data)) + data
+    header = b"\x1f\x8b\x08\x04" + b"\x00\x00\x00\x00" + b"\x00\xff" + struct.pack("<H", len(extra))
+    return header + extra + _EMPTY_DEFLATE + b"\x00\x00\x00\x00" + b"\x00\x00\x00\x00"
+
+
+_FOOTER_LEN = len(_extra_member(b"TF", b"\x00" * _FOOTER.size))
+
+
+def _member_extra(member: bytes) -> bytes:
+    xlen = struct.unpack_from("<H", member, 10)[0]
+    extra = member[12:12 + xlen]
+    return extra[4:4 + struct.unpack_from("<H", extra, 2)[0]]
+
+
+def log_day(name: str) -> Optional[datetime]:
+    """Día de un log diario según su nombre (también `.gz`); None si no es de una serie."""
+    for rx, fmt in _SERIES_RE:
+        m = rx.match(name)
+        if m:
+            try:
+                return datetime.strptime(m.group(1), fmt)
+            except ValueError:
+                return None
+    return None
+
+
+def is_archive(path) -> bool:
+    return str(path).endswith(ARCHIVE_SUFFIX)
+
+
+# ----------------------------------------------------------------------
+# Escritura
+# ----------------------------------------------------------------------
+
+def compress_file(src: str, dst: str, block_size: int = BLOCK_SIZE, level: int = COMPRESS_LEVEL) -> Tuple[int, int]:
+    """Comprime `src` en `dst` (vía temporal + rename). Devuelve (bytes originales, comprimidos)."""
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    entries: List[Tuple[int, int]] = []
+    raw_off = comp_off = 0
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            buf = b""
+            eof = False
+            while True:
+                while not eof and len(buf) < block_size:
+                    chunk = fin.read(block_size)
+                    if chunk:
+                        buf += chunk
+                    else:
+                        eof = True
+                if not buf:
+                    break
+                if eof and len(buf) <= block_size:
+                    cut = len(buf)
+                else:
+                    # Bloques de líneas completas (salvo una línea más larga que el bloque)
+                    cut = buf.rfind(b"\n", 0, block_size) + 1 or min(block_size, len(buf))
+                block, buf = buf[:cut], buf[cut:]
+                comp = zlib.compressobj(level, zlib.DEFLATED, 31)
+                member = comp.compress(block) + comp.flush()
+                fout.write(member)
+                entries.append((raw_off, comp_off))
+                raw_off += len(block)
+                comp_off += len(member)
+            table_start = comp_off
+            for i in range(0, len(entries), _ENTRIES_PER_MEMBER):
+                part = b"".join(_ENTRY.pack(r, c) for r, c in entries[i:i + _ENTRIES_PER_MEMBER])
+                fout.write(_extra_member(b"TB", part))
+            fout.write(_extra_member(b"TF", _FOOTER.pack(_MAGIC, raw_off, table_start, len(entries))))
+            fout.flush()
+            os.fsync(fout.fileno())
+        # Conservar la fecha del log original (retención y listado por mtime)
+        st = os.stat(src)
+        os.utime(tmp, (st.st_atime, st.st_mtime))
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return raw_off, os.path.getsize(dst)
+
+
+# ----------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------
+
+class ArchiveReader:
+    """Tabla de bloques de un archivo comprimido y lectura de bloques sueltos."""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _FOOTER_LEN:
+                raise ValueError(f"{self.path}: archivo sin tabla de bloques")
+            f.seek(size - _FOOTER_LEN)
+            magic, raw_size, table_start, n_blocks = _FOOTER.unpack(_member_extra(f.read(_FOOTER_LEN)))
+            if magic != _MAGIC:
+                raise ValueError(f"{self.path}: archivo sin tabla de bloques")
+            f.seek(table_start)
+            table = f.read(size - _FOOTER_LEN - table_start)
+        raw_offs: List[int] = []
+        comp_offs: List[int] = []
+        pos = 0
+        while pos < len(table):
+            xlen = struct.unpack_from("<H", table, pos + 10)[0]
+            member_len = 12 + xlen + len(_EMPTY_DEFLATE) + 8
+            for r, c in _ENTRY.iter_unpack(_member_extra(table[pos:pos + member_len])):
+                raw_offs.append(r)
+                comp_offs.append(c)
+            pos += member_len
+        if len(raw_offs) != n_blocks:
+            raise ValueError(f"{self.path}: tabla de bloques incompleta")
+        comp_offs.append(table_start)
+        self.raw_size = raw_size
+        self.raw_offs = raw_offs
+        self.comp_offs = comp_offs
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+
+    def block_index(self, raw_offset: int) -> int:
+        return max(0, bisect.bisect_right(self.raw_offs, raw_offset) - 1)
+
+    def read_block(self, i: int, f: Optional[BinaryIO] = None) -> bytes:
+        data = self._cache.get(i)
+        if data is not None:
+            self._cache.move_to_end(i)
+            return data
+        start, end = self.comp_offs[i], self.comp_offs[i + 1]
+        if f is None:
+            with open(self.path, "rb") as fh:
+                fh.seek(start)
+                member = fh.read(end - start)
+        else:
+            f.seek(start)
+            member = f.read(end - start)
+        data = zlib.decompress(member, 31)
+        self._cache[i] = data
+        while len(self._cache) > 4:
+            self._cache.popitem(last=False)
+        return data
+
+
+class _ArchiveRaw(io.RawIOBase):
+    """Vista seekable (offsets sin comprimir) de un archivo comprimido por bloques."""
+
+    def __init__(self, reader: ArchiveReader):
+        self.reader = reader
+        self.pos = 0
+        self._f = open(reader.path, "rb")
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.reader.raw_size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def readinto(self, b) -> int:
+        if self.pos >= self.reader.raw_size or not self.reader.raw_offs:
+            return 0
+        i = self.reader.block_index(self.pos)
+        block = self.reader.read_block(i, self._f)
+        start = self.pos - self.reader.raw_offs[i]
+        n = min(len(b), len(block) - start)
+        if n <= 0:
+            return 0
+        b[:n] = block[start:start + n]
+        self.pos += n
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+
+_readers: "OrderedDict[Tuple[str, int, int], ArchiveReader]" = OrderedDict()
+_readers_lock = threading.Lock()
+
+
+def get_reader(path) -> ArchiveReader:
+    """Lector (con su tabla de bloques) cacheado por archivo."""
+    path = str(path)
+    st = os.stat(path)
+    key = (path, st.st_ino, st.st_size)
+    with _readers_lock:
+        reader = _readers.get(key)
+        if reader is not None:
+            _readers.move_to_end(key)
+            return reader
+    reader = ArchiveReader(path)
+    with _readers_lock:
+        _readers[key] = reader
+        while len(_readers) > 32:
+            _readers.popitem(last=False)
+    return reader
+
+
+def open_log(path, buffer_size: int = 64 * 1024) -> BinaryIO:
+    """Abre un log en binario; si es un `.gz` del archivo, por offsets sin comprimir."""
+    if is_archive(path):
+        return io.BufferedReader(_ArchiveRaw(get_reader(path)), buffer_size)
+    return open(path, "rb", buffering=buffer_size)
+
+
+def log_size(path) -> int:
+    """Tamaño del log sin comprimir."""
+    if is_archive(path):
+        return get_reader(path).raw_size
+    return os.stat(path).st_size
+
+
+# ----------------------------------------------------------------------
+# Archivador en background
+# ----------------------------------------------------------------------
+
+class LogArchiver:
+    """
+    Thread que cada `interval` segundos comprime los logs diarios cerrados de `log_dirs` y
+    borra los `.gz` de más de `keep_days` días. Con `archive=False` no comprime: solo borra
+    los logs de más de `keep_days` días. Si varios procesos lo corren sobre la misma carpeta,
+    un lock (`.archiver.lock`, donde hay fcntl) hace que trabaje uno solo.
+    """
+
+    def __init__(
+        self,
+        log_dirs: Iterable[str] = ("logs", "logsUDP"),
+        keep_days: int = DEFAULT_KEEP_DAYS,
+        interval: float = 3600.0,
+        logger=None,
+        archive: bool = True,
+    ):
+        self.log_dirs = list(log_dirs)
+        self.keep_days = keep_days
+        self.archive = archive
+        self.interval = interval
+        self.logger = logger
+        self.archived = 0
+        self.deleted = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="log-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+
+    @classmethod
+    def for_days(cls, log_dirs: Iterable[str], archive_days: int, logger=None) -> "LogArchiver":
+        """
+        El de `--log-archive-days=N`: archiva y conserva N días, o con N <= 0 solo borra los
+        logs de más de PLAIN_KEEP_DAYS días.
+        """
+        if archive_days > 0:
+            return cls(log_dirs, keep_days=archive_days, logger=logger)
+        return cls(log_dirs, keep_days=PLAIN_KEEP_DAYS, logger=logger, archive=False)
+
+    def describe(self) -> str:
+        if self.archive:
+            return f"días anteriores a .gz, se conservan {self.keep_days} días"
+        return f"sin archivar, se borran los logs de más de {self.keep_days} días"
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "archive": self.archive,
+            "keep_days": self.keep_days,
+            "archived": self.archived,
+            "deleted": self.deleted,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+    def _log(self, msg: str, error: bool = False) -> None:
+        if self.logger is not None:
+            (self.logger.error if error else self.logger.info)(msg)
+
+    def _run(self) -> None:
+        # Esperar un poco: no competir con el arranque del servidor
+        if self._stop.wait(30):
+            return
+        while True:
+            for d in self.log_dirs:
+                if self._stop.is_set():
+                    return
+                try:
+                    self.run_once(d)
+                except Exception as e:
+                    self._log(f"Archivador de logs: error en {d}: {e}", error=True)
+            if self._stop.wait(self.interval):
+                return
+
+    def run_once(self, log_dir: str, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Una pasada sobre `log_dir` (también se puede llamar a mano, p. ej. desde cleanup_logs)."""
+        if not os.path.isdir(log_dir):
+            return {"archived": 0, "deleted": 0}
+        lock = None
+        if fcntl is not None:
+            lock = open(os.path.join(log_dir, ".archiver.lock"), "a")
+            try:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                return {"archived": 0, "deleted": 0}
+        try:
+            return self._pass(log_dir, now or datetime.now())
+        finally:
+            if lock is not None:
+                lock.close()
+
+    def _pass(self, log_dir: str, now: datetime) -> Dict[str, int]:
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        cutoff = today - timedelta(days=self.keep_days)
+        archived = deleted = 0
+        for name in sorted(os.listdir(log_dir)):
+            if self._stop.is_set():
+                break
+            day = log_day(name)
+            if day is None:
+                continue
+            path = os.path.join(log_dir, name)
+            try:
+                if day < cutoff:
+                    os.remove(path)
+                    _remove_index_sidecar(log_dir, name)
+                    deleted += 1
+                    continue
+                if not self.archive or is_archive(name) or day >= today:
+                    continue
+                if time.time() - os.path.getmtime(path) < CLOSE_GRACE_SECONDS:
+                    continue  # todavía pueden llegar líneas del cambio de día
+                dst = path + ARCHIVE_SUFFIX
+                raw, comp = compress_file(path, dst)
+                os.remove(path)
+                _remove_index_sidecar(log_dir, name)
+                archived += 1
+                self.bytes_in += raw
+                self.bytes_out += comp
+                self._log(
+                    f"Log archivado: {name} → {name}{ARCHIVE_SUFFIX} "
+                    f"({raw / 1048576:.1f} MB → {comp / 1048576:.1f} MB)"
+                )
+            except FileNotFoundError:
+                continue  # otro proceso lo archivó/borró en el medio
+            except Exception as e:
+                self._log(f"Archivador de logs: no se pudo procesar {path}: {e}", error=True)
+        self.archived += archived
+        self.deleted += deleted
+        return {"archived": archived, "deleted": deleted}
+
+
+def _remove_index_sidecar(log_dir: str, name: str) -> None:
+    # Índice por equipo del visor de logs (administracion/publicacion/log_index.py)
+    sidecar = os.path.join(log_dir, ".index", name + ".idx")
+    try:
+        os.remove(sidecar)
+    except OSError:
+        pass
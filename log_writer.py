@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Escritura de logs de texto en background (un thread por proceso).
+
+Antes cada línea de log (`funciones.guardarLog`, `guardarLogArchivo`,
+`reenvios_config.append_reenvio_log`, log de paquetes del relay) hacía `os.path.exists`,
+armaba el nombre del archivo del día, `open`, escribía una línea y cerraba. Una posición
+genera cinco o más líneas (paquete entrante, cada destino, Reenvios_*.log).
+
+`BackgroundLogWriter.write(patron, linea)` solo encola (`queue.SimpleQueue`, sin lock para
+los productores) y vuelve. El thread escritor, cada `flush_interval` segundos:
+
+- agrupa las líneas por archivo y hace **un** `write()` por archivo (una syscall: los
+  archivos se abren en binario sin buffer y en modo append, así varios procesos pueden
+  escribir el mismo log sin mezclar líneas);
+- mantiene abiertos los archivos del día; el nombre sale de `patron` (formato `strftime`,
+  p. ej. `logs/LOG_%d%m%y.txt`) con la hora de **cada línea**, así el cambio de día ocurre
+  a medianoche aunque el proceso lleve días corriendo;
+- al cerrar (`close()`, también registrado con `atexit`) vacía la cola, hace `fsync` y
+  cierra los archivos.
+
+Las líneas encoladas y todavía no escritas (a lo sumo `flush_interval`) se pierden si el
+proceso muere de golpe. Con el escritor cerrado, `write()` escribe en el momento.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_FLUSH_INTERVAL = 0.2
+
+_STOP = object()
+
+
+class BackgroundLogWriter:
+    """Cola de líneas + thread que las escribe en archivos diarios abiertos."""
+
+    def __init__(self, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        # patrón -> (ruta actual, archivo)
+        self._files: Dict[str, Tuple[str, object]] = {}
+        # (patrón, día y hora) -> ruta (patrones diarios u horarios)
+        self._paths: Dict[Tuple[str, Tuple[int, int, int, int]], str] = {}
+        self.lines = 0
+        self.batches = 0
+        self.errors = 0
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def write(self, pattern: str, line: str, when: Optional[float] = None) -> None:
+        """Encola `line` (sin salto de línea final) para el archivo `pattern` del día de `when`."""
+        item = (pattern, when if when is not None else time.time(), line)
+        if self._closed:
+            self._write_batch([item], sync=True)
+            return
+        if self._thread is None:
+            self._start()
+        self._queue.put(item)
+
+    def flush(self, timeout: float = 2.0) -> bool:
+        """Espera a que se escriba lo encolado hasta ahora."""
+        if self._thread is None or self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Vacía la cola, hace fsync y cierra los archivos."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            if thread.is_alive():
+                # Sigue escribiendo (disco lento): al ver _STOP cierra él los archivos
+                return
+        # Lo que se encoló en paralelo con el cierre
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, tuple):
+                rest.append(item)
+            elif isinstance(item, threading.Event):
+                item.set()
+        if rest:
+            self._write_batch(rest)
+        self._close_files(sync=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "lines": self.lines,
+            "batches": self.batches,
+            "errors": self.errors,
+            "open_files": len(self._files),
+            "queued": self._queue.qsize(),
+        }
+
+    # ------------------------------------------------------------------
+    # Thread escritor
+    # ------------------------------------------------------------------
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            batch = []
+            events = []
+            items = [first]
+            if first is not _STOP:
+                # Juntar lo que llegue durante el intervalo: un write() por archivo
+                time.sleep(self.flush_interval)
+            while True:
+                for item in items:
+                    if item is _STOP:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        events.append(item)
+                    else:
+                        batch.append(item)
+                try:
+                    items = [self._queue.get_nowait()]
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+            for ev in events:
+                ev.set()
+        self._close_files(sync=True)
+
+    def _path_for(self, pattern: str, when: float) -> str:
+        lt = time.localtime(when)
+        key = (pattern, (lt.tm_year, lt.tm_mon, lt.tm_mday, lt.tm_hour))
+        path = self._paths.get(key)
+        if path is None:
+            path = time.strftime(pattern, lt)
+            if len(self._paths) > 1024:
+                self._paths.clear()
+            self._paths[key] = path
+        return path
+
+    def _file_for(self, pattern: str, path: str):
+        current = self._files.get(pattern)
+        if current is not None:
+            if current[0] == path:
+                return current[1]
+            # Cambio de día: se cierra el archivo anterior
+            self._close_file(current[1], sync=False)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        f = open(path, "ab", buffering=0)
+        self._files[pattern] = (path, f)
+        return f
+
+    def _write_batch(self, batch, sync: bool = False) -> None:
+        grouped: Dict[Tuple[str, str], List[str]] = {}
+        for pattern, when, line in batch:
+            grouped.setdefault((pattern, self._path_for(pattern, when)), []).append(line)
+        for (pattern, path), lines in grouped.items():
+            data = ("\n".join(lines) + "\n").encode("utf-8", errors="replace")
+            try:
+                if sync:
+                    with open(path, "ab") as f:
+                        f.write(data)
+                else:
+                    self._file_for(pattern, path).write(data)
+                self.lines += len(lines)
+            except OSError:
+                self.errors += 1
+                current = self._files.pop(pattern, None)
+                if current is not None:
+                    self._close_file(current[1], sync=False)
+        self.batches += 1
+
+    @staticmethod
+    def _close_file(f, sync: bool) -> None:
+        try:
+            if sync:
+                os.fsync(f.fileno())
+            f.close()
+        except (OSError, ValueError):
+            pass
+
+    def _close_files(self, sync: bool) -> None:
+        files = list(self._files.values())
+        self._files.clear()
+        for _path, f in files:
+            self._close_file(f, sync)
+
+
+class DailyLogHandler(logging.Handler):
+    """
+    Handler de `logging` que escribe por el `BackgroundLogWriter` en un archivo diario
+    (`pattern` con formato strftime). A diferencia de `FileHandler` con el nombre del día
+    de arranque, cada registro va al archivo del día en que se generó.
+    """
+
+    def __init__(self, pattern: str, writer: Optional[BackgroundLogWriter] = None):
+        super().__init__()
+        self.pattern = pattern
+        self.writer = writer
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            (self.writer or get_writer()).write(self.pattern, self.format(record), record.created)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        (self.writer or get_writer()).flush()
+
+
+def daily_pattern(directory: str, name_pattern: str) -> str:
+    """Patrón strftime `directorio/nombre` (escapa '%' en el directorio)."""
+    return os.path.join((directory or ".").replace("%", "%%"), name_pattern)
+
+
+_writer: Optional[BackgroundLogWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> BackgroundLogWriter:
+    """Instancia compartida por proceso; se cierra (flush + fsync) al salir."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BackgroundLogWriter()
+                atexit.register(_writer.close)
+    return _writer
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Captura binaria de paquetes (entrantes y reenviados) en segmentos horarios.
+
+`guardarLogPacket` escribe cada paquete como hex en `LOG_DDMMYY.txt`: el doble del tamaño de
+la trama más los metadatos en texto, y truncado a 200 caracteres salvo
+`LOG_PACKET_PAYLOAD_FULL=1`. Con la captura activa (`--capture-dir`, ver README_LOGS.md)
+cada paquete se guarda completo como un registro binario con prefijo de largo:
+
+    magic(1) largo(4) timestamp(8, float) flags(1) puerto(2) len_ip(1) len_id(1)
+    ip (4/16 bytes empaquetados, o texto) + ID de equipo (ascii) + bytes crudos
+
+flags: bit0 saliente ("->"), bit1 UDP, bit2 payload de texto (GEO5/NMEA: se muestra tal
+cual; si no, en hex como hoy), bit3 IP en texto.
+
+Archivos: `CAP_YYYYMMDD_HH.tqcap` (uno por hora, escrito por el `BackgroundLogWriter`: un
+`write()` por segmento cada 0.2 s) y al lado `CAP_YYYYMMDD_HH.tqcap.idx`, índice ralo de
+pares (timestamp, offset) cada ~64 KB, para arrancar a leer cerca de una hora dada sin
+recorrer el segmento. Con `keep_hours` el writer borra, al pasar a un segmento nuevo, los
+segmentos (y sus `.idx`) de más de esa cantidad de horas.
+
+Uso como CLI (reproduce el formato de texto de LOG_DDMMYY.txt):
+
+    python packet_capture.py capturas/ --from "2026-10-17 09:00" --to "2026-10-17 09:15"
+    python packet_capture.py capturas/CAP_20261017_09.tqcap --device 26501
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import glob
+import heapq
+import ipaddress
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+import log_writer
+
+SEGMENT_PATTERN = "CAP_%Y%m%d_%H.tqcap"
+INDEX_SUFFIX = ".idx"
+# Una entrada de índice cada INDEX_STRIDE bytes de segmento (por proceso)
+INDEX_STRIDE = 64 * 1024
+
+MAGIC = 0xC7
+_HEADER = struct.Struct("<BIdBHBB")
+_INDEX = struct.Struct("<dQ")
+# Tope de cordura al leer (una trama TQ/GEO5 ocupa cientos de bytes)
+_MAX_BODY = 1 << 20
+
+FLAG_OUT = 0x01
+FLAG_UDP = 0x02
+FLAG_TEXT = 0x04
+FLAG_IP_TEXT = 0x08
+
+_SEGMENT_RE = re.compile(r"CAP_(\d{8})_(\d{2})\.tqcap$")
+
+
+class CaptureRecord(NamedTuple):
+    ts: float
+    direction: str
+    transport: str
+    ip: str
+    port: str
+    device_id: str
+    payload: bytes
+    is_text: bool
+
+    def payload_str(self) -> str:
+        if self.is_text:
+            return self.payload.decode("utf-8", errors="replace")
+        return self.payload.hex()
+
+
+def encode_record(
+    ts: float,
+    direction: str,
+    transport: str,
+    ip: str,
+    port,
+    device_id: str,
+    payload: Union[bytes, str],
+) -> bytes:
+    """Serializa un paquete (ver formato en el docstring del módulo)."""
+    flags = FLAG_OUT if direction != "<-" else 0
+    if (transport or "").strip().upper() == "UDP":
+        flags |= FLAG_UDP
+    if isinstance(payload, str):
+        flags |= FLAG_TEXT
+        payload = payload.encode("utf-8", errors="replace")
+    ip_s = (ip or "").strip()
+    try:
+        ip_b = ipaddress.ip_address(ip_s).packed
+    except ValueError:
+        ip_b = ip_s.encode("utf-8", errors="replace")[:255]
+        flags |= FLAG_IP_TEXT
+    try:
+        port_n = int(port) if port not in (None, "") else 0
+    except (TypeError, ValueError):
+        port_n = 0
+    if not 0 <= port_n <= 0xFFFF:
+        port_n = 0
+    dev_b = (device_id or "").strip().encode("ascii", errors="replace")[:255]
+    body_len = len(ip_b) + len(dev_b) + len(payload)
+    return b"".join((
+        _HEADER.pack(MAGIC, body_len, ts, flags, port_n, len(ip_b), len(dev_b)),
+        ip_b,
+        dev_b,
+        payload,
+    ))
+
+
+class PacketCapture(log_writer.BackgroundLogWriter):
+    """Escritor en background de registros binarios en segmentos horarios + índice ralo."""
+
+    def __init__(
+        self,
+        directory: str,
+        flush_interval: float = log_writer.DEFAULT_FLUSH_INTERVAL,
+        keep_hours: Optional[float] = None,
+    ):
+        super().__init__(flush_interval)
+        self.directory = directory
+        self.pattern = log_writer.daily_pattern(directory, SEGMENT_PATTERN)
+        # Retención: segmentos de más de keep_hours horas se borran (None/0 = no se borra nada)
+        self.keep_hours = keep_hours
+        # segmento -> offset de la última entrada de índice escrita por este proceso
+        self._indexed: Dict[str, int] = {}
+        self._last_segment: Optional[str] = None
+        self.bytes = 0
+        self.removed = 0
+
+    def capture(
+        self,
+        direction: str,
+        transport: str,
+        ip: str,
+        port,
+        device_id: str,
+        payload: Union[bytes, str],
+        when: Optional[float] = None,
+    ) -> None:
+        ts = time.time() if when is None else when
+        self.write(self.pattern, encode_record(ts, direction, transport, ip, port, device_id, payload), ts)
+
+    def stats(self) -> Dict[str, int]:
+        st = super().stats()
+        st["records"] = st.pop("lines")
+        st["bytes"] = self.bytes
+        st["removed"] = self.removed
+        return st
+
+    def _write_batch(self, batch, sync: bool = False) -> None:
+        grouped: Dict[tuple, list] = {}
+        for pattern, when, record in batch:
+            grouped.setdefault((pattern, self._path_for(pattern, when)), []).append((when, record))
+        for (pattern, path), records in grouped.items():
+            data = b"".join(r for _when, r in records)
+            try:
+                if sync:
+                    with open(path, "ab") as f:
+                        f.write(data)
+                        end = f.tell()
+                else:
+                    f = self._file_for(pattern, path)
+                    f.write(data)
+                    end = f.tell()
+                # En modo append la posición queda al final de lo escrito (aunque otro
+                # proceso haya escrito antes en el mismo segmento)
+                self._write_index(path, end - len(data), records)
+                self.lines += len(records)
+                self.bytes += len(data)
+            except OSError:
+                self.errors += 1
+                current = self._files.pop(pattern, None)
+                if current is not None:
+                    self._close_file(current[1], sync=False)
+            if path != self._last_segment:
+                # Segmento nuevo (cambio de hora o arranque): se aplica la retención
+                self._last_segment = path
+                self._prune()
+        self.batches += 1
+
+    def _prune(self, now: Optional[float] = None) -> None:
+        """Borra los segmentos (y sus `.idx`) que terminaron hace más de `keep_hours` horas."""
+        if not self.keep_hours or self.keep_hours <= 0:
+            return
+        cutoff = (time.time() if now is None else now) - self.keep_hours * 3600
+        for seg in glob.glob(os.path.join(self.directory, "CAP_*.tqcap")):
+            hour = _segment_hour(seg)
+            # El segmento cubre [hour, hour + 1h)
+            if hour is None or hour + 3600 > cutoff:
+                continue
+            for path in (seg, seg + INDEX_SUFFIX):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    self.errors += 1
+                    continue
+            self.removed += 1
+            self._indexed.pop(seg, None)
+
+    def _write_index(self, path: str, offset: int, records) -> None:
+        last = self._indexed.get(path)
+        entries = []
+        pos = offset
+        for when, record in records:
+            if last is None or pos - last >= INDEX_STRIDE:
+                entries.append(_INDEX.pack(when, pos))
+                last = pos
+            pos += len(record)
+        if len(self._indexed) > 64:
+            self._indexed.clear()
+        self._indexed[path] = last
+        if entries:
+            with open(path + INDEX_SUFFIX, "ab") as f:
+                f.write(b"".join(entries))
+
+
+# ----------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------
+
+def read_index(segment_path: str) -> List[tuple]:
+    """Entradas (timestamp, offset) del índice del segmento, ordenadas por timestamp."""
+    try:
+        with open(segment_path + INDEX_SUFFIX, "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+    n = len(data) // _INDEX.size
+    return sorted(_INDEX.iter_unpack(data[: n * _INDEX.size]))
+
+
+def start_offset(segment_path: str, ts_from: Optional[float]) -> int:
+    """Offset desde el que leer para no perder registros con timestamp >= ts_from."""
+    if ts_from is None:
+        return 0
+    entries = read_index(segment_path)
+    # 1 s de margen: los registros de distintos threads pueden llegar levemente desordenados
+    i = bisect.bisect_right(entries, (ts_from - 1.0, float("inf")))
+    return entries[i - 1][1] if i > 0 else 0
+
+
+def iter_records(segment_path: str, offset: int = 0) -> Iterator[CaptureRecord]:
+    """Recorre los registros de un segmento desde `offset` (se resincroniza si hay basura)."""
+    with open(segment_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= offset:
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        pos = offset
+        hsize = _HEADER.size
+        while pos + hsize <= size:
+            magic, body_len, ts, flags, port, ip_len, dev_len = _HEADER.unpack_from(mm, pos)
+            end = pos + hsize + body_len
+            if magic != MAGIC or body_len > _MAX_BODY or end > size or ip_len + dev_len > body_len:
+                # Registro cortado (proceso muerto a mitad de write): buscar el próximo
+                nxt = mm.find(bytes((MAGIC,)), pos + 1)
+                if nxt < 0:
+                    return
+                pos = nxt
+                continue
+            p = pos + hsize
+            ip_b = mm[p:p + ip_len]
+            p += ip_len
+            dev = mm[p:p + dev_len].decode("ascii", errors="replace")
+            p += dev_len
+            if flags & FLAG_IP_TEXT:
+                ip = ip_b.decode("utf-8", errors="replace")
+            else:
+                try:
+                    ip = str(ipaddress.ip_address(ip_b))
+                except ValueError:
+                    ip = ip_b.hex()
+            yield CaptureRecord(
+                ts,
+                "->" if flags & FLAG_OUT else "<-",
+                "UDP" if flags & FLAG_UDP else "TCP",
+                ip,
+                str(port) if port else "",
+                dev,
+                mm[p:end],
+                bool(flags & FLAG_TEXT),
+            )
+            pos = end
+    finally:
+        mm.close()
+
+
+def _segment_hour(path: str) -> Optional[float]:
+    m = _SEGMENT_RE.search(os.path.basename(path))
+    if not m:
+        return None
+    try:
+        return time.mktime(time.strptime(m.group(1) + m.group(2), "%Y%m%d%H"))
+    except ValueError:
+        return None
+
+
+def find_segments(paths: Sequence[str], ts_from: Optional[float] = None, ts_to: Optional[float] = None) -> List[str]:
+    """Segmentos `.tqcap` de `paths` (archivos o carpetas, recursivo) que cubren el rango."""
+    found = []
+    for p in paths:
+        if os.path.isdir(p):
+            found.extend(glob.glob(os.path.join(p, "**", "CAP_*.tqcap"), recursive=True))
+        else:
+            found.append(p)
+    out = []
+    for path in sorted(set(found)):
+        hour = _segment_hour(path)
+        if hour is not None:
+            # Margen de 1 s por registros encolados justo antes del cambio de hora
+            if ts_to is not None and hour > ts_to + 1.0:
+                continue
+            if ts_from is not None and hour + 3600 < ts_from - 1.0:
+                continue
+        out.append(path)
+    return out
+
+
+def read_range(
+    paths: Sequence[str],
+    ts_from: Optional[float] = None,
+    ts_to: Optional[float] = None,
+    device: str = "",
+) -> Iterator[CaptureRecord]:
+    """Registros de todos los segmentos en orden de timestamp (mezcla segmentos de workers)."""
+    device = (device or "").strip()
+
+    def _one(path: str) -> Iterator[CaptureRecord]:
+        for rec in iter_records(path, start_offset(path, ts_from)):
+            if ts_from is not None and rec.ts < ts_from:
+                continue
+            if ts_to is not None and rec.ts > ts_to:
+                continue
+            if device and not (rec.device_id == device or rec.device_id.endswith(device)):
+                continue
+            yield rec
+
+    segments = find_segments(paths, ts_from, ts_to)
+    return heapq.merge(*(_one(p) for p in segments), key=lambda r: r.ts)
+
+
+def _fecha_hora(ts: float) -> str:
+    # Mismo formato que funciones.getFechaHora (sin ceros a la izquierda)
+    d = datetime.fromtimestamp(ts)
+    return f"{d.day}/{d.month}/{d.year} {d.hour}:{d.minute}:{d.second}"
+
+
+def render_line(rec: CaptureRecord, max_payload: int = 0) -> str:
+    """Línea en el formato de guardarLogPacket en LOG_DDMMYY.txt."""
+    from funciones import _format_packet_metadata, _truncate_payload
+
+    payload = rec.payload_str()
+    if max_payload > 0:
+        payload = _truncate_payload(payload, max_payload)
+    meta = _format_packet_metadata(rec.transport, rec.ip, rec.port, rec.device_id)
+    if meta:
+        return f"{_fecha_hora(rec.ts)}: {rec.direction} [{meta}] {payload}"
+    return f"{_fecha_hora(rec.ts)}: {rec.direction} {payload}"
+
+
+def _parse_when(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"fecha inválida: {value!r} (use YYYY-MM-DD [HH:MM[:SS]])")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Muestra capturas binarias de paquetes en el formato de texto de LOG_DDMMYY.txt"
+    )
+    parser.add_argument("paths", nargs="+", help="Segmentos .tqcap o carpetas de captura")
+    parser.add_argument("--from", dest="ts_from", type=_parse_when, help="Desde (YYYY-MM-DD [HH:MM[:SS]])")
+    parser.add_argument("--to", dest="ts_to", type=_parse_when, help="Hasta (YYYY-MM-DD [HH:MM[:SS]])")
+    parser.add_argument("--device", default="", help="ID de equipo (5 o 10 dígitos)")
+    parser.add_argument(
+        "--truncate",
+        type=int,
+        default=0,
+        help="Truncar el payload a N caracteres como LOG_PACKET_PAYLOAD_MAX (default: completo)",
+    )
+    args = parser.parse_args(argv)
+
+    out = sys.stdout
+    try:
+        for rec in read_range(args.paths, args.ts_from, args.ts_to, args.device):
+            out.write(render_line(rec, args.truncate) + "\n")
+    except BrokenPipeError:
+        # `| head`: salir sin traceback
+        sys.stderr.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
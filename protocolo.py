@@ -1,4 +1,6 @@
+import crc16
 import funciones
+import geo5_codec
 import struct
 from datetime import datetime, timedelta
 
@@ -7,7 +9,14 @@ from datetime import datetime, timedelta
 # b'xx\r\x01\x08eF\x80P\x13\x82\x16\x00\xbe\xb9\xfa\r\n' BINARIO
 #
 #
-def Enviar0100(IDequipo):
+def Enviar0100(IDequipo, dato=None):
+    # Respuesta al login GT06 (7878 0D 01 [terminal 8] [serie 2] [CRC] 0D0A) armada con el
+    # terminal y la serie de la trama recibida; sin trama, la respuesta fija histórica
+    # (equivale a build_response_packet(0x01, 0865468050138216, 0x00BE)).
+    if dato:
+        valor = respuesta_gt06(dato)
+        if valor:
+            return valor
     valor = funciones.hexa2bytes("78780d01086546805013821600beb9fa0d0a")
     return valor 
     """0x0100:  terminal register
@@ -215,23 +224,6 @@ def getLONchino(dato):
         return 0.0
 
 
-def _geo5_fmt_lat_lon(xlat: float, xlon: float) -> tuple:
-    """
-    Formatea lat/lon decimales a GEO5 (GGMM.MMMM / GGGMM.MMMM) con signo explícito.
-    Campo c/e del protocolo: '+' Norte/Este, '-' Sur/Oeste.
-    """
-    lat_abs = abs(float(xlat))
-    lon_abs = abs(float(xlon))
-    lat_deg = int(lat_abs)
-    lon_deg = int(lon_abs)
-    lat_min = (lat_abs - lat_deg) * 60.0
-    lon_min = (lon_abs - lon_deg) * 60.0
-    lat_body = f"{lat_deg:02d}{lat_min:07.4f}"
-    lon_body = f"{lon_deg:03d}{lon_min:07.4f}"
-    lat_s = ("-" if xlat < 0 else "+") + lat_body
-    lon_s = ("-" if xlon < 0 else "+") + lon_body
-    return lat_s, lon_s
-
 def getVELchino(dato):
     """Extraer velocidad del protocolo TQ (en nudos/knots)"""
     try:
@@ -428,10 +420,16 @@ def sacar_checksum(xData):
     # Extraer la cadena para calcular XOR (incluyendo el asterisco)
     data_to_checksum = xData[start_idx:asterisk_idx + 1]
     
-    # Calcular XOR byte a byte
     if not data_to_checksum:
         return "00"
     
+    # Caracteres de un byte (caso normal): XOR en bloque
+    try:
+        return format(geo5_codec.xor_bytes(data_to_checksum.encode('latin-1')), '02X')
+    except UnicodeEncodeError:
+        pass
+    
+    # Calcular XOR carácter a carácter
     checksum = ord(data_to_checksum[0])
     for i in range(1, len(data_to_checksum)):
         checksum ^= ord(data_to_checksum[i])
@@ -552,13 +550,11 @@ def RGPdesdeCHINO(dato, TerminalID):
 	if abs(xlat) < 0.000001 and abs(xlon) < 0.000001:
 		return ""  # Retornar string vacío para indicar que no se debe enviar
 	
-	lat, lon = _geo5_fmt_lat_lon(xlat, xlon)
-	vel = funciones.completaCero3(getVELchino(dato))
+	vel = getVELchino(dato)
 	# CORREGIDO: Usar el rumbo real extraído del mensaje en lugar de "000"
-	dir = funciones.completaCero3(getRUMBOchino(dato))
+	dir = getRUMBOchino(dato)
+	# estado "3" + edad "0000" + calidad "01" (el encoder agrega "000001" tras el estado)
 	estado ="3"
-	edad = "0000"
-	calidad = "01"
 	
 	# CORREGIDO: Extraer flag de ignición del protocolo TQ y usarlo en el campo evento
 	ignicion = getIGNICIONchino(dato)
@@ -574,11 +570,9 @@ def RGPdesdeCHINO(dato, TerminalID):
 		evento = "01"
 	
 	ID = TerminalID
-	nroMje = "0001"
 	
-	valor = ">RGP" + fecha + lat + lon + vel + dir + estado + edad + calidad + ";&" + evento + ";ID=" + ID + ";#" + nroMje + "*"
-	checksum = sacar_checksum(valor)
-	valor = valor + checksum + "<"
+	# Lat/lon, campos fijos y checksum los arma geo5_codec (XOR por segmentos)
+	valor = geo5_codec.encode_position(fecha, xlat, xlon, vel, dir, estado, evento, ID).decode("ascii")
 	# >RGP230622213474-3435.6154-05833.01920000003000001;&01;ID=1146;#0001*5F<
 	# México (lat +): >RGP...1925.1234-09912.3456...
 	return valor
@@ -616,30 +610,40 @@ def RGPdesdePERSONAL(dato, TerminalID):
 
 
 def crc_itu2024(data: bytes) -> int:
-    crc = 0xFFFF
-    for byte in data:
-        crc ^= byte << 8
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = (crc << 1) ^ 0x1021
-            else:
-                crc <<= 1
-            crc &= 0xFFFF  # Asegura que el CRC se mantenga en 16 bits
-    return crc
+    # CRC-16/CCITT (0x1021, inicial 0xFFFF) por tabla, ver crc16.py
+    return crc16.crc16_ccitt(data)
 
 def build_response_packet(protocol_number, terminal_id, serial_number):
-    start_bit = b'\x78\x78'
-    packet_length = 5  # Length = Protocol Number + Information Serial Number + Error Check (1 + 2 + 2 bytes)
-    stop_bit = b'\x0D\x0A'
-    
-    packet = struct.pack('!2sB1s8sH', start_bit, packet_length, protocol_number, terminal_id, serial_number)
-    
-    crc = crc_itu2024(packet[2:])  # Calculate CRC from Packet Length to Information Serial Number
-    crc_bytes = struct.pack('!H', crc)
-    
-    response_packet = packet + crc_bytes + stop_bit
-    
-    return response_packet
+    """
+    Respuesta GT06: 7878 + largo + protocolo + terminal_id + serie + CRC-ITU + 0D0A.
+
+    El largo cuenta protocolo + terminal + serie + CRC (0x0D con terminal de 8 bytes,
+    0x05 sin terminal) y el CRC es el X.25 de las tramas 7878, igual que la respuesta
+    fija de Enviar0100. La cabecera por terminal y su estado de CRC quedan cacheados.
+    """
+    if isinstance(protocol_number, (bytes, bytearray)):
+        protocol_number = protocol_number[0]
+    return crc16.gt06_response(int(protocol_number), bytes(terminal_id or b""), int(serial_number))
+
+def respuesta_gt06(dato) -> bytes:
+    """
+    ACK para una trama GT06 7878 de login (0x01, con el terminal de la trama) o de
+    heartbeat (0x13, respuesta corta). Devuelve b"" para otros protocolos o tramas inválidas.
+    """
+    if isinstance(dato, str):
+        try:
+            dato = bytes.fromhex(dato)
+        except ValueError:
+            return b""
+    if len(dato) < 10 or dato[:2] != crc16.GT06_START:
+        return b""
+    protocol_number = dato[3]
+    serial_number = (dato[-6] << 8) | dato[-5]  # 2 bytes antes del CRC y 0D0A
+    if protocol_number == 0x01 and len(dato) >= 18:
+        return build_response_packet(0x01, dato[4:12], serial_number)
+    if protocol_number == 0x13:
+        return build_response_packet(0x13, b"", serial_number)
+    return b""
 
 def extract_parameters_from_message(message):
     # Extraer longitud del mensaje
@@ -20,7 +20,7 @@ if str(BASE_DIR) not in sys.path:
     #   .venv\Scripts\python reenvios_abm\app.py
     sys.path.insert(0, str(BASE_DIR))
 
-from reenvios_config import ForwardingRule, load_reenvios_config  # noqa: E402
+from reenvios_config import ForwardingRule, load_reenvios_config, parse_equipo_selector  # noqa: E402
 
 
 def _get_config_path() -> Path:
@@ -60,9 +60,12 @@ def _validate_rule(form: RuleForm) -> List[str]:
     if tipo not in ("SERVICIO", "CLONAR"):
         errs.append("TIPO debe ser SERVICIO o CLONAR.")
 
-    eq = (form.equipo or "").strip()
-    if not (eq.isdigit() and len(eq) == 5):
-        errs.append("EQUIPO debe ser un ID de 5 dígitos.")
+    selector, aviso = parse_equipo_selector(form.equipo)
+    if selector is None or aviso:
+        errs.append(
+            "EQUIPO debe ser un ID de 5 o 10 dígitos, un rango (26000-26999 o de IDs de 10 dígitos) "
+            "o un prefijo de ID completo (20766*)."
+        )
 
     tr = (form.transporte or "").strip().upper()
     if tr not in ("UDP", "TCP"):
@@ -142,28 +145,29 @@ def _normalize_fecha_for_form(raw: str) -> str:
     return ""
 
 
-def _clients_for_equipo(rules: List[ForwardingRule], equipo: str) -> List[str]:
-    eq = (equipo or "").strip()
-    if not eq:
+def _rules_overlapping(rules: List[ForwardingRule], equipo: str) -> List[ForwardingRule]:
+    """Reglas cuyo EQUIPO (ID, rango o prefijo) comparte al menos un equipo con `equipo`."""
+    selector = parse_equipo_selector(equipo)[0]
+    if selector is None:
         return []
-    clients = []
+    out = []
     for r in rules:
-        if r.equipo == eq:
-            c = (r.cliente or "-").strip() or "-"
-            clients.append(c)
+        other = parse_equipo_selector(r.equipo)[0]
+        if other is not None and selector.overlaps(other):
+            out.append(r)
+    return out
+
+
+def _clients_for_equipo(rules: List[ForwardingRule], equipo: str) -> List[str]:
+    clients = [(r.cliente or "-").strip() or "-" for r in _rules_overlapping(rules, equipo)]
     # únicos, ordenados
     return sorted(set(clients), key=lambda x: x.lower())
 
 
 def _clients_for_equipo_servicio(rules: List[ForwardingRule], equipo: str) -> List[str]:
-    eq = (equipo or "").strip()
-    if not eq:
-        return []
-    clients = []
-    for r in rules:
-        if r.equipo == eq and r.tipo == "SERVICIO":
-            c = (r.cliente or "-").strip() or "-"
-            clients.append(c)
+    clients = [
+        (r.cliente or "-").strip() or "-" for r in _rules_overlapping(rules, equipo) if r.tipo == "SERVICIO"
+    ]
     return sorted(set(clients), key=lambda x: x.lower())
 
 
@@ -210,10 +214,15 @@ def _write_rules_atomic(path: Path, rules: List[ForwardingRule]) -> None:
 
 
 def _form_from_request() -> RuleForm:
+    equipo = (request.form.get("equipo") or "").strip()
+    selector, aviso = parse_equipo_selector(equipo)
+    if selector is not None and not aviso:
+        # forma canónica (ceros a la izquierda, rango sin espacios)
+        equipo = selector.texto
     return RuleForm(
         tipo=(request.form.get("tipo") or "").strip().upper() or "CLONAR",
         cliente=(request.form.get("cliente") or "").strip(),
-        equipo=(request.form.get("equipo") or "").strip(),
+        equipo=equipo,
         transporte=(request.form.get("transporte") or "").strip().upper() or "UDP",
         protocolo_gps=_normalize_proto(request.form.get("protocolo_gps") or "GEO5"),
         ip=(request.form.get("ip") or "").strip(),
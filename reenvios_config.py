@@ -3,18 +3,28 @@
 
 from __future__ import annotations
 
+import bisect
 import csv
+import hashlib
+import io
 import ipaddress
+import marshal
 import os
-from dataclasses import dataclass
+import re
+import sys
+import time
+from dataclasses import dataclass, fields, replace
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import log_writer
 
 
 @dataclass(frozen=True)
 class ForwardingRule:
     tipo: str
     cliente: str
+    # Selector canónico (ver `parse_equipo_selector`): "26501", "2076626501", "26000-26999", "20766*"
     equipo: str
     transporte: str
     protocolo_gps: str
@@ -28,6 +38,293 @@ class ForwardingRule:
     fecha_alta: Optional[str] = None
 
 
+@dataclass(frozen=True)
+class RouteTarget:
+    """Destino de reenvío ya resuelto (una regla del CSV, sin duplicados ip:puerto)."""
+
+    ip: str
+    port: int
+    transporte: str
+    tipo: str
+    cliente: str
+    line_no: int
+    # Solo en `RoutePlan.geo5_id`: últimos N caracteres del ID de origen en ID=...
+    formato_id: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class RoutePlan:
+    """
+    Reglas de un equipo compiladas para el camino caliente (inmutable).
+
+    general   False si hay al menos una regla SERVICIO (no se envía al destino general).
+    tq        destinos PROTOCOLO_GPS=TQ (payload crudo).
+    geo5      destinos GEO5 con el mensaje tal cual (UDP sin FORMATO_ID y TCP).
+    geo5_id   destinos GEO5 UDP con FORMATO_ID (se reescribe ID=... y checksum).
+    id_lengths  valores distintos de FORMATO_ID en `geo5_id`.
+    """
+
+    equipo: str
+    general: bool = True
+    tq: Tuple[RouteTarget, ...] = ()
+    geo5: Tuple[RouteTarget, ...] = ()
+    geo5_id: Tuple[RouteTarget, ...] = ()
+    id_lengths: FrozenSet[int] = frozenset()
+    n_rules: int = 0
+
+
+# Plan de un equipo sin reglas: solo destino general
+EMPTY_ROUTE_PLAN = RoutePlan(equipo="")
+
+
+def compile_route_plan(equipo: str, rules: List[ForwardingRule]) -> RoutePlan:
+    """
+    Compila las reglas de un equipo. Filas repetidas hacia el mismo destino (mismo
+    protocolo, transporte, ip:puerto y FORMATO_ID) se envían una sola vez: vale la primera.
+    """
+    seen = set()
+    tq: List[RouteTarget] = []
+    geo5: List[RouteTarget] = []
+    geo5_id: List[RouteTarget] = []
+    for r in rules:
+        rewrite = r.protocolo_gps == "GEO5" and r.transporte == "UDP" and r.formato_id is not None
+        key = (r.protocolo_gps, r.transporte, r.ip, r.port, r.formato_id if rewrite else None)
+        if key in seen:
+            continue
+        seen.add(key)
+        target = RouteTarget(
+            ip=r.ip,
+            port=r.port,
+            transporte=r.transporte,
+            tipo=r.tipo,
+            cliente=r.cliente,
+            line_no=r.line_no,
+            formato_id=r.formato_id if rewrite else None,
+        )
+        if r.protocolo_gps == "TQ":
+            tq.append(target)
+        elif rewrite:
+            geo5_id.append(target)
+        else:
+            geo5.append(target)
+    return RoutePlan(
+        equipo=equipo,
+        general=not any(r.tipo == "SERVICIO" for r in rules),
+        tq=tuple(tq),
+        geo5=tuple(geo5),
+        geo5_id=tuple(geo5_id),
+        id_lengths=frozenset(t.formato_id for t in geo5_id),
+        n_rules=len(rules),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Selectores de EQUIPO
+# ---------------------------------------------------------------------------
+
+FULL_ID_LEN = 10
+
+_RANGE_RE = re.compile(r"^(\d+)\s*-\s*(\d+)$")
+_PREFIX_RE = re.compile(r"^(\d{1,9})\*$")
+
+
+@dataclass(frozen=True)
+class EquipoSelector:
+    """
+    Columna EQUIPO de una regla, como intervalo cerrado [desde, hasta] en un espacio:
+    `espacio` 5 (ID corto, el de siempre) o 10 (ID completo del equipo).
+    `texto` es la forma canónica que se guarda en `ForwardingRule.equipo`.
+    """
+
+    espacio: int
+    desde: int
+    hasta: int
+    texto: str
+
+    def overlaps(self, other: "EquipoSelector") -> bool:
+        """True si algún equipo cumple ambos selectores."""
+        if self.espacio == other.espacio:
+            return self.desde <= other.hasta and other.desde <= self.hasta
+        short, full = (self, other) if self.espacio == 5 else (other, self)
+        # Un ID completo cumple el selector corto por sus últimos 5 dígitos
+        if full.hasta - full.desde >= 99999:
+            return True
+        lo, hi = full.desde % 100000, full.hasta % 100000
+        if lo <= hi:
+            return short.desde <= hi and lo <= short.hasta
+        return short.hasta >= lo or short.desde <= hi
+
+
+def parse_equipo_selector(raw: str) -> Tuple[Optional[EquipoSelector], str]:
+    """
+    Interpreta la columna EQUIPO. Devuelve (selector, aviso); selector None si es inválido.
+
+        26501          ID corto (1-5 dígitos, se completa a 5)
+        2076626501     ID completo de 10 dígitos (sin colisiones entre equipos con los
+                       mismos últimos 5)
+        26000-26999    rango de IDs cortos (ambos extremos de 1-5 dígitos)
+        2076600000-2076699999   rango de IDs completos (ambos de 10 dígitos)
+        20766*         prefijo de ID completo (1-9 dígitos + '*')
+
+    Otros largos numéricos (6-9 u 11+ dígitos) siguen el criterio histórico: últimos 5.
+    """
+    eq = (raw or "").strip()
+    if eq.isdigit():
+        if len(eq) <= 5:
+            n = int(eq)
+            return EquipoSelector(5, n, n, eq.zfill(5)), ""
+        if len(eq) == FULL_ID_LEN:
+            n = int(eq)
+            return EquipoSelector(10, n, n, eq), ""
+        key = eq[-5:]
+        n = int(key)
+        return EquipoSelector(5, n, n, key), (
+            f"EQUIPO {raw!r} tiene más de 5 dígitos (y no 10); se usan los últimos 5 ({key})."
+        )
+    m = _RANGE_RE.match(eq)
+    if m:
+        a, b = m.group(1), m.group(2)
+        lo, hi = int(a), int(b)
+        if lo > hi:
+            return None, f"EQUIPO rango invertido {raw!r}."
+        if len(a) <= 5 and len(b) <= 5:
+            return EquipoSelector(5, lo, hi, f"{lo:05d}-{hi:05d}"), ""
+        if len(a) == FULL_ID_LEN and len(b) == FULL_ID_LEN:
+            return EquipoSelector(10, lo, hi, f"{a}-{b}"), ""
+        return None, f"EQUIPO rango {raw!r}: ambos extremos de 1-5 dígitos o ambos de 10."
+    m = _PREFIX_RE.match(eq)
+    if m:
+        prefix = m.group(1)
+        scale = 10 ** (FULL_ID_LEN - len(prefix))
+        lo = int(prefix) * scale
+        return EquipoSelector(10, lo, lo + scale - 1, f"{prefix}*"), ""
+    return None, (
+        f"EQUIPO inválido {raw!r}: usar ID de 1-5 o 10 dígitos, rango (26000-26999) "
+        "o prefijo de ID completo (20766*)."
+    )
+
+
+def _rules_content(rules: List[ForwardingRule]) -> Tuple[ForwardingRule, ...]:
+    """Reglas sin el número de línea (para comparar dos cargas del CSV)."""
+    return tuple(replace(r, line_no=0) for r in rules)
+
+
+class RouteIndex:
+    """
+    Índice inmutable EQUIPO → RoutePlan sobre las reglas de `load_reenvios_config`.
+
+    Cada selector es un intervalo en uno de dos espacios: ID corto de 5 dígitos o ID
+    completo de 10 (exactos = intervalo de un solo valor). Por espacio, los límites de
+    todos los intervalos parten la recta en segmentos donde el conjunto de selectores es
+    constante; cada segmento tiene su plan compilado. Buscar un equipo es un `bisect`
+    por espacio (O(log n) sin importar cuántas reglas haya). Si el equipo cae en reglas
+    de ambos espacios se compila (una vez, y se recuerda) el plan con la unión.
+
+    Con `previous`, los planes cuyos selectores no cambiaron se reutilizan en lugar de
+    recompilarse; `changed` cuenta los selectores nuevos, modificados o eliminados. Se compara
+    el contenido de las reglas sin el número de línea: agregar o borrar una fila del CSV no
+    marca como cambiados a todos los equipos de las filas siguientes (en un plan reutilizado,
+    los números de línea de los avisos son los de la carga en que se compiló).
+    """
+
+    def __init__(
+        self,
+        by_selector: Dict[str, List[ForwardingRule]],
+        previous: Optional["RouteIndex"] = None,
+    ):
+        self.by_selector = by_selector
+        old_by = previous.by_selector if previous is not None else {}
+        unchanged = {
+            k for k, v in by_selector.items() if k in old_by and _rules_content(old_by[k]) == _rules_content(v)
+        }
+        self.changed = (len(by_selector) - len(unchanged)) + sum(1 for k in old_by if k not in by_selector)
+        old_plans = previous._plans if previous is not None else {}
+        # (selectores activos) -> (reglas en orden de línea, plan)
+        self._plans: Dict[Tuple[str, ...], Tuple[Tuple[ForwardingRule, ...], RoutePlan]] = {}
+
+        intervals: Dict[int, List[Tuple[int, int, str]]] = {5: [], 10: []}
+        for text, rules in by_selector.items():
+            sel = parse_equipo_selector(text)[0]
+            if sel is not None and rules:
+                intervals[sel.espacio].append((sel.desde, sel.hasta, text))
+        self._starts: Dict[int, List[int]] = {}
+        self._segments: Dict[int, List[Optional[Tuple[Tuple[ForwardingRule, ...], RoutePlan]]]] = {}
+        for espacio, items in intervals.items():
+            starts: List[int] = []
+            segments: List[Optional[Tuple[Tuple[ForwardingRule, ...], RoutePlan]]] = []
+            for bound, active in self._sweep(items):
+                segment = None
+                if active:
+                    segment = self._plans.get(active)
+                    if segment is None:
+                        old = old_plans.get(active)
+                        if old is not None and all(t in unchanged for t in active):
+                            segment = old
+                        else:
+                            segment = self._compile(active)
+                        self._plans[active] = segment
+                starts.append(bound)
+                segments.append(segment)
+            self._starts[espacio] = starts
+            self._segments[espacio] = segments
+        # Planes de equipos que caen en reglas de ambos espacios (se completa al buscar)
+        self._combined: Dict[Tuple[int, int], RoutePlan] = {}
+
+    @staticmethod
+    def _sweep(items: List[Tuple[int, int, str]]):
+        """(inicio de segmento, selectores activos ordenados) recorriendo los límites en orden."""
+        starts_at: Dict[int, List[str]] = {}
+        ends_at: Dict[int, List[str]] = {}
+        for lo, hi, text in items:
+            starts_at.setdefault(lo, []).append(text)
+            ends_at.setdefault(hi + 1, []).append(text)
+        active = set()
+        for bound in sorted(starts_at.keys() | ends_at.keys()):
+            active.difference_update(ends_at.get(bound, ()))
+            active.update(starts_at.get(bound, ()))
+            yield bound, tuple(sorted(active))
+
+    def _compile(self, active: Tuple[str, ...]) -> Tuple[Tuple[ForwardingRule, ...], RoutePlan]:
+        if len(active) == 1:
+            rules = tuple(self.by_selector[active[0]])
+        else:
+            rules = tuple(
+                sorted((r for t in active for r in self.by_selector[t]), key=lambda r: r.line_no)
+            )
+        return rules, compile_route_plan(",".join(active), list(rules))
+
+    def _segment(self, espacio: int, key: str):
+        if not key.isdigit():
+            return -1, None
+        i = bisect.bisect_right(self._starts[espacio], int(key)) - 1
+        if i < 0:
+            return -1, None
+        return i, self._segments[espacio][i]
+
+    def lookup(self, equipo_5: str, full_id: str = "") -> RoutePlan:
+        """Plan del equipo (ID de 5 dígitos y, si se conoce, ID completo de 10)."""
+        i5, seg5 = self._segment(5, equipo_5) if equipo_5 else (-1, None)
+        full_id = (full_id or "").strip()
+        if len(full_id) == FULL_ID_LEN and self._starts[10]:
+            i10, seg10 = self._segment(10, full_id)
+        else:
+            i10, seg10 = -1, None
+        if seg10 is None:
+            return seg5[1] if seg5 is not None else EMPTY_ROUTE_PLAN
+        if seg5 is None:
+            return seg10[1]
+        plan = self._combined.get((i5, i10))
+        if plan is None:
+            merged = sorted(set(seg5[0]) | set(seg10[0]), key=lambda r: r.line_no)
+            plan = compile_route_plan(f"{equipo_5},{full_id}", merged)
+            self._combined[(i5, i10)] = plan
+        return plan
+
+    @property
+    def n_rules(self) -> int:
+        return sum(len(v) for v in self.by_selector.values())
+
+
 def _ensure_logs_dir(log_dir: str = "logs") -> None:
     d = (log_dir or "logs").strip() or "logs"
     if not os.path.exists(d):
@@ -52,7 +349,6 @@ def append_reenvio_log(
     log_dir: str = "logs",
 ) -> None:
     try:
-        path = get_reenvios_log_path(log_dir=log_dir)
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         dest = f"{destino_host}:{destino_port}"
         p = (payload or "").replace("\r", "\\r").replace("\n", "\\n")
@@ -70,9 +366,7 @@ def append_reenvio_log(
         ]
         if p:
             parts.append(f"payload={p}")
-        line = "\t".join(parts) + "\n"
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(line)
+        log_writer.get_writer().write(log_writer.daily_pattern(log_dir, "Reenvios_%Y%m%d.log"), "\t".join(parts))
     except Exception:
         pass
 
@@ -122,10 +416,91 @@ def _normalize_fecha_alta(raw: str) -> str:
     return ""
 
 
-def load_reenvios_config(path: str) -> Tuple[Dict[str, List[ForwardingRule]], List[str]]:
+# ---------------------------------------------------------------------------
+# Cache binario de reglas parseadas
+# ---------------------------------------------------------------------------
+#
+# `.REENVIOS_CONFIG.txt.cache` (junto al CSV): marshal de
+#   (versión, tamaño, mtime_ns, hash blake2b, momento de escritura, filas, advertencias)
+# con una tupla por regla en el orden de los campos de ForwardingRule.
+# Si tamaño y mtime coinciden y el CSV ya era "viejo" al escribir la cache (mismo criterio
+# que el índice de git para mtimes de baja resolución) no se lee el CSV; si no, se compara
+# el hash del contenido. Cualquier diferencia (o cache ilegible) implica parsear de nuevo.
+
+_CACHE_VERSION = 2
+# Un CSV modificado hasta este tiempo antes de escribir la cache se revalida por hash
+_CACHE_RACY_NS = 2_000_000_000
+_RULE_FIELDS = tuple(f.name for f in fields(ForwardingRule))
+
+
+def cache_path_for(path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f".{name}.cache")
+
+
+def _read_cache(
+    cache_path: str, st: os.stat_result, digest: Optional[bytes]
+) -> Optional[Tuple[Dict[str, List[ForwardingRule]], List[str]]]:
+    """Reglas de la cache si corresponde al CSV (por stat si `digest` es None, si no por hash)."""
+    try:
+        with open(cache_path, "rb") as f:
+            data = marshal.loads(f.read())
+        version, size, mtime_ns, cached_digest, written_ns, rows, warnings = data
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != _CACHE_VERSION or size != st.st_size:
+        return None
+    if digest is None:
+        if mtime_ns != st.st_mtime_ns or written_ns - mtime_ns < _CACHE_RACY_NS:
+            return None
+    elif digest != cached_digest:
+        return None
+    by_equipo: Dict[str, List[ForwardingRule]] = {}
+    try:
+        for row in rows:
+            rule = ForwardingRule(*row)
+            by_equipo.setdefault(rule.equipo, []).append(rule)
+    except TypeError:
+        return None
+    return by_equipo, list(warnings)
+
+
+def _write_cache(
+    cache_path: str,
+    st: os.stat_result,
+    digest: bytes,
+    by_equipo: Dict[str, List[ForwardingRule]],
+    warnings: List[str],
+) -> None:
+    """Escribe la cache de forma atómica. Sin permisos de escritura simplemente no hay cache."""
+    rules = sorted((r for rs in by_equipo.values() for r in rs), key=lambda r: r.line_no)
+    # Strings internados: marshal escribe una referencia en vez de repetir IP, cliente, etc.
+    rows = [
+        tuple(sys.intern(v) if isinstance(v, str) else v for v in (getattr(r, n) for n in _RULE_FIELDS))
+        for r in rules
+    ]
+    data = (_CACHE_VERSION, st.st_size, st.st_mtime_ns, digest, time.time_ns(), rows, list(warnings))
+    tmp = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(marshal.dumps(data))
+        os.replace(tmp, cache_path)
+    except (OSError, ValueError):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def load_reenvios_config(
+    path: str, use_cache: bool = True
+) -> Tuple[Dict[str, List[ForwardingRule]], List[str]]:
     """
     Lee el CSV y devuelve (reglas_por_equipo_5dígitos, mensajes_de_advertencia).
     Si el archivo no existe, devuelve dict vacío (comportamiento legacy: solo destino general).
+
+    Con `use_cache`, el resultado ya validado se guarda junto al CSV (ver `cache_path_for`)
+    y se reutiliza mientras el contenido no cambie: solo un CSV nuevo se vuelve a parsear.
     """
     warnings: List[str] = []
     by_equipo: Dict[str, List[ForwardingRule]] = {}
@@ -135,101 +510,113 @@ def load_reenvios_config(path: str) -> Tuple[Dict[str, List[ForwardingRule]], Li
         return by_equipo, warnings
 
     try:
-        with open(path, newline="", encoding="utf-8-sig") as f:
-            reader = csv.reader(f)
-            for line_no, row in enumerate(reader, start=1):
-                if not row:
-                    continue
-                # Permitir comentarios: línea que (tras strip) empieza con '#'
-                # (puede venir como fila de 1 columna para csv.reader).
-                if row and (row[0] or "").strip().startswith("#"):
-                    continue
-                row = [c.strip() for c in row]
-                if not any(row):
-                    continue
-                if line_no == 1 and row[0].upper() == "TIPO":
-                    continue
-                if len(row) < 7:
-                    warnings.append(f"Reenvíos línea {line_no}: se esperan al menos 7 columnas, hay {len(row)}.")
-                    continue
-
-                tipo, cliente, equipo, transporte, proto_gps, ip_s, port_s = row[:7]
-                formato_raw = row[7].strip() if len(row) > 7 else ""
-                fecha_raw = row[8].strip() if len(row) > 8 else ""
-                formato_id: Optional[int] = None
-                if formato_raw:
-                    try:
-                        n = int(formato_raw)
-                    except ValueError:
-                        warnings.append(
-                            f"Reenvíos línea {line_no}: FORMATO_ID no numérico {formato_raw!r}; se ignora."
-                        )
-                    else:
-                        if 1 <= n <= 32:
-                            formato_id = n
-                        else:
-                            warnings.append(
-                                f"Reenvíos línea {line_no}: FORMATO_ID fuera de rango (1-32): {n}; se ignora."
-                            )
-                tipo_u = tipo.upper()
-                if tipo_u not in ("SERVICIO", "CLONAR"):
-                    warnings.append(f"Reenvíos línea {line_no}: TIPO inválido {tipo!r}.")
-                    continue
-
-                tr_u = transporte.upper()
-                if tr_u not in ("UDP", "TCP"):
-                    warnings.append(f"Reenvíos línea {line_no}: TRANSPORTE inválido {transporte!r}.")
-                    continue
-
-                proto = _normalize_protocol_gps(proto_gps)
-                if not proto:
-                    warnings.append(f"Reenvíos línea {line_no}: PROTOCOLO_GPS inválido {proto_gps!r}.")
-                    continue
-
-                eq_raw = equipo.strip()
-                eq = normalize_equipo_key(eq_raw)
-                if eq is None:
-                    warnings.append(
-                        f"Reenvíos línea {line_no}: EQUIPO debe ser numérico (1-5 dígitos), recibido {equipo!r}."
-                    )
-                    continue
-                if len(eq_raw) > 5:
-                    warnings.append(
-                        f"Reenvíos línea {line_no}: EQUIPO {equipo!r} tiene más de 5 dígitos; "
-                        f"se usan los últimos 5 ({eq})."
-                    )
-
-                if not _validate_ipv4(ip_s):
-                    warnings.append(f"Reenvíos línea {line_no}: IP inválida {ip_s!r}.")
-                    continue
-
-                try:
-                    port = int(port_s)
-                except ValueError:
-                    warnings.append(f"Reenvíos línea {line_no}: PUERTO no numérico {port_s!r}.")
-                    continue
-                if not (1 <= port <= 65535):
-                    warnings.append(f"Reenvíos línea {line_no}: PUERTO fuera de rango {port}.")
-                    continue
-
-                fecha_alta = _normalize_fecha_alta(fecha_raw)
-                if fecha_raw.strip() and not fecha_alta:
-                    warnings.append(f"Reenvíos línea {line_no}: FECHA_ALTA inválida {fecha_raw!r} (usar DD/MM/YYYY).")
-
-                rule = ForwardingRule(
-                    tipo=tipo_u,
-                    cliente=cliente.strip(),
-                    equipo=eq,
-                    transporte=tr_u,
-                    protocolo_gps=proto,
-                    ip=ip_s.strip(),
-                    port=port,
-                    line_no=line_no,
-                    formato_id=formato_id,
-                    fecha_alta=(fecha_alta or None),
-                )
-                by_equipo.setdefault(eq, []).append(rule)
+        st = os.stat(path)
+        cache_path = cache_path_for(path) if use_cache else ""
+        cached = _read_cache(cache_path, st, None) if cache_path else None
+        if cached is not None:
+            return cached
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+        cached = _read_cache(cache_path, st, digest) if cache_path else None
+        if cached is not None:
+            _write_cache(cache_path, st, digest, *cached)
+            return cached
+        _parse_rows(raw.decode("utf-8-sig"), by_equipo, warnings)
     except Exception as e:
         warnings.append(f"Reenvíos: error leyendo {path!r}: {e}")
+        return by_equipo, warnings
 
+    if cache_path:
+        _write_cache(cache_path, st, digest, by_equipo, warnings)
     return by_equipo, warnings
+
+
+def _parse_rows(text: str, by_equipo: Dict[str, List[ForwardingRule]], warnings: List[str]) -> None:
+    reader = csv.reader(io.StringIO(text, newline=""))
+    for line_no, row in enumerate(reader, start=1):
+        if not row:
+            continue
+        # Permitir comentarios: línea que (tras strip) empieza con '#'
+        # (puede venir como fila de 1 columna para csv.reader).
+        if row and (row[0] or "").strip().startswith("#"):
+            continue
+        row = [c.strip() for c in row]
+        if not any(row):
+            continue
+        if line_no == 1 and row[0].upper() == "TIPO":
+            continue
+        if len(row) < 7:
+            warnings.append(f"Reenvíos línea {line_no}: se esperan al menos 7 columnas, hay {len(row)}.")
+            continue
+
+        tipo, cliente, equipo, transporte, proto_gps, ip_s, port_s = row[:7]
+        formato_raw = row[7].strip() if len(row) > 7 else ""
+        fecha_raw = row[8].strip() if len(row) > 8 else ""
+        formato_id: Optional[int] = None
+        if formato_raw:
+            try:
+                n = int(formato_raw)
+            except ValueError:
+                warnings.append(
+                    f"Reenvíos línea {line_no}: FORMATO_ID no numérico {formato_raw!r}; se ignora."
+                )
+            else:
+                if 1 <= n <= 32:
+                    formato_id = n
+                else:
+                    warnings.append(
+                        f"Reenvíos línea {line_no}: FORMATO_ID fuera de rango (1-32): {n}; se ignora."
+                    )
+        tipo_u = tipo.upper()
+        if tipo_u not in ("SERVICIO", "CLONAR"):
+            warnings.append(f"Reenvíos línea {line_no}: TIPO inválido {tipo!r}.")
+            continue
+
+        tr_u = transporte.upper()
+        if tr_u not in ("UDP", "TCP"):
+            warnings.append(f"Reenvíos línea {line_no}: TRANSPORTE inválido {transporte!r}.")
+            continue
+
+        proto = _normalize_protocol_gps(proto_gps)
+        if not proto:
+            warnings.append(f"Reenvíos línea {line_no}: PROTOCOLO_GPS inválido {proto_gps!r}.")
+            continue
+
+        selector, aviso = parse_equipo_selector(equipo)
+        if aviso:
+            warnings.append(f"Reenvíos línea {line_no}: {aviso}")
+        if selector is None:
+            continue
+        eq = selector.texto
+
+        if not _validate_ipv4(ip_s):
+            warnings.append(f"Reenvíos línea {line_no}: IP inválida {ip_s!r}.")
+            continue
+
+        try:
+            port = int(port_s)
+        except ValueError:
+            warnings.append(f"Reenvíos línea {line_no}: PUERTO no numérico {port_s!r}.")
+            continue
+        if not (1 <= port <= 65535):
+            warnings.append(f"Reenvíos línea {line_no}: PUERTO fuera de rango {port}.")
+            continue
+
+        fecha_alta = _normalize_fecha_alta(fecha_raw)
+        if fecha_raw.strip() and not fecha_alta:
+            warnings.append(f"Reenvíos línea {line_no}: FECHA_ALTA inválida {fecha_raw!r} (usar DD/MM/YYYY).")
+
+        rule = ForwardingRule(
+            tipo=tipo_u,
+            cliente=cliente.strip(),
+            equipo=eq,
+            transporte=tr_u,
+            protocolo_gps=proto,
+            ip=ip_s.strip(),
+            port=port,
+            line_no=line_no,
+            formato_id=formato_id,
+            fecha_alta=(fecha_alta or None),
+        )
+        by_equipo.setdefault(eq, []).append(rule)
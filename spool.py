@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Spool en disco (store-and-forward) para destinos de reenvío TCP.
+
+Si un destino está caído, los mensajes que no se pudieron enviar (y los que quedaban en
+su cola) se guardan en disco y se reenvían en orden cuando vuelve, a una tasa
+configurable. El spool sobrevive a un reinicio del servidor.
+
+Estructura por destino (`<spool_dir>/<TRANSPORTE>_<ip>_<puerto>/`):
+    dest          "TRANSPORTE ip puerto" (para recuperar el destino al reiniciar)
+    checkpoint    "segmento offset": primer registro todavía no confirmado
+    00000001.seg  segmentos append-only; se rota al superar `segment_bytes`
+
+Registro: `<largo uint32 LE><epoch uint32 LE><payload>`. La lectura se hace con `mmap`
+sobre el segmento (sin copiar el archivo a memoria). Un registro incompleto al final
+(corte durante la escritura) se ignora.
+
+Límites: si el spool supera `max_bytes` se borran los segmentos más viejos; los
+segmentos (y registros) más viejos que `max_age_seconds` se descartan. La entrega es
+"al menos una vez": tras un corte entre el envío y el checkpoint, un registro puede
+reenviarse dos veces.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from typing import List, Tuple
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 24 * 3600
+SEGMENT_BYTES = 4 * 1024 * 1024
+# Cada cuánto se revisa la antigüedad de los segmentos
+AGE_CHECK_SECONDS = 60.0
+
+_RECORD = struct.Struct("<II")
+_SEG_RE = re.compile(r"^(\d{8})\.seg$")
+
+
+def _seg_name(seq: int) -> str:
+    return f"{seq:08d}.seg"
+
+
+def spool_dir_name(transport: str, ip: str, port: int) -> str:
+    safe_ip = re.sub(r"[^A-Za-z0-9.\-]", "_", ip)
+    return f"{transport}_{safe_ip}_{int(port)}"
+
+
+class DestinationSpool:
+    """Spool de un destino. Thread-safe (un lock por destino)."""
+
+    def __init__(
+        self,
+        path: str,
+        dest: Tuple[str, int, str],
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+        segment_bytes: int = SEGMENT_BYTES,
+    ):
+        self.path = path
+        self.dest = dest
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._writer = None
+        self._write_seq = 0
+        self._write_size = 0
+        self._read_seq = 0
+        self._read_offset = 0
+        self._segments: List[int] = []
+        self._sizes = {}
+        self._next_age_check = 0.0
+        self.appended = 0
+        self.replayed = 0
+        self.evicted_bytes = 0
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Estado en disco
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            m = _SEG_RE.match(name)
+            if m:
+                seq = int(m.group(1))
+                self._segments.append(seq)
+                self._sizes[seq] = os.path.getsize(os.path.join(self.path, name))
+        self._segments.sort()
+        try:
+            with open(os.path.join(self.path, "checkpoint"), "r", encoding="ascii") as f:
+                seq_s, off_s = f.read().split()
+                self._read_seq, self._read_offset = int(seq_s), int(off_s)
+        except (OSError, ValueError):
+            self._read_seq, self._read_offset = (self._segments[0] if self._segments else 0), 0
+        # Segmentos anteriores al checkpoint ya fueron entregados
+        for seq in [s for s in self._segments if s < self._read_seq]:
+            self._remove_segment(seq)
+        if self._segments and self._read_seq not in self._sizes:
+            self._read_seq, self._read_offset = self._segments[0], 0
+        if self._segments:
+            # Tras un reinicio se escribe en un segmento nuevo: el último puede terminar
+            # en un registro incompleto
+            self._write_seq = self._segments[-1]
+            self._write_size = self.segment_bytes
+
+    def _ensure_dir(self) -> None:
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, "dest"), "w", encoding="utf-8") as f:
+                transport_ip_port = (self.dest[2], self.dest[0], str(self.dest[1]))
+                f.write(" ".join(transport_ip_port) + "\n")
+
+    def _save_checkpoint(self) -> None:
+        tmp = os.path.join(self.path, "checkpoint.tmp")
+        with open(tmp, "w", encoding="ascii") as f:
+            f.write(f"{self._read_seq} {self._read_offset}\n")
+        os.replace(tmp, os.path.join(self.path, "checkpoint"))
+
+    def _remove_segment(self, seq: int) -> None:
+        if seq == self._write_seq and self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        try:
+            os.remove(os.path.join(self.path, _seg_name(seq)))
+        except OSError:
+            pass
+        if seq in self._sizes:
+            del self._sizes[seq]
+            self._segments.remove(seq)
+
+    def _open_writer(self) -> None:
+        self._ensure_dir()
+        if not self._segments or self._write_size >= self.segment_bytes:
+            self._write_seq = (self._segments[-1] + 1) if self._segments else 1
+            self._write_size = 0
+            self._segments.append(self._write_seq)
+            self._sizes[self._write_seq] = 0
+            if len(self._segments) == 1:
+                self._read_seq, self._read_offset = self._write_seq, 0
+                self._save_checkpoint()
+        self._writer = open(os.path.join(self.path, _seg_name(self._write_seq)), "ab", buffering=0)
+
+    # ------------------------------------------------------------------
+    # Límites
+    # ------------------------------------------------------------------
+
+    def _enforce_limits(self, now: float) -> None:
+        total = sum(self._sizes.values())
+        while total > self.max_bytes and len(self._segments) > 1:
+            seq = self._segments[0]
+            total -= self._sizes[seq]
+            self.evicted_bytes += self._sizes[seq]
+            self._drop_read_segment(seq)
+        if now >= self._next_age_check:
+            self._next_age_check = now + AGE_CHECK_SECONDS
+            limit = time.time() - self.max_age_seconds
+            for seq in list(self._segments):
+                try:
+                    mtime = os.path.getmtime(os.path.join(self.path, _seg_name(seq)))
+                except OSError:
+                    continue
+                if mtime < limit:
+                    self.evicted_bytes += self._sizes.get(seq, 0)
+                    self._drop_read_segment(seq)
+
+    def _drop_read_segment(self, seq: int) -> None:
+        self._remove_segment(seq)
+        if seq == self._read_seq:
+            self._read_seq = self._segments[0] if self._segments else 0
+            self._read_offset = 0
+            if self._segments:
+                self._save_checkpoint()
+        if not self._segments:
+            self._reset()
+
+    def _reset(self) -> None:
+        """Spool vacío: se borran checkpoint y archivos para no dejar estado viejo."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for seq in list(self._segments):
+            self._remove_segment(seq)
+        try:
+            os.remove(os.path.join(self.path, "checkpoint"))
+        except OSError:
+            pass
+        self._read_seq = self._read_offset = 0
+        self._write_seq = self._write_size = 0
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def append(self, payload: bytes) -> None:
+        with self._lock:
+            if self._writer is None or self._write_size >= self.segment_bytes:
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+                self._open_writer()
+            record = _RECORD.pack(len(payload), int(time.time())) + payload
+            self._writer.write(record)
+            self._write_size += len(record)
+            self._sizes[self._write_seq] = self._write_size
+            self.appended += 1
+            self._enforce_limits(time.monotonic())
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            if not self._segments:
+                return False
+            if self._read_seq != self._segments[-1]:
+                return True
+            return self._read_offset < self._sizes.get(self._read_seq, 0)
+
+    def pending_bytes(self) -> int:
+        with self._lock:
+            return sum(self._sizes.values()) - (self._read_offset if self._segments else 0)
+
+    def read_batch(self, max_records: int) -> List[Tuple[int, int, bytes]]:
+        """
+        Hasta `max_records` registros pendientes desde el checkpoint, en orden:
+        lista de (segmento, offset_siguiente, payload). No avanza el checkpoint salvo que
+        no haya nada entregable (registros vencidos por antigüedad o incompletos).
+        """
+        out: List[Tuple[int, int, bytes]] = []
+        min_ts = int(time.time() - self.max_age_seconds)
+        with self._lock:
+            if not self._segments:
+                return out
+            last = (self._read_seq, self._read_offset)
+            for seq in self._segments:
+                if seq < self._read_seq:
+                    continue
+                offset = self._read_offset if seq == self._read_seq else 0
+                offset = self._read_segment(seq, offset, self._sizes.get(seq, 0),
+                                            max_records - len(out), min_ts, out)
+                last = (seq, offset)
+                if len(out) >= max_records:
+                    break
+            if not out:
+                self._commit_locked(*last)
+        return out
+
+    def _read_segment(self, seq: int, offset: int, size: int, limit: int, min_ts: int,
+                      out: List[Tuple[int, int, bytes]]) -> int:
+        if offset >= size:
+            return offset
+        path = os.path.join(self.path, _seg_name(seq))
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = min(size, len(mm))
+                while offset + _RECORD.size <= end and limit > 0:
+                    length, ts = _RECORD.unpack_from(mm, offset)
+                    nxt = offset + _RECORD.size + length
+                    if nxt > end:
+                        # Registro incompleto (corte durante la escritura): resto descartado
+                        return size
+                    if ts >= min_ts:
+                        out.append((seq, nxt, mm[offset + _RECORD.size:nxt]))
+                        limit -= 1
+                    offset = nxt
+                if limit > 0 and offset < size:
+                    # Cola de menos de un encabezado: basura de un corte
+                    return size
+        except (OSError, ValueError):
+            return size
+        return offset
+
+    def commit(self, seq: int, offset: int) -> None:
+        """Confirma todo lo anterior a (segmento, offset): se entregó al destino."""
+        with self._lock:
+            self._commit_locked(seq, offset)
+
+    def _commit_locked(self, seq: int, offset: int) -> None:
+        for s in [x for x in self._segments if x < seq]:
+            self._remove_segment(s)
+        if not self._segments:
+            return
+        self._read_seq, self._read_offset = seq, offset
+        if seq == self._segments[-1] and offset >= self._sizes.get(seq, 0):
+            # Todo entregado: se libera el disco
+            self._reset()
+            return
+        self._save_checkpoint()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+def find_spooled_destinations(spool_dir: str) -> List[Tuple[str, int, str]]:
+    """Destinos con spool en disco (leídos de su archivo `dest`), para reanudar al iniciar."""
+    out: List[Tuple[str, int, str]] = []
+    if not spool_dir or not os.path.isdir(spool_dir):
+        return out
+    for name in sorted(os.listdir(spool_dir)):
+        try:
+            with open(os.path.join(spool_dir, name, "dest"), "r", encoding="utf-8") as f:
+                transport, ip, port = f.read().split()
+            out.append((ip, int(port), transport))
+        except (OSError, ValueError):
+            continue
+    return out
@@ -1,6 +1,6 @@
 #!/bin/bash
 # Script para iniciar el servidor TQ+RPG en segundo plano
-# Uso: ./start_server_rpg.sh
+# Uso: ./start_server_rpg.sh [--event-loop] [--event-loop-threads=N]
 
 # Configuración
 SCRIPT_NAME="tq_server_rpg.py"
@@ -71,7 +71,7 @@ mkdir -p logs
 echo -e "${BLUE}🔄 Iniciando servidor en segundo plano...${NC}"
 
 # Ejecutar con nohup para que persista después de cerrar terminal
-nohup "$PYTHON_CMD" "$SCRIPT_NAME" --daemon > "$LOG_FILE" 2>&1 &
+nohup "$PYTHON_CMD" "$SCRIPT_NAME" --daemon "$@" > "$LOG_FILE" 2>&1 &
 SERVER_PID=$!
 
 # Guardar PID
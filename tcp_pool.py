@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de conexiones TCP salientes para los reenvíos (TQ crudo y GEO5 por TCP).
+
+Antes cada mensaje abría un socket, hacía `connect()` (timeout 2 s), `sendall` y lo
+cerraba: un handshake completo por posición y por destino. El pool mantiene una conexión
+persistente por `(ip, puerto)` con `TCP_NODELAY` y `SO_KEEPALIVE`:
+
+- Antes de escribir se verifica que el socket siga vivo (`recv` con `MSG_PEEK` sin
+  bloquear): si el otro extremo cerró (lectura vacía o error) se reconecta. Lo que el
+  destino mande (ACKs) se descarta para que el buffer de entrada no se llene.
+- Si `sendall` falla sobre una conexión reutilizada (half-open detectado recién al
+  escribir), se reconecta y se reintenta una vez.
+- Cada destino tiene un circuit breaker (`circuit_breaker.py`): con el circuito abierto
+  `send()` falla enseguida con `CircuitOpenError`, sin tocar la red ni esperar el timeout
+  de conexión; vencido el plazo, un envío de prueba decide si se cierra o se reabre.
+- El timeout de `connect()` sale de los RTT de conexión observados para ese destino
+  (p95 x 4, entre 0.25 s y 2 s) en lugar de 2 s fijos.
+
+Los envíos a un mismo destino se serializan con un lock por destino (es un único stream);
+destinos distintos no se bloquean entre sí.
+"""
+
+from __future__ import annotations
+
+import socket
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+
+from circuit_breaker import MAX_CONNECT_TIMEOUT, CircuitBreaker, CircuitOpenError
+
+DEFAULT_SEND_TIMEOUT = 2.0
+# Conexiones sin uso por más de este tiempo se reabren (NAT/firewalls las descartan en silencio)
+IDLE_REOPEN_SECONDS = 300.0
+
+Address = Tuple[str, int]
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class _Connection:
+    """Estado de un destino. Se modifica solo con `lock` tomado."""
+
+    __slots__ = (
+        "lock",
+        "sock",
+        "last_used",
+        "breaker",
+        "connects",
+        "sent",
+        "errors",
+        "last_error",
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sock: Optional[socket.socket] = None
+        self.last_used = 0.0
+        self.breaker: Optional[CircuitBreaker] = None
+        self.connects = 0
+        self.sent = 0
+        self.errors = 0
+        self.last_error = ""
+
+    def close(self) -> None:
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+def _peer_alive(sock: socket.socket) -> bool:
+    """
+    True si el socket sigue conectado. Descarta lo que haya llegado del destino;
+    una lectura vacía (FIN) o un error (RST) indican que hay que reconectar.
+    """
+    try:
+        sock.setblocking(False)
+        while True:
+            chunk = sock.recv(4096, socket.MSG_PEEK)
+            if not chunk:
+                return False
+            sock.recv(len(chunk))
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    finally:
+        try:
+            sock.settimeout(DEFAULT_SEND_TIMEOUT)
+        except OSError:
+            pass
+
+
+class TcpConnectionPool:
+    """Conexiones TCP persistentes por `(ip, puerto)`, compartidas por todos los reenvíos."""
+
+    def __init__(
+        self,
+        max_connect_timeout: float = MAX_CONNECT_TIMEOUT,
+        send_timeout: float = DEFAULT_SEND_TIMEOUT,
+        idle_reopen_seconds: float = IDLE_REOPEN_SECONDS,
+        **breaker_kwargs,
+    ):
+        self.max_connect_timeout = max_connect_timeout
+        self.send_timeout = send_timeout
+        self.breaker_kwargs = breaker_kwargs
+        self.idle_reopen_seconds = idle_reopen_seconds
+        self._conns: Dict[Address, _Connection] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, addr: Address) -> _Connection:
+        conn = self._conns.get(addr)
+        if conn is None:
+            with self._lock:
+                conn = self._conns.get(addr)
+                if conn is None:
+                    conn = _Connection()
+                    conn.breaker = CircuitBreaker(max_timeout=self.max_connect_timeout, **self.breaker_kwargs)
+                    self._conns[addr] = conn
+        return conn
+
+    def _connect(self, addr: Address, conn: _Connection) -> socket.socket:
+        breaker = conn.breaker
+        breaker.check(f"{addr[0]}:{addr[1]}")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        t0 = time.monotonic()
+        try:
+            sock.settimeout(breaker.connect_timeout())
+            sock.connect(addr)
+            rtt = time.monotonic() - t0
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.settimeout(self.send_timeout)
+        except OSError as e:
+            sock.close()
+            breaker.record_failure(str(e))
+            raise
+        breaker.record_success(rtt)
+        conn.connects += 1
+        conn.sock = sock
+        return sock
+
+    @staticmethod
+    def _sendall(conn: _Connection, sock: socket.socket, data: BytesLike) -> None:
+        """`sendall` sobre una conexión recién abierta: si falla, cuenta para el circuito."""
+        try:
+            sock.sendall(data)
+        except OSError as e:
+            conn.breaker.record_failure(str(e))
+            raise
+
+    def send(self, host: str, port: int, data: BytesLike) -> None:
+        """
+        Envía `data` completo al destino por su conexión persistente.
+        Lanza OSError (`CircuitOpenError` si el circuito está abierto) si no se pudo enviar.
+        """
+        addr = (host, int(port))
+        conn = self._entry(addr)
+        with conn.lock:
+            now = time.monotonic()
+            sock = conn.sock
+            if sock is not None:
+                if now - conn.last_used > self.idle_reopen_seconds or not _peer_alive(sock):
+                    conn.close()
+                    sock = None
+            try:
+                if sock is None:
+                    sock = self._connect(addr, conn)
+                    self._sendall(conn, sock, data)
+                else:
+                    try:
+                        sock.sendall(data)
+                    except OSError:
+                        # Conexión vieja caída sin aviso: un reintento con conexión nueva
+                        conn.close()
+                        sock = self._connect(addr, conn)
+                        self._sendall(conn, sock, data)
+            except CircuitOpenError:
+                conn.errors += 1
+                raise
+            except OSError as e:
+                conn.close()
+                conn.errors += 1
+                conn.last_error = str(e)
+                raise
+            conn.sent += 1
+            conn.last_used = time.monotonic()
+
+    def close(self, host: str, port: int) -> None:
+        conn = self._conns.get((host, int(port)))
+        if conn is not None:
+            with conn.lock:
+                conn.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            conns = list(self._conns.values())
+        for conn in conns:
+            with conn.lock:
+                conn.close()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Contadores y estado del circuito por destino (`ip:puerto`) para /health."""
+        out: Dict[str, Dict] = {}
+        with self._lock:
+            items = list(self._conns.items())
+        for (host, port), conn in items:
+            out[f"{host}:{port}"] = {
+                "connected": conn.sock is not None,
+                "connects": conn.connects,
+                "sent": conn.sent,
+                "errors": conn.errors,
+                "last_error": conn.last_error,
+                "circuit": conn.breaker.snapshot(),
+            }
+        return out
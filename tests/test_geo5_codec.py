@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+El encoder GEO5 (`geo5_codec.encode_position`) arma el mismo mensaje, byte a byte, que el
+armado en texto original (`%07.4f` de los minutos + `protocolo.sacar_checksum`), incluido el
+redondeo de la última cifra de minutos.
+
+    python -m pytest tests/
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geo5_codec  # noqa: E402
+import protocolo  # noqa: E402
+
+
+def _text_message(timestamp, xlat, xlon, speed, heading, status, evento, device_id):
+    """Armado original del mensaje (RGPdesdeCHINO / create_rpg_message_from_gps)."""
+    lat_abs = abs(float(xlat))
+    lon_abs = abs(float(xlon))
+    lat_deg = int(lat_abs)
+    lon_deg = int(lon_abs)
+    lat = ("-" if xlat < 0 else "+") + f"{lat_deg:02d}{(lat_abs - lat_deg) * 60.0:07.4f}"
+    lon = ("-" if xlon < 0 else "+") + f"{lon_deg:03d}{(lon_abs - lon_deg) * 60.0:07.4f}"
+    valor = (
+        f">RGP{timestamp}{lat}{lon}{int(speed):03d}{int(heading):03d}{status}"
+        f"000001;&{evento};ID={device_id};#0001*"
+    )
+    return valor + protocolo.sacar_checksum(valor) + "<"
+
+
+class Geo5EncoderTest(unittest.TestCase):
+    def assertSameMessage(self, *args):
+        self.assertEqual(geo5_codec.encode_position(*args).decode("ascii"), _text_message(*args), args)
+
+    def test_random_positions(self):
+        rng = random.Random(7)
+        for _ in range(20000):
+            # Coordenadas como las da el decoder TQ (7 decimales) o arbitrarias
+            lat = rng.uniform(-90, 90)
+            lon = rng.uniform(-180, 180)
+            if rng.random() < 0.5:
+                lat, lon = round(lat, 7), round(lon, 7)
+            self.assertSameMessage(
+                "171026%02d%02d%02d" % (rng.randrange(24), rng.randrange(60), rng.randrange(60)),
+                lat, lon, rng.randrange(0, 251), rng.randrange(0, 361),
+                rng.choice("01"), rng.choice(("01", "08")), str(rng.randrange(1, 99999)),
+            )
+
+    def test_rounding_ties_and_limits(self):
+        # Minutos que caen justo en la mitad de la 4ª cifra, cerca de 60' y en grados exactos
+        for lat, lon in [
+            (-34.6002525, -58.5001275), (34.00000083, 58.99999999), (-0.0, 0.0),
+            (-34.99999999, -179.99999999), (89.9999999, 179.9999999), (-34.5, -58.25),
+            (19.4208625, -99.1262625), (-34.0000125, -58.0000375),
+        ]:
+            self.assertSameMessage("171026120530", lat, lon, 45, 207, "1", "01", "68133")
+
+    def test_tail_cache(self):
+        a = geo5_codec.encode_position("171026120530", -34.6, -58.5, 1, 2, "1", "08", "12345")
+        b = geo5_codec.encode_position("171026120530", -34.6, -58.5, 1, 2, "1", "08", "12345")
+        self.assertEqual(a, b)
+        self.assertEqual(a.decode("ascii"), _text_message("171026120530", -34.6, -58.5, 1, 2, "1", "08", "12345"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Equivalencia de `tq_decoder.decode_tq_position` con los getters de texto de `protocolo`
+(la referencia), sobre tramas `$24` al azar y casos borde.
+
+    python -m pytest tests/
+    python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import protocolo  # noqa: E402
+from tq_decoder import MAX_SPEED_KMH, TQ_POSITION_MIN_LEN, decode_tq_position  # noqa: E402
+
+
+def _decode_with_getters(frame: bytes) -> dict:
+    """Decodificación como la hacía `decode_position_message` con los getters de `protocolo`."""
+    dato = frame.hex()
+    speed_kmh = protocolo.getVELchino(dato) * 1.852
+    if speed_kmh > MAX_SPEED_KMH:
+        speed_kmh = MAX_SPEED_KMH
+    heading = protocolo.getRUMBOchino(dato)
+    if not (0 <= heading <= 360):
+        heading = 0
+    return {
+        "device_id": dato[2:12][-5:],
+        "device_id_completo": dato[2:12],
+        "latitude": protocolo.getLATchino(dato),
+        "longitude": protocolo.getLONchino(dato),
+        "speed_knots": protocolo.getVELchino(dato),
+        "speed": int(speed_kmh),
+        "heading": heading,
+        "fecha_gps": protocolo.getFECHA_GPS_TQ(dato),
+        "hora_gps": protocolo.getHORA_GPS_TQ(dato),
+    }
+
+
+def _as_dict(rec) -> dict:
+    return {k: getattr(rec, k) for k in (
+        "device_id", "device_id_completo", "latitude", "longitude", "speed_knots",
+        "speed", "heading", "fecha_gps", "hora_gps",
+    )}
+
+
+def _bcd(rng: random.Random, n_bytes: int, bad_nibbles: float = 0.0) -> bytes:
+    """`n_bytes` en BCD; con probabilidad `bad_nibbles` cada nibble es A-F (campo inválido)."""
+    out = bytearray()
+    for _ in range(n_bytes):
+        hi = rng.randrange(10, 16) if rng.random() < bad_nibbles else rng.randrange(10)
+        lo = rng.randrange(10, 16) if rng.random() < bad_nibbles else rng.randrange(10)
+        out.append(hi << 4 | lo)
+    return bytes(out)
+
+
+def _random_frame(rng: random.Random) -> bytes:
+    bad = rng.choice((0.0, 0.0, 0.0, 0.02, 0.2))
+    status = rng.choice((0xFF, rng.randrange(256)))
+    body = _bcd(rng, 25, bad) + bytes([status])
+    tail = bytes(rng.randrange(256) for _ in range(rng.randrange(0, 20)))
+    return b"$" + body + tail
+
+
+class DecodeTqPositionTest(unittest.TestCase):
+    def assertSameDecode(self, frame: bytes) -> None:
+        rec = decode_tq_position(frame)
+        self.assertIsNotNone(rec, frame.hex())
+        self.assertEqual(_as_dict(rec), _decode_with_getters(frame), frame.hex())
+
+    def test_random_frames(self):
+        rng = random.Random(20261017)
+        for _ in range(20000):
+            self.assertSameDecode(_random_frame(rng))
+
+    def test_memoryview_input(self):
+        rng = random.Random(5)
+        for _ in range(200):
+            frame = _random_frame(rng)
+            self.assertEqual(_as_dict(decode_tq_position(memoryview(frame))), _as_dict(decode_tq_position(frame)))
+
+    def test_edge_cases(self):
+        base = bytes.fromhex(
+            "24" "2076668133" "120530" "171026" "3436123456" "0582512345" "045" "207" "ff" "00"
+        )
+        cases = [base]
+        # Byte de status: 0xFF con longitud >= 80 y < 80, cada combinación de bits N/S y E/O
+        cases.append(base[:17] + bytes.fromhex("0992512345") + base[22:])
+        cases.append(base[:17] + bytes.fromhex("0802512345") + base[22:])
+        cases.append(base[:17] + bytes.fromhex("0792512345") + base[22:])
+        cases.append(base[:17] + bytes.fromhex("a992512345") + base[22:])
+        for status in (0x00, 0x04, 0x08, 0x0C, 0xF3, 0xFE):
+            cases.append(base[:25] + bytes([status]) + base[26:])
+        # Velocidad y rumbo en los límites (255/256 nudos, 360/361 grados) y nibbles inválidos
+        for vr in ("255360", "256361", "000000", "999999", "13500a", "a00180", "135b80"):
+            cases.append(base[:22] + bytes.fromhex(vr) + base[25:])
+        # Latitud/longitud con un nibble inválido, campos en cero, trama justo del largo mínimo
+        cases.append(base[:12] + bytes.fromhex("34361234f6") + base[17:])
+        cases.append(base[:17] + bytes.fromhex("058251234c") + base[22:])
+        cases.append(base[:12] + bytes(10) + base[22:])
+        self.assertEqual(len(base), TQ_POSITION_MIN_LEN)
+        cases.append(base + b"\x00\x01\x02\x0d\x0a")
+        for frame in cases:
+            self.assertSameDecode(frame)
+
+    def test_short_frame(self):
+        self.assertIsNone(decode_tq_position(b"$" + bytes(TQ_POSITION_MIN_LEN - 2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Decodificador binario de tramas TQ de posición (`$24...`).
+
+Separa los campos BCD de sus offsets fijos con un único `struct.unpack_from` sobre la
+trama (bytes o memoryview), sin `hexlify` de la trama completa ni los getters de
+`protocolo` que re-parsean el string hexadecimal (los signos se leían dos veces).
+El resultado es un único `PositionRecord`.
+
+Los getters de texto (`protocolo.getLATchino`, `getLONchino`, `getVELchino`,
+`getRUMBOchino`, `getFECHA_GPS_TQ`, `getHORA_GPS_TQ`, `getCoordSignsTQ`) se mantienen
+como referencia: para cualquier trama de al menos `TQ_POSITION_MIN_LEN` bytes, este
+decodificador devuelve exactamente los mismos valores.
+
+Layout (offset en bytes; entre paréntesis, posición en el string hex):
+    0       '$' (0x24)
+    1-5     ID del equipo, 10 dígitos BCD          (2-11)
+    6-8     hora GPS HHMMSS                        (12-17)
+    9-11    fecha GPS DDMMYY                       (18-23)
+    12-16   latitud  GGMM + 6 decimales de minuto  (24-33)
+    17-21   longitud GGGMM + 5 decimales de minuto (34-43)
+    22-23h  velocidad en nudos, 3 dígitos          (44-46)
+    23l-24  rumbo en grados, 3 dígitos             (47-49)
+    25      byte alto de status (signos)           (50-51)
+"""
+
+from __future__ import annotations
+
+import struct
+from datetime import datetime
+from typing import Dict, Optional, Union
+
+# Largo mínimo para leer todos los campos, incluido el byte de status (54 caracteres hex)
+TQ_POSITION_MIN_LEN = 27
+
+# Límite de velocidad aplicado al convertir a km/h (igual que decode_position_message)
+MAX_SPEED_KMH = 250
+
+# Campos de la trama a partir del byte 1: ID, hora, fecha, lat, lon, vel+rumbo, status
+_LAYOUT = struct.Struct('>x5s3s3s5s5s3sB')
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class PositionRecord:
+    """Posición decodificada de una trama `$24`."""
+
+    __slots__ = (
+        "device_id",
+        "device_id_completo",
+        "latitude",
+        "longitude",
+        "speed_knots",
+        "speed",
+        "heading",
+        "fecha_gps",
+        "hora_gps",
+    )
+
+    def __init__(self, device_id: str, device_id_completo: str, latitude: float, longitude: float,
+                 speed_knots: int, speed: int, heading: int, fecha_gps: str, hora_gps: str):
+        self.device_id = device_id                    # ID para RPG (últimos 5 dígitos)
+        self.device_id_completo = device_id_completo  # ID completo (10 dígitos)
+        self.latitude = latitude
+        self.longitude = longitude
+        self.speed_knots = speed_knots
+        self.speed = speed                            # km/h entero (para RPG)
+        self.heading = heading
+        self.fecha_gps = fecha_gps                    # DD/MM/YY
+        self.hora_gps = hora_gps                      # HH:MM:SS
+
+    def as_dict(self) -> Dict:
+        """Mismo formato que devuelve `TQServerRPG.decode_position_message`."""
+        return {
+            'device_id': self.device_id,
+            'device_id_completo': self.device_id_completo,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'heading': self.heading,
+            'speed': self.speed,
+            'fecha_gps': self.fecha_gps,
+            'hora_gps': self.hora_gps,
+            'timestamp': datetime.now().isoformat(),
+        }
+
+
+def _coord_signs(status_hi: int, lon_hex: str) -> tuple:
+    """Equivalente binario de `protocolo.getCoordSignsTQ`."""
+    if status_hi == 0xFF:
+        # Status de relleno: se decide por la magnitud de la longitud (3 primeros dígitos)
+        lon_deg = int(lon_hex[:3]) if lon_hex[:3].isdigit() else 0
+        if lon_deg >= 80:
+            return 1, -1  # México / oeste de América del Norte
+        return -1, -1  # default Sur/Oeste (Argentina)
+    lat_sign = 1 if (status_hi & 0x04) else -1  # bit2: 1=Norte
+    lon_sign = -1 if (status_hi & 0x08) else 1  # bit3: 1=Oeste
+    return lat_sign, lon_sign
+
+
+def decode_tq_position(buf: Buffer) -> Optional[PositionRecord]:
+    """
+    Decodifica una trama `$24` en una sola pasada.
+
+    Devuelve None si la trama es más corta que `TQ_POSITION_MIN_LEN` (el llamador puede
+    usar los getters de texto para esos casos). Los campos inválidos se resuelven igual
+    que en `protocolo`: coordenadas 0.0, velocidad/rumbo 0.
+    """
+    if len(buf) < TQ_POSITION_MIN_LEN:
+        return None
+
+    id_b, hora_b, fecha_b, lat_b, lon_b, vr_b, status_hi = _LAYOUT.unpack_from(buf)
+    # Cada campo BCD se pasa a dígitos con .hex(); un nibble A-F invalida el campo
+    device_id_completo = id_b.hex()
+    h = hora_b.hex()
+    f = fecha_b.hex()
+    lat_h = lat_b.hex()
+    lon_h = lon_b.hex()
+    vr = vr_b.hex()
+
+    lat_sign, lon_sign = _coord_signs(status_hi, lon_h)
+
+    # Latitud: GG MM mmmmmm
+    if lat_h.isdigit():
+        minutos = int(lat_h[2:4]) + int(lat_h[4:10]) / 1000000.0
+        latitude = round(lat_sign * (int(lat_h[0:2]) + minutos / 60.0), 7)
+    else:
+        latitude = 0.0
+
+    # Longitud: GGG MM mmmmm
+    if lon_h.isdigit():
+        minutos = int(lon_h[3:5]) + int(lon_h[5:10]) / 100000.0
+        longitude = round(lon_sign * (int(lon_h[0:3]) + minutos / 60.0), 7)
+    else:
+        longitude = 0.0
+
+    # Velocidad (nudos, 3 dígitos) y rumbo (grados, 3 dígitos) comparten el byte 23
+    v = vr[0:3]
+    speed_knots = int(v) if v.isdigit() else 0
+    if speed_knots > 255:
+        speed_knots = 0
+    r = vr[3:6]
+    heading = int(r) if r.isdigit() else 0
+    if heading > 360:
+        heading = 0
+
+    speed_kmh = speed_knots * 1.852
+    if speed_kmh > MAX_SPEED_KMH:
+        speed_kmh = MAX_SPEED_KMH
+
+    return PositionRecord(
+        device_id=device_id_completo[-5:],
+        device_id_completo=device_id_completo,
+        latitude=latitude,
+        longitude=longitude,
+        speed_knots=speed_knots,
+        speed=int(speed_kmh),
+        heading=heading,
+        fecha_gps=f"{f[0:2]}/{f[2:4]}/{f[4:6]}",
+        hora_gps=f"{h[0:2]}:{h[2:4]}:{h[4:6]}",
+    )
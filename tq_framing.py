@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Reensamblado de tramas TQ sobre el stream TCP.
+
+TCP no respeta los límites de los mensajes: en un mismo `recv` pueden llegar varias
+tramas `$...` binarias o `*HQ,...#` de texto, y una trama puede quedar partida entre
+dos lecturas. `TQStreamReassembler` mantiene un buffer por conexión, separa las tramas
+completas y guarda la cola parcial para la próxima lectura.
+
+`Frame` envuelve cada trama completa mientras recorre el pipeline (decodificación,
+reenvíos, logs) y calcula a lo sumo una vez sus vistas hex / ascii / ID / protocolo.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Union
+
+# Trama binaria de posición: marcador 0x24 ('$') + 44 bytes
+# Ej: 24 2076668133 174421 030925 3439135506 0583202802 002297 ffffdfff ... 000009
+TQ_BINARY_MARKER = 0x24
+TQ_BINARY_FRAME_LEN = 45
+
+# Trama de texto: '*' ... '#'
+TQ_TEXT_START = 0x2A
+TQ_TEXT_END = 0x23
+TQ_TEXT_MAX_LEN = 1024
+
+# Tramas GT06: 7878 + largo (1 byte) ... 0d0a / 7979 + largo (2 bytes) ... 0d0a
+GT06_SHORT_START = b"\x78\x78"
+GT06_LONG_START = b"\x79\x79"
+
+# Tope del buffer de reensamblado por conexión
+MAX_BUFFER_BYTES = 64 * 1024
+
+
+class TQStreamReassembler:
+    """
+    Buffer de reensamblado de una conexión TCP.
+
+    `feed()` recibe el resultado de cada `recv` y devuelve la lista de tramas completas
+    (en orden de llegada). Lo que no se reconoce como inicio de trama TQ/GT06 se entrega
+    tal cual, igual que antes (un recv = un mensaje), para no perder protocolos nuevos.
+    """
+
+    __slots__ = ("_buf",)
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        buf = self._buf
+        buf += data
+        frames: List[bytes] = []
+        pos = 0
+        n = len(buf)
+        while pos < n:
+            b0 = buf[pos]
+            if b0 == TQ_BINARY_MARKER:
+                end = pos + TQ_BINARY_FRAME_LEN
+                if end > n:
+                    break
+            elif b0 == TQ_TEXT_START:
+                end = buf.find(b"#", pos + 1, pos + TQ_TEXT_MAX_LEN)
+                if end < 0:
+                    if n - pos < TQ_TEXT_MAX_LEN:
+                        break
+                    # Sin '#' dentro del máximo: entregar lo acumulado tal cual
+                    end = n
+                else:
+                    end += 1
+            elif buf.startswith(GT06_SHORT_START, pos):
+                if n - pos < 3:
+                    break
+                end = pos + buf[pos + 2] + 5
+                if end > n:
+                    break
+            elif buf.startswith(GT06_LONG_START, pos):
+                if n - pos < 4:
+                    break
+                end = pos + ((buf[pos + 2] << 8) | buf[pos + 3]) + 6
+                if end > n:
+                    break
+            elif b0 in (0x0D, 0x0A):
+                # Separadores de línea entre tramas de texto
+                pos += 1
+                continue
+            else:
+                if n - pos == 1 and b0 in (0x78, 0x79):
+                    # Posible inicio GT06 partido
+                    break
+                end = n
+            frames.append(bytes(buf[pos:end]))
+            pos = end
+
+        if pos:
+            del buf[:pos]
+        if len(buf) > MAX_BUFFER_BYTES:
+            frames.append(bytes(buf))
+            buf.clear()
+        return frames
+
+
+class Frame:
+    """
+    Trama recibida con vistas derivadas calculadas bajo demanda y cacheadas.
+
+    - `raw`: bytes tal como llegaron (es lo que se reenvía).
+    - `hex`: hexadecimal en minúsculas (igual que `funciones.bytes2hexa`), para logs y
+      para los getters de `protocolo` que trabajan sobre el string.
+    - `text`: decodificación ascii (ignorando bytes no ascii) sin espacios extremos.
+    - `full_id` / `rpg_id`: ID TQ de 10 dígitos (bytes 1-5) y sus últimos 5 dígitos;
+      vacíos si esos bytes no son BCD.
+    - `protocol`: byte de protocolo (posición hex 6-8, como `protocolo.getPROTOCOL`).
+    """
+
+    __slots__ = ("raw", "_hex", "_text", "_full_id", "_protocol")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._hex: Optional[str] = None
+        self._text: Optional[str] = None
+        self._full_id: Optional[str] = None
+        self._protocol: Optional[str] = None
+
+    @classmethod
+    def of(cls, data: Union["Frame", bytes]) -> "Frame":
+        """Devuelve `data` si ya es un Frame; si no, lo envuelve."""
+        return data if isinstance(data, Frame) else cls(bytes(data))
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def __bytes__(self) -> bytes:
+        return self.raw
+
+    @property
+    def hex(self) -> str:
+        if self._hex is None:
+            self._hex = self.raw.hex()
+        return self._hex
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.raw.decode("ascii", errors="ignore").strip()
+        return self._text
+
+    @property
+    def is_text(self) -> bool:
+        """Trama de texto `*...#` (NMEA / HQ)."""
+        text = self.text
+        return text.startswith("*") and text.endswith("#")
+
+    @property
+    def full_id(self) -> str:
+        if self._full_id is None:
+            candidate = self.raw[1:6].hex() if len(self.raw) >= 6 else ""
+            self._full_id = candidate if candidate.isdigit() else ""
+        return self._full_id
+
+    @property
+    def rpg_id(self) -> str:
+        return self.full_id[-5:]
+
+    @property
+    def protocol(self) -> str:
+        if self._protocol is None:
+            self._protocol = self.raw[3:4].hex()
+        return self._protocol
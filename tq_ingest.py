@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Ingesta TCP por event loop (selectors) para el servidor TQ.
+
+Reemplaza el modelo thread-por-conexión de `TQServerRPG.handle_client`: todas las
+conexiones de equipos se atienden desde uno o pocos threads, cada uno con su propio
+selector. Las tramas reensambladas se entregan al mismo pipeline (`process_frames_with_rpg`).
+"""
+
+from __future__ import annotations
+
+import selectors
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from tq_framing import TQStreamReassembler
+
+# Segundos sin actividad antes de cerrar una conexión (igual que el modo threads)
+DEFAULT_IDLE_TIMEOUT_SECONDS = 300.0
+# Cada cuánto se revisan conexiones inactivas o cerradas desde afuera
+SWEEP_INTERVAL_SECONDS = 5.0
+
+
+class _Connection:
+    __slots__ = ("sock", "client_id", "last_activity", "reassembler")
+
+    def __init__(self, sock: socket.socket, client_id: str):
+        self.sock = sock
+        self.client_id = client_id
+        self.last_activity = time.monotonic()
+        self.reassembler = TQStreamReassembler()
+
+
+class SelectorIngest:
+    """
+    Atiende el socket de escucha y todas las conexiones de equipos con `selectors`.
+
+    Con `loops > 1` se levantan varios threads; cada uno registra el socket de escucha
+    en su selector y acepta conexiones por su cuenta (accept no bloqueante), de modo
+    que no hace falta pasar sockets entre threads.
+    """
+
+    def __init__(
+        self,
+        server,
+        loops: int = 1,
+        recv_size: int = 4096,
+        idle_timeout_seconds: float = DEFAULT_IDLE_TIMEOUT_SECONDS,
+    ):
+        self.server = server
+        self.loops = max(1, int(loops))
+        self.recv_size = int(recv_size)
+        self.idle_timeout_seconds = float(idle_timeout_seconds)
+        self._threads: List[threading.Thread] = []
+
+    def run(self) -> None:
+        """Bloquea hasta que `server.running` pase a False o se cierre el socket de escucha."""
+        listen_sock = self.server.server_socket
+        listen_sock.setblocking(False)
+        for i in range(1, self.loops):
+            t = threading.Thread(target=self._loop, args=(listen_sock,), name=f"tq-ingest-{i}")
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+        self._loop(listen_sock)
+        for t in self._threads:
+            t.join(timeout=2.0)
+
+    def _loop(self, listen_sock: socket.socket) -> None:
+        sel = selectors.DefaultSelector()
+        try:
+            sel.register(listen_sock, selectors.EVENT_READ, None)
+        except (OSError, ValueError):
+            sel.close()
+            return
+        next_sweep = time.monotonic() + SWEEP_INTERVAL_SECONDS
+        try:
+            while self.server.running:
+                if listen_sock.fileno() == -1:
+                    break
+                try:
+                    events = sel.select(timeout=1.0)
+                except OSError as e:
+                    self.server.logger.error(f"Error en selector de ingesta: {e}")
+                    break
+                for key, _mask in events:
+                    if key.data is None:
+                        self._accept(sel, listen_sock)
+                    else:
+                        self._read(sel, key.data)
+                now = time.monotonic()
+                if now >= next_sweep:
+                    self._sweep(sel, now)
+                    next_sweep = now + SWEEP_INTERVAL_SECONDS
+        finally:
+            for key in list(sel.get_map().values()):
+                if key.data is not None:
+                    self._close(sel, key.data)
+            sel.close()
+
+    def _accept(self, sel: selectors.BaseSelector, listen_sock: socket.socket) -> None:
+        # Aceptar todo lo pendiente; otro loop puede habernos ganado la conexión.
+        while True:
+            try:
+                client_socket, client_address = listen_sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if self.server.running:
+                    self.server.logger.error(f"Error aceptando conexión: {e}")
+                return
+            client_socket.setblocking(False)
+            client_id = f"{client_address[0]}:{client_address[1]}"
+            conn = _Connection(client_socket, client_id)
+            self.server.clients[client_id] = client_socket
+            self.server.client_last_activity[client_id] = datetime.now()
+            sel.register(client_socket, selectors.EVENT_READ, conn)
+            self.server.logger.info(f"Nueva conexión desde {client_id}")
+            print(f"🔗 Nueva conexión desde {client_id}")
+
+    def _read(self, sel: selectors.BaseSelector, conn: _Connection) -> None:
+        try:
+            data = conn.sock.recv(self.recv_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self.server.logger.debug(f"Error de socket con cliente {conn.client_id}: {e}")
+            self._close(sel, conn)
+            return
+        if not data:
+            self._close(sel, conn)
+            return
+        conn.last_activity = time.monotonic()
+        self.server.client_last_activity[conn.client_id] = datetime.now()
+        frames = conn.reassembler.feed(data)
+        if not frames:
+            return
+        try:
+            self.server.process_frames_with_rpg(frames, conn.client_id)
+        except Exception as e:
+            self.server.logger.error(f"Error manejando cliente {conn.client_id}: {e}")
+            print(f"❌ Error con cliente {conn.client_id}: {e}")
+
+    def _sweep(self, sel: selectors.BaseSelector, now: float) -> None:
+        for key in list(sel.get_map().values()):
+            conn: Optional[_Connection] = key.data
+            if conn is None:
+                continue
+            # Cerrada por el thread de limpieza de conexiones inactivas
+            if conn.sock.fileno() == -1:
+                self._close(sel, conn)
+                continue
+            if now - conn.last_activity > self.idle_timeout_seconds:
+                self.server.logger.warning(
+                    f"Conexión {conn.client_id} inactiva por más de 5 minutos - cerrando"
+                )
+                print(f"⏱️  Conexión {conn.client_id} inactiva - cerrando")
+                self._close(sel, conn)
+
+    def _close(self, sel: selectors.BaseSelector, conn: _Connection) -> None:
+        try:
+            sel.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        if len(conn.reassembler):
+            self.server.logger.debug(
+                f"Conexión {conn.client_id}: se descartan {len(conn.reassembler)} bytes de trama incompleta"
+            )
+        self.server.release_client(conn.client_id, conn.sock)
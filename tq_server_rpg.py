@@ -16,18 +16,92 @@ import requests
 import time
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from functools import partial
+from typing import Dict, List, Optional, Tuple, Union
 from http.server import HTTPServer, BaseHTTPRequestHandler
 
 # Importar las funciones y protocolos existentes
 import funciones
+import geo5_codec
+import log_writer
 import protocolo
 from log_optimizer import get_rpg_logger
 from reenvios_config import (
-    ForwardingRule,
+    EMPTY_ROUTE_PLAN,
+    RouteIndex,
+    RoutePlan,
+    RouteTarget,
     append_reenvio_log,
     load_reenvios_config,
 )
+from config_watcher import ConfigWatcher
+from tq_framing import Frame, TQStreamReassembler
+from tq_ingest import SelectorIngest
+from tq_sessions import SessionTable
+from tq_decoder import decode_tq_position
+from tcp_pool import TcpConnectionPool
+import udp_sender
+from forwarding import DROP_OLDEST, ForwardingDispatcher
+from packet_capture import PacketCapture
+from log_archive import LogArchiver
+
+def build_health_handler(server_instance):
+    """
+    Crea el handler HTTP de /health para cualquier objeto con `running` y `get_status()`
+    (el servidor o el supervisor de workers).
+    """
+    
+    class HealthCheckHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            """Silenciar logs HTTP para no contaminar el log principal"""
+            pass
+        
+        def do_GET(self):
+            """Maneja peticiones GET al endpoint /health"""
+            if self.path == '/health':
+                try:
+                    # Obtener estado del servidor
+                    status_data = server_instance.get_status()
+                    
+                    # Preparar respuesta JSON
+                    response = {
+                        'status': 'ok' if server_instance.running else 'stopped',
+                        'timestamp': datetime.now().isoformat(),
+                        'uptime_seconds': status_data['uptime_seconds'],
+                        'clients': status_data['connected_clients'],
+                        'messages': status_data['total_messages'],
+                        'terminal_id': status_data['terminal_id']
+                    }
+                    if 'workers' in status_data:
+                        response['workers'] = status_data['workers']
+                    if 'forwarding' in status_data:
+                        response['forwarding'] = status_data['forwarding']
+                    
+                    # Enviar respuesta
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.end_headers()
+                    self.wfile.write(json.dumps(response).encode('utf-8'))
+                    
+                except Exception as e:
+                    # Error interno
+                    self.send_response(500)
+                    self.send_header('Content-Type', 'application/json')
+                    self.end_headers()
+                    error_response = {
+                        'status': 'error',
+                        'message': str(e)
+                    }
+                    self.wfile.write(json.dumps(error_response).encode('utf-8'))
+            else:
+                # Endpoint no encontrado
+                self.send_response(404)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({'status': 'not_found'}).encode('utf-8'))
+    
+    return HealthCheckHandler
+
 
 class TQServerRPG:
     def __init__(self, host: str = '0.0.0.0', port: int = 5003, 
@@ -40,7 +114,22 @@ class TQServerRPG:
                  reenvios_reload_interval_seconds: int = 60,
                  reenvios_config_path: Optional[str] = None,
                  tq_tcp_general_host: str = '34.95.160.245',
-                 tq_tcp_general_port: int = 5004):
+                 tq_tcp_general_port: int = 5004,
+                 ingest_mode: str = 'threads',
+                 ingest_loops: int = 1,
+                 reuse_port: bool = False,
+                 notify_on_stop: bool = True,
+                 gt06_ack: bool = False,
+                 forward_queue_max: int = 2000,
+                 forward_drop_policy: str = DROP_OLDEST,
+                 spool_dir: Optional[str] = None,
+                 spool_max_mb: int = 256,
+                 spool_max_age_hours: float = 24.0,
+                 spool_replay_rate: float = 200.0,
+                 capture_dir: Optional[str] = None,
+                 capture_keep_days: float = 7,
+                 log_archive_days: int = 365,
+                 log_cleanup: bool = True):
         self.host = host
         self.port = port
         self.udp_host = udp_host
@@ -49,6 +138,36 @@ class TQServerRPG:
         # Destino general adicional: TQ posición crudo por TCP
         self.tq_tcp_general_host = tq_tcp_general_host
         self.tq_tcp_general_port = int(tq_tcp_general_port)
+        # Modo de ingesta TCP: 'threads' (un thread por conexión) o 'selectors' (event loop)
+        self.ingest_mode = ingest_mode if ingest_mode in ('threads', 'selectors') else 'threads'
+        self.ingest_loops = max(1, int(ingest_loops))
+        # SO_REUSEPORT: varios procesos worker escuchan el mismo puerto (ver tq_workers.py)
+        self.reuse_port = reuse_port
+        self.notify_on_stop = notify_on_stop
+        # Responder login (0x01) y heartbeat (0x13) de tramas GT06 7878 por la misma conexión
+        self.gt06_ack = gt06_ack
+        # Conexiones TCP persistentes por (ip, puerto) para todos los reenvíos TCP
+        self.tcp_pool = TcpConnectionPool()
+        # Datagramas UDP salientes: sockets conectados por destino y envío en ráfagas
+        self.udp_sender = udp_sender.get_sender()
+        # Reenvíos TCP: cola acotada y worker por destino, fuera del thread de lectura
+        self.forward_queue_max = forward_queue_max
+        self.forward_drop_policy = forward_drop_policy
+        self.forwarder: Optional[ForwardingDispatcher] = None
+        # Spool en disco por destino TCP (store-and-forward); spool_dir='' lo desactiva
+        self.spool_dir = spool_dir
+        self.spool_max_mb = spool_max_mb
+        self.spool_max_age_hours = spool_max_age_hours
+        self.spool_replay_rate = spool_replay_rate
+        # Captura binaria de paquetes en segmentos horarios (packet_capture.py); None/'' = no
+        self.capture_dir = capture_dir
+        self.capture_keep_days = capture_keep_days
+        self.packet_capture: Optional[PacketCapture] = None
+        # Archivo comprimido de logs de días anteriores (log_archive.py); 0 = no archivar
+        self.log_archive_days = int(log_archive_days)
+        # False: los logs diarios los archiva/borra otro proceso (el supervisor de tq_workers)
+        self.log_cleanup = log_cleanup
+        self.log_archiver: Optional[LogArchiver] = None
         
         # Configuración de heartbeat UDP
         self.heartbeat_enabled = heartbeat_enabled
@@ -58,18 +177,22 @@ class TQServerRPG:
         self.heartbeat_thread = None
         self.heartbeat_stop_event = None
         self.reenvios_reload_interval_seconds = int(reenvios_reload_interval_seconds)
-        self.reenvios_reload_thread = None
-        self.reenvios_reload_stop_event = None
+        self.reenvios_watcher: Optional[ConfigWatcher] = None
         self._reenvios_lock = threading.RLock()
         self._reenvios_last_mtime: Optional[float] = None
 
         base_dir = os.path.dirname(os.path.abspath(__file__))
+        if self.spool_dir is None:
+            self.spool_dir = os.path.join(base_dir, "spool")
         self.reenvios_config_path = (
             reenvios_config_path
             if reenvios_config_path is not None
             else os.path.join(base_dir, "REENVIOS_CONFIG.txt")
         )
         self._reenvios_by_device, _reenvios_warn = load_reenvios_config(self.reenvios_config_path)
+        # Índice de planes compilados por equipo: se reemplaza entero al recargar, así el
+        # camino caliente lo lee sin lock
+        self._route_index = RouteIndex(self._reenvios_by_device)
         try:
             self._reenvios_last_mtime = os.path.getmtime(self.reenvios_config_path)
         except Exception:
@@ -83,11 +206,13 @@ class TQServerRPG:
         self.cleanup_thread = None
         self.cleanup_stop_event = None
         self.message_count = 0
-        self.terminal_id = ""
         self.start_time = None
         
-        # Variables para filtros de posición
-        self.last_valid_position: Optional[Dict] = None
+        # Sesiones por equipo (ID completo de 10 dígitos): última posición válida,
+        # hora GPS, protocolo y contadores. Reemplaza terminal_id/last_valid_position globales.
+        self.sessions = SessionTable()
+        # TerminalID (ID RPG de 5 dígitos) informado en cada conexión
+        self.client_terminal_ids: Dict[str, str] = {}
         self.filtered_positions_count = 0
         
         # Configuración de geocodificación
@@ -102,9 +227,28 @@ class TQServerRPG:
         self.setup_logging()
         for w in _reenvios_warn:
             self.logger.warning(w)
+        if self.capture_dir:
+            self.packet_capture = PacketCapture(self.capture_dir, keep_hours=self.capture_keep_days * 24)
+            funciones.set_packet_capture(self.packet_capture)
+        self.forwarder = ForwardingDispatcher(
+            {"TCP": self.tcp_pool.send},
+            queue_max=self.forward_queue_max,
+            drop_policy=self.forward_drop_policy,
+            logger=self.logger,
+            spool_dir=self.spool_dir or None,
+            spool_max_bytes=int(self.spool_max_mb) * 1024 * 1024,
+            spool_max_age_seconds=float(self.spool_max_age_hours) * 3600,
+            replay_rate=self.spool_replay_rate,
+        )
         
         # No necesitamos archivos separados, todo va al log diario único
 
+    @property
+    def terminal_id(self) -> str:
+        """Último TerminalID visto (informativo: status/health; el pipeline usa la sesión de cada equipo)"""
+        last = self.sessions.last_device_id
+        return last[-5:] if last else ""
+
     def setup_logging(self):
         """Configura el sistema de logging para usar el archivo diario único"""
         self.logger = logging.getLogger('TQServerRPG')
@@ -116,8 +260,8 @@ class TQServerRPG:
         )
         
         # Usar el mismo archivo de log diario que funciones.py
-        log_file = funciones.get_daily_log_filename()
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        # (handler diario: cambia de archivo a medianoche, escribe en background)
+        file_handler = log_writer.DailyLogHandler(funciones.DAILY_LOG_PATTERN)
         file_handler.setLevel(logging.INFO)
         file_handler.setFormatter(formatter)
         
@@ -201,22 +345,24 @@ class TQServerRPG:
             if abs(latitude) < 0.000001 and abs(longitude) < 0.000001:
                 return False, "Coordenadas GPS inválidas (0,0)"
             
+            # Comparar solo contra la última posición válida del MISMO equipo
+            key = self._session_key(position_data)
+            session = self.sessions.get(key) if key else None
+            
             # Si no hay posición anterior válida, aceptar esta como primera
-            if self.last_valid_position is None:
+            if session is None or not session.has_position:
                 return True, ""
             
-            last_lat = self.last_valid_position.get('latitude', 0.0)
-            last_lon = self.last_valid_position.get('longitude', 0.0)
-            last_fecha_gps = self.last_valid_position.get('fecha_gps', '')
-            last_hora_gps = self.last_valid_position.get('hora_gps', '')
-            last_speed = self.last_valid_position.get('speed', 0.0)
+            last_lat = session.last_lat
+            last_lon = session.last_lon
+            last_speed = session.last_speed
+            last_time = session.last_gps_time
             
             # Calcular distancia entre posiciones
             distance = self.calculate_distance(last_lat, last_lon, latitude, longitude)
             
-            # Parsear timestamps GPS
+            # Parsear timestamp GPS (el anterior ya está parseado en la sesión)
             current_time = self.parse_gps_datetime(fecha_gps, hora_gps)
-            last_time = self.parse_gps_datetime(last_fecha_gps, last_hora_gps)
             
             if current_time and last_time:
                 time_diff = abs((current_time - last_time).total_seconds())
@@ -253,6 +399,24 @@ class TQServerRPG:
             self.logger.error(f"Error valdffdfdidando posición: {e}")
             return False, f"Error en validación: {e}"
 
+    @staticmethod
+    def _session_key(position_data: Dict) -> str:
+        """Clave de sesión: ID completo del equipo (fallback al ID RPG)"""
+        return str(position_data.get('device_id_completo', '') or position_data.get('device_id', '') or '')
+
+    def remember_valid_position(self, position_data: Dict) -> None:
+        """Actualiza la última posición válida del equipo (referencia para filtros futuros)"""
+        key = self._session_key(position_data)
+        if not key:
+            return
+        gps_time = self.parse_gps_datetime(position_data.get('fecha_gps', ''),
+                                           position_data.get('hora_gps', ''))
+        with self.sessions.session(key) as session:
+            session.remember_position(position_data.get('latitude', 0.0),
+                                      position_data.get('longitude', 0.0),
+                                      position_data.get('speed', 0.0),
+                                      gps_time)
+
     def get_address_from_coordinates(self, latitude: float, longitude: float) -> str:
         """
         Obtiene la dirección usando geocodificación inversa con OpenStreetMap Nominatim
@@ -345,6 +509,10 @@ class TQServerRPG:
             
             if not is_valid:
                 self.filtered_positions_count += 1
+                key = self._session_key(position_data)
+                if key:
+                    with self.sessions.session(key) as session:
+                        session.filtered += 1
                 # No loggear verbose - posición filtrada es normal
                 print(f"🚫 Posición filtrada: {reason}")
                 return
@@ -386,7 +554,7 @@ class TQServerRPG:
             self.logger.info(log_msg)
             
             # ACTUALIZAR ÚLTIMA POSICIÓN VÁLIDA para filtros futuros
-            self.last_valid_position = position_data.copy()
+            self.remember_valid_position(position_data)
             
         except Exception as e:
             self.logger.error(f"Error guardando posición en archivo: {e}")
@@ -415,17 +583,13 @@ class TQServerRPG:
             destinations = []
             rid = str(position_data.get('device_id', '') or '')
             fid = str(position_data.get('device_id_completo', '') or '')
-            dev5 = self._equipo_5_digitos(rid, fid)
-            rules = self._reenvios_rules_for(dev5)
-            has_servicio = any(r.tipo == "SERVICIO" for r in rules)
-
-            if rpg_message and not has_servicio:
-                destinations.append(("UDP", self.udp_host, self.udp_port, rpg_message))
-            for rule in rules:
-                if rule.protocolo_gps != "GEO5" or not rpg_message:
-                    continue
-                kind = "UDP" if rule.transporte == "UDP" else "TCP"
-                destinations.append((kind, rule.ip, rule.port, rpg_message))
+            plan = self._route_plan_for(self._equipo_5_digitos(rid, fid), fid)
+
+            if rpg_message:
+                if plan.general:
+                    destinations.append(("UDP", self.udp_host, self.udp_port, rpg_message))
+                for t in plan.geo5 + plan.geo5_id:
+                    destinations.append((t.transporte, t.ip, t.port, rpg_message))
             
             # Usar el logger optimizado
             self.rpg_logger.log_rpg_attempt(
@@ -490,18 +654,19 @@ class TQServerRPG:
         cs = protocolo.sacar_checksum(prefix_for_xor)
         return prefix_for_xor + cs + "<"
 
-    def _reenvios_rules_for(self, equipo_5: str) -> List[ForwardingRule]:
-        if not equipo_5:
-            return []
-        with self._reenvios_lock:
-            rules = self._reenvios_by_device.get(equipo_5, [])
-            return list(rules)
+    def _route_plan_for(self, equipo_5: str, full_device_id: str = "") -> RoutePlan:
+        """Plan compilado del equipo (sin lock: `_route_index` se reemplaza entero al recargar)."""
+        if not equipo_5 and not full_device_id:
+            return EMPTY_ROUTE_PLAN
+        return self._route_index.lookup(equipo_5, full_device_id)
 
     def reload_reenvios_config_if_changed(self, force: bool = False) -> bool:
         """
         Recarga `REENVIOS_CONFIG.txt` si cambió en disco (mtime) o si force=True.
+        Solo se recompilan los planes de los equipos cuyas filas cambiaron.
         Devuelve True si se recargó (y se reemplazaron reglas en memoria).
         """
+        t0 = time.perf_counter()
         try:
             mtime = os.path.getmtime(self.reenvios_config_path)
         except Exception:
@@ -525,50 +690,50 @@ class TQServerRPG:
             return False
 
         with self._reenvios_lock:
+            index = RouteIndex(by_device, previous=self._route_index)
             self._reenvios_by_device = by_device
+            self._route_index = index
             self._reenvios_last_mtime = mtime
+        elapsed_ms = (time.perf_counter() - t0) * 1000
 
         for w in warnings:
             self.logger.warning(w)
         self.logger.info(
             f"Reenvíos: reglas recargadas ({sum(len(v) for v in by_device.values())} reglas, "
-            f"{len(by_device)} equipos) desde {self.reenvios_config_path}"
+            f"{len(by_device)} equipos, {index.changed} con cambios) en {elapsed_ms:.1f} ms "
+            f"desde {self.reenvios_config_path}"
         )
         return True
 
-    def reenvios_reload_loop(self) -> None:
-        """Bucle que recarga reglas periódicamente."""
-        while not self.reenvios_reload_stop_event.is_set():
-            if self.running:
-                try:
-                    self.reload_reenvios_config_if_changed(force=False)
-                except Exception as e:
-                    self.logger.error(f"Reenvíos: error recargando configuración: {e}")
-            if self.reenvios_reload_stop_event.wait(self.reenvios_reload_interval_seconds):
-                break
-
     def start_reenvios_reload(self) -> None:
-        """Inicia el thread de recarga automática del archivo de reenvíos."""
+        """Inicia la recarga automática del archivo de reenvíos (inotify o polling)."""
         if self.reenvios_reload_interval_seconds <= 0:
             return
-        self.reenvios_reload_stop_event = threading.Event()
-        self.reenvios_reload_thread = threading.Thread(target=self.reenvios_reload_loop)
-        self.reenvios_reload_thread.daemon = True
-        self.reenvios_reload_thread.start()
-        self.logger.info(
-            f"Reenvíos: recarga automática cada {self.reenvios_reload_interval_seconds}s "
-            f"({self.reenvios_config_path})"
+
+        def on_error(e: Exception) -> None:
+            self.logger.error(f"Reenvíos: error recargando configuración: {e}")
+
+        self.reenvios_watcher = ConfigWatcher(
+            self.reenvios_config_path,
+            on_change=lambda: self.reload_reenvios_config_if_changed(force=True),
+            poll_interval=self.reenvios_reload_interval_seconds,
+            on_error=on_error,
         )
+        self.reenvios_watcher.start()
+        if self.reenvios_watcher.mode == "inotify":
+            detail = "inotify"
+        else:
+            detail = f"polling cada {self.reenvios_reload_interval_seconds}s"
+        self.logger.info(f"Reenvíos: recarga automática ({detail}) de {self.reenvios_config_path}")
 
     def stop_reenvios_reload(self) -> None:
-        """Detiene el thread de recarga automática del archivo de reenvíos."""
-        if self.reenvios_reload_stop_event:
-            self.reenvios_reload_stop_event.set()
-        if self.reenvios_reload_thread and self.reenvios_reload_thread.is_alive():
-            self.reenvios_reload_thread.join(timeout=2.0)
+        """Detiene la recarga automática del archivo de reenvíos."""
+        if self.reenvios_watcher is not None:
+            self.reenvios_watcher.stop()
+            self.reenvios_watcher = None
 
     def forward_tq_position_tcp_general(
-        self, data: bytes, rpg_device_id: str, full_device_id: str = ""
+        self, data: Union[Frame, bytes], rpg_device_id: str, full_device_id: str = ""
     ) -> None:
         """
         Reenvía solo mensajes de posición TQ (payload crudo) por TCP a
@@ -576,12 +741,11 @@ class TQServerRPG:
         """
         if not data or not self.tq_tcp_general_host or not self.tq_tcp_general_port:
             return
+        frame = Frame.of(data)
+        data = frame.raw
         dev5 = self._equipo_5_digitos(rpg_device_id, full_device_id)
         dev_log = dev5 or (rpg_device_id or full_device_id or "").strip() or "-"
-        try:
-            payload_hex = funciones.bytes2hexa(data)
-        except Exception:
-            payload_hex = ""
+        payload_hex = frame.hex
         try:
             funciones.guardarLogPacket(
                 "->",
@@ -590,20 +754,25 @@ class TQServerRPG:
                 self.tq_tcp_general_port,
                 payload_hex,
                 dev_log,
+                raw=data,
             )
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(2.0)
-                sock.connect((self.tq_tcp_general_host, self.tq_tcp_general_port))
-                sock.sendall(data)
-            append_reenvio_log(
-                dev_log,
-                "GENERAL",
+            self.forwarder.submit(
                 self.tq_tcp_general_host,
                 self.tq_tcp_general_port,
                 "TCP",
-                "TQ",
-                "GENERAL",
-                payload_hex,
+                data,
+                on_sent=partial(
+                    append_reenvio_log,
+                    dev_log,
+                    "GENERAL",
+                    self.tq_tcp_general_host,
+                    self.tq_tcp_general_port,
+                    "TCP",
+                    "TQ",
+                    "GENERAL",
+                    payload_hex,
+                ),
+                label="TQ TCP general",
             )
         except Exception as e:
             self.logger.error(
@@ -611,41 +780,37 @@ class TQServerRPG:
                 f"{self.tq_tcp_general_host}:{self.tq_tcp_general_port}: {e}"
             )
 
-    def apply_reenvios_tq_csv(self, data: bytes, rpg_device_id: str, full_device_id: str = "") -> None:
+    def apply_reenvios_tq_csv(self, data: Union[Frame, bytes], rpg_device_id: str, full_device_id: str = "") -> None:
         """Reglas CSV PROTOCOLO_GPS=TQ. Solo invocar con paquetes de posición TQ (no NMEA/login)."""
         dev5 = self._equipo_5_digitos(rpg_device_id, full_device_id)
         if not dev5:
             return
-        try:
-            payload_hex = funciones.bytes2hexa(data)
-        except Exception:
-            payload_hex = ""
-        for rule in self._reenvios_rules_for(dev5):
-            if rule.protocolo_gps != "TQ":
-                continue
+        targets = self._route_plan_for(dev5, full_device_id).tq
+        if not targets:
+            return
+        frame = Frame.of(data)
+        data = frame.raw
+        # Hex solo si hay al menos una regla TQ (y una sola vez por trama)
+        payload_hex = frame.hex
+        for t in targets:
+            log_args = (dev5, t.tipo, t.ip, t.port, t.transporte, "TQ", t.cliente, payload_hex)
             try:
-                if rule.transporte == "UDP":
-                    funciones.guardarLogPacket("->", "UDP", rule.ip, rule.port, payload_hex, dev5)
-                    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                        sock.sendto(data, (rule.ip, rule.port))
+                if t.transporte == "UDP":
+                    funciones.guardarLogPacket("->", "UDP", t.ip, t.port, payload_hex, dev5, raw=data)
+                    if self.udp_sender.send(t.ip, t.port, data):
+                        append_reenvio_log(*log_args)
+                    else:
+                        # Cola llena o circuito abierto: contado en /health
+                        self.logger.debug(f"Reenvío CSV TQ (UDP) a {t.ip}:{t.port} descartado")
                 else:
-                    funciones.guardarLogPacket("->", "TCP", rule.ip, rule.port, payload_hex, dev5)
-                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                        sock.settimeout(2.0)
-                        sock.connect((rule.ip, rule.port))
-                        sock.sendall(data)
-                append_reenvio_log(
-                    dev5,
-                    rule.tipo,
-                    rule.ip,
-                    rule.port,
-                    rule.transporte,
-                    rule.protocolo_gps,
-                    rule.cliente,
-                    payload_hex,
-                )
+                    funciones.guardarLogPacket("->", "TCP", t.ip, t.port, payload_hex, dev5, raw=data)
+                    self.forwarder.submit(
+                        t.ip, t.port, "TCP", data,
+                        on_sent=partial(append_reenvio_log, *log_args),
+                        label="CSV TQ (TCP)",
+                    )
             except Exception as e:
-                self.logger.error(f"Error reenvío CSV TQ ({rule.transporte}) a {rule.ip}:{rule.port}: {e}")
+                self.logger.error(f"Error reenvío CSV TQ ({t.transporte}) a {t.ip}:{t.port}: {e}")
 
     def send_geo5_rpg_udp(self, rpg_message: str, rpg_device_id: str, full_device_id: str = "") -> None:
         """
@@ -656,113 +821,155 @@ class TQServerRPG:
             return
         dev5 = self._equipo_5_digitos(rpg_device_id, full_device_id)
         dev_log = dev5 or (rpg_device_id or "").strip()
-        rules = self._reenvios_rules_for(dev5)
-        has_servicio = any(r.tipo == "SERVICIO" for r in rules)
+        plan = self._route_plan_for(dev5, full_device_id)
 
-        if not has_servicio:
+        if plan.general:
             try:
                 funciones.guardarLogPacket(
                     "->", "UDP", self.udp_host, self.udp_port, rpg_message, dev_log
                 )
-                funciones.enviar_mensaje_udp(self.udp_host, self.udp_port, rpg_message)
-                append_reenvio_log(
-                    dev_log,
-                    "GENERAL",
-                    self.udp_host,
-                    self.udp_port,
-                    "UDP",
-                    "GEO5",
-                    "GENERAL",
-                    rpg_message,
-                )
+                if self.udp_sender.send(self.udp_host, self.udp_port, rpg_message.encode("utf-8")):
+                    append_reenvio_log(
+                        dev_log,
+                        "GENERAL",
+                        self.udp_host,
+                        self.udp_port,
+                        "UDP",
+                        "GEO5",
+                        "GENERAL",
+                        rpg_message,
+                    )
+                else:
+                    # Cola llena o circuito abierto: contado en /health
+                    self.logger.debug(f"GEO5 UDP general a {self.udp_host}:{self.udp_port} descartado")
             except Exception as e:
                 self.logger.error(
                     f"Error enviando GEO5 UDP general a {self.udp_host}:{self.udp_port}: {e}"
                 )
 
-        for rule in rules:
-            if rule.protocolo_gps != "GEO5":
-                continue
-            payload_str = rpg_message
-            if rule.transporte == "UDP" and rule.formato_id is not None:
-                new_id = self._geo5_id_suffix_from_orig(
-                    full_device_id, rpg_device_id, rule.formato_id
-                )
-                if new_id:
+        if plan.geo5:
+            payload_b = rpg_message.encode("utf-8")
+            for t in plan.geo5:
+                self._send_geo5_target(t, dev_log, rpg_message, payload_b)
+
+        if not plan.geo5_id:
+            return
+        # Un mensaje por cada FORMATO_ID distinto (no por regla): el checksum se ajusta con
+        # el XOR del ID viejo/nuevo en lugar de recalcularse
+        new_ids = {
+            n: self._geo5_id_suffix_from_orig(full_device_id, rpg_device_id, n) for n in plan.id_lengths
+        }
+        id_variants: Dict[str, bytes] = {}
+        wanted_ids = set(new_ids.values())
+        wanted_ids.discard("")
+        if wanted_ids:
+            parsed = geo5_codec.Geo5Message.parse(rpg_message)
+            if parsed is not None:
+                id_variants = parsed.id_variants(wanted_ids)
+        by_len: Dict[int, Tuple[str, bytes]] = {}
+        for n, new_id in new_ids.items():
+            adjusted = None
+            payload_b = None
+            if new_id:
+                payload_b = id_variants.get(new_id)
+                if payload_b is not None:
+                    adjusted = payload_b.decode("ascii")
+                else:
                     adjusted = self._geo5_replace_id_and_recompute_checksum(rpg_message, new_id)
-                    if adjusted:
-                        payload_str = adjusted
-                    else:
-                        self.logger.warning(
-                            "Reenvíos UDP GEO5: no se pudo ajustar ID/checksum "
-                            f"(equipo {dev_log}, línea CSV {rule.line_no}); se envía mensaje sin cambiar ID."
-                        )
+            if adjusted:
+                by_len[n] = (adjusted, payload_b if payload_b is not None else adjusted.encode("utf-8"))
+
+        for t in plan.geo5_id:
+            variant = by_len.get(t.formato_id)
+            if variant is None:
+                if new_ids.get(t.formato_id):
+                    self.logger.warning(
+                        "Reenvíos UDP GEO5: no se pudo ajustar ID/checksum "
+                        f"(equipo {dev_log}, línea CSV {t.line_no}); se envía mensaje sin cambiar ID."
+                    )
                 else:
                     self.logger.warning(
                         "Reenvíos UDP GEO5: FORMATO_ID definido pero ID de origen vacío "
-                        f"(equipo {dev_log}, línea {rule.line_no}); se envía mensaje sin cambiar ID."
+                        f"(equipo {dev_log}, línea {t.line_no}); se envía mensaje sin cambiar ID."
                     )
-            payload_b = payload_str.encode("utf-8")
-            try:
-                if rule.transporte == "UDP":
-                    funciones.guardarLogPacket("->", "UDP", rule.ip, rule.port, payload_str, dev_log)
-                    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                        sock.sendto(payload_b, (rule.ip, rule.port))
+                variant = (rpg_message, rpg_message.encode("utf-8"))
+            self._send_geo5_target(t, dev_log, variant[0], variant[1])
+
+    def _send_geo5_target(self, t: RouteTarget, dev_log: str, payload_str: str, payload_b: bytes) -> None:
+        """Envía el GEO5 (ya ajustado) a un destino del plan del equipo."""
+        log_args = (dev_log, t.tipo, t.ip, t.port, t.transporte, "GEO5", t.cliente, payload_str)
+        try:
+            if t.transporte == "UDP":
+                funciones.guardarLogPacket("->", "UDP", t.ip, t.port, payload_str, dev_log)
+                if self.udp_sender.send(t.ip, t.port, payload_b):
+                    append_reenvio_log(*log_args)
                 else:
-                    funciones.guardarLogPacket("->", "TCP", rule.ip, rule.port, rpg_message, dev_log)
-                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                        sock.settimeout(2.0)
-                        sock.connect((rule.ip, rule.port))
-                        sock.sendall(payload_b)
-                append_reenvio_log(
-                    dev_log,
-                    rule.tipo,
-                    rule.ip,
-                    rule.port,
-                    rule.transporte,
-                    rule.protocolo_gps,
-                    rule.cliente,
-                    payload_str,
+                    # Cola llena o circuito abierto: contado en /health
+                    self.logger.debug(f"Reenvío CSV GEO5 (UDP) a {t.ip}:{t.port} descartado")
+            else:
+                funciones.guardarLogPacket("->", "TCP", t.ip, t.port, payload_str, dev_log)
+                self.forwarder.submit(
+                    t.ip, t.port, "TCP", payload_b,
+                    on_sent=partial(append_reenvio_log, *log_args),
+                    label="CSV GEO5 (TCP)",
                 )
-            except Exception as e:
-                self.logger.error(f"Error reenvío CSV GEO5 ({rule.transporte}) a {rule.ip}:{rule.port}: {e}")
+        except Exception as e:
+            self.logger.error(f"Error reenvío CSV GEO5 ({t.transporte}) a {t.ip}:{t.port}: {e}")
 
-    def process_message_with_rpg(self, data: bytes, client_id: str):
+    def reply_to_client(self, client_id: str, payload: bytes) -> None:
+        """Envía una respuesta corta (ACK) al equipo por su conexión TCP."""
+        if not payload:
+            return
+        sock = self.clients.get(client_id)
+        if sock is None:
+            return
+        try:
+            sock.send(payload)
+        except OSError as e:
+            # Incluye BlockingIOError en modo selectors: el ACK se descarta
+            self.logger.debug(f"No se pudo enviar respuesta a {client_id}: {e}")
+
+    def process_frames_with_rpg(self, frames: List[bytes], client_id: str):
+        """Procesa en lote las tramas completas obtenidas de una lectura del socket"""
+        for frame in frames:
+            self.process_message_with_rpg(Frame(frame), client_id)
+
+    def process_message_with_rpg(self, data: Union[Frame, bytes], client_id: str):
         """Procesa un mensaje recibido del cliente"""
         self.message_count += 1
+        # Vistas hex/ascii/ID cacheadas: cada etapa del pipeline reutiliza las mismas
+        frame = Frame.of(data)
+        data = frame.raw
 
         # Log del mensaje raw (formato compacto)
-        hex_data = funciones.bytes2hexa(data)
+        hex_data = frame.hex
         # No loggear verbose - solo guardar en log compacto
         print(f"📨 Msg #{self.message_count} de {client_id}")
         print(f"   Raw: {hex_data}")
 
-        # Reenvío TCP de datos crudos (si está habilitado) con exclusión por equipo
-        # Mantiene el payload idéntico; solo se saltea el transporte TCP para IDs excluidos.
-        full_id = ""
-        rpg_id = ""
-        if len(hex_data) >= 12:
-            candidate = hex_data[2:12]  # En TQ: 10 dígitos de ID completo
-            if candidate.isdigit() and len(candidate) == 10:
-                full_id = candidate
-                rpg_id = candidate[-5:]
+        # En TQ: 10 dígitos de ID completo (vacío si no es un ID válido)
+        full_id = frame.full_id
+        rpg_id = frame.rpg_id
+
+        # Sesión del equipo (por ID completo) y TerminalID conocido de esta conexión
+        if full_id:
+            kind = "TQ" if data[:1] == b"$" else frame.protocol
+            self.sessions.touch(full_id, client_id, kind)
+        terminal_id = self.client_terminal_ids.get(client_id, "")
 
         # Log paquete entrante (TCP) con metadatos si hay ID
         try:
             ip_in, port_in = client_id.split(":")
         except Exception:
             ip_in, port_in = client_id, ""
-        funciones.guardarLogPacket("<-", "TCP", ip_in, port_in, hex_data, rpg_id or full_id)
+        funciones.guardarLogPacket("<-", "TCP", ip_in, port_in, hex_data, rpg_id or full_id, raw=data)
         
         try:
             # ===================== F I L T R O   N M E A 0 1 8 3 ======================
             # Detecta mensajes que comienzan con '*' y terminan con '#'
-            try:
-                text_data = data.decode("ascii", errors="ignore").strip()
-            except Exception:
-                text_data = ""
+            text_data = frame.text
             
-            if text_data.startswith("*") and text_data.endswith("#"):
+            if frame.is_text:
                 # Evitar duplicados ruidosos: si es HQ (ya se loguea el hex crudo), no volver a loguear el texto.
                 if not text_data.startswith("*HQ,"):
                     try:
@@ -781,8 +988,11 @@ class TQServerRPG:
             # Ya se guardó el paquete entrante con guardarLogPacket()
             
             # Detectar el tipo de protocolo
-            protocol_type = protocolo.getPROTOCOL(hex_data)
+            protocol_type = frame.protocol
             # No loggear verbose - información no esencial
+
+            if self.gt06_ack and protocol_type == "13" and data[:2] == b"\x78\x78":
+                self.reply_to_client(client_id, protocolo.respuesta_gt06(data))
         
             if protocol_type == "22":
                 # Protocolo de posición - convertir a RPG y reenviar
@@ -790,24 +1000,25 @@ class TQServerRPG:
                 # IMPORTANTE: Extraer y guardar el ID del mensaje de posición
                 position_id = protocolo.getIDok(hex_data)
                 if position_id:
-                    self.terminal_id = position_id  # ACTUALIZAR el TerminalID
+                    terminal_id = position_id  # TerminalID de ESTE mensaje
+                    self.client_terminal_ids[client_id] = position_id
                     # No loggear verbose - solo print para consola
                     print(f"🆔 TerminalID actualizado: {position_id}")
 
                 # Reenvío TQ posición (crudo): general TCP + reglas CSV TQ
                 pid = position_id or rpg_id
                 fid = full_id or (hex_data[2:12] if len(hex_data) >= 12 else "")
-                self.apply_reenvios_tq_csv(data, pid, fid)
-                self.forward_tq_position_tcp_general(data, pid, fid)
+                self.apply_reenvios_tq_csv(frame, pid, fid)
+                self.forward_tq_position_tcp_general(frame, pid, fid)
             
-                if len(self.terminal_id) > 0:
+                if len(terminal_id) > 0:
                     # Convertir a RPG usando la función existente
-                    rpg_message = protocolo.RGPdesdeCHINO(hex_data, self.terminal_id)
+                    rpg_message = protocolo.RGPdesdeCHINO(hex_data, terminal_id)
                     # No loggear verbose
                     
                     # Reenviar por UDP (primario primero; secundario solo IDs configurados)
                     full_id = hex_data[2:12] if len(hex_data) >= 12 else ''
-                    self.send_geo5_rpg_udp(rpg_message, self.terminal_id, full_id)
+                    self.send_geo5_rpg_udp(rpg_message, terminal_id, full_id)
                     
                     # Log del mensaje RPG (ya no se usa log_rpg_message, usar funciones.guardarLogUDP)
                     print(f"🔄 Mensaje RPG enviado por UDP: {rpg_message}")
@@ -820,39 +1031,42 @@ class TQServerRPG:
                     print("⚠️ TerminalID no disponible para conversión RPG")
                 
             elif protocol_type == "01":
-                # Protocolo de registro - obtener TerminalID
-                full_terminal_id = protocolo.getIDok(hex_data)
-                self.terminal_id = full_terminal_id
+                # Protocolo de registro - obtener TerminalID de esta conexión
+                terminal_id = protocolo.getIDok(hex_data)
+                self.client_terminal_ids[client_id] = terminal_id
                 
                 # Log compacto usando funciones.guardarLog
-                funciones.guardarLog(f"TerminalID={self.terminal_id}")
-                print(f"🆔 TerminalID configurado: {self.terminal_id}")
+                funciones.guardarLog(f"TerminalID={terminal_id}")
+                print(f"🆔 TerminalID configurado: {terminal_id}")
                 
-                # Enviar respuesta
-                response = protocolo.Enviar0100(self.terminal_id)
+                # Respuesta al login con el terminal/serie de esta trama
+                response = protocolo.Enviar0100(terminal_id, data)
+                if self.gt06_ack and data[:2] == b"\x78\x78":
+                    self.reply_to_client(client_id, response)
             
             else:
                 # Otro tipo de protocolo - intentar decodificar como TQ
                 # No loggear verbose
-                position_data = self.decode_position_message(data)
+                position_data = self.decode_position_message(frame)
             
                 if position_data:
                     # No loggear verbose - solo mostrar en consola si es necesario
                     # self.display_position(position_data, client_id)  # Comentado para reducir verbosidad
                     
                     # IMPORTANTE: Si no tenemos TerminalID, extraerlo del mensaje de posición
-                    if len(self.terminal_id) == 0:
+                    if len(terminal_id) == 0:
                         position_id = protocolo.getIDok(hex_data)
                         if position_id:
-                            self.terminal_id = position_id
+                            terminal_id = position_id
+                            self.client_terminal_ids[client_id] = position_id
                             # No loggear verbose - solo print
                             print(f"🆔 TerminalID actualizado: {position_id}")
 
                     # Reenvío TQ posición (crudo): general TCP + reglas CSV TQ — formato $24 / otros
                     rid = str(position_data.get("device_id", "") or rpg_id)
                     fid = str(position_data.get("device_id_completo", "") or full_id)
-                    self.apply_reenvios_tq_csv(data, rid, fid)
-                    self.forward_tq_position_tcp_general(data, rid, fid)
+                    self.apply_reenvios_tq_csv(frame, rid, fid)
+                    self.forward_tq_position_tcp_general(frame, rid, fid)
                     
                     # Guardar posición en archivo CSV (si existe la función, sino ignorar)
                     try:
@@ -861,7 +1075,7 @@ class TQServerRPG:
                         pass  # positions_file no existe, ignorar
                     
                     # Si tenemos TerminalID, convertir a RPG
-                    if len(self.terminal_id) > 0:
+                    if len(terminal_id) > 0:
                         try:
                             # CORREGIDO: Usar las coordenadas ya decodificadas en lugar de las funciones de protocolo
                             # Crear mensaje RPG con formato correcto usando los datos GPS decodificados
@@ -880,10 +1094,10 @@ class TQServerRPG:
                             pass  # No loggear warnings verbosos
                             # Fallback: intentar con protocolo personal
                             try:
-                                rpg_message = protocolo.RGPdesdePERSONAL(hex_data, self.terminal_id)
+                                rpg_message = protocolo.RGPdesdePERSONAL(hex_data, terminal_id)
                                 if rpg_message:
                                     full_id_fb = hex_data[2:12] if len(hex_data) >= 12 else ''
-                                    self.send_geo5_rpg_udp(rpg_message, self.terminal_id, full_id_fb)
+                                    self.send_geo5_rpg_udp(rpg_message, terminal_id, full_id_fb)
                                     # El reenvío UDP ya se loguea por destino en send_geo5_rpg_udp()
                                     print(f"🔄 Mensaje RPG personal enviado por UDP: {rpg_message}")
                             except:
@@ -974,29 +1188,29 @@ class TQServerRPG:
         except:
             return 0.0
 
-    def decode_position_message(self, data: bytes) -> Dict:
+    def decode_position_message(self, data: Union[Frame, bytes]) -> Dict:
         """Decodifica un mensaje de posición del protocolo TQ"""
         try:
-            import binascii
-            
+            frame = Frame.of(data)
+            data = frame.raw
+
+            # Trama binaria $24: decodificación directa de los campos BCD (ver tq_decoder)
+            if data[:1] == b'$':
+                record = decode_tq_position(data)
+                if record is not None:
+                    return record.as_dict()
+
             # Convertir a hexadecimal
-            hex_str = binascii.hexlify(data).decode('ascii')
+            hex_str = frame.hex
             
-            # CORREGIDO: Detectar si es mensaje NMEA codificado en hexadecimal
+            # CORREGIDO: Detectar si es mensaje NMEA
+            ascii_message = ""
             try:
-                # Intentar decodificar como mensaje NMEA
                 ascii_message = data.decode('ascii', errors='ignore')
                 if ascii_message.startswith('*') and ascii_message.endswith('#'):
                     # Es un mensaje NMEA directo
                     # No loggear verbose - ya se guardó con guardarLogNMEA
                     return self.decode_nmea_message(ascii_message)
-                else:
-                    # Intentar decodificar hex a ASCII
-                    ascii_from_hex = bytes.fromhex(hex_str).decode('ascii', errors='ignore')
-                    if ascii_from_hex.startswith('*') and ascii_from_hex.endswith('#'):
-                        # Es un mensaje NMEA codificado en hexadecimal
-                        # No loggear verbose - ya se guardó con guardarLogNMEA
-                        return self.decode_nmea_message(ascii_from_hex)
             except:
                 pass
             
@@ -1017,8 +1231,7 @@ class TQServerRPG:
             # Formato: [ID][timestamp][lat][lon][otros_datos]
             
             try:
-                # Intentar decodificar como mensaje NMEA primero
-                ascii_message = data.decode('ascii', errors='ignore')
+                # Intentar decodificar como mensaje NMEA primero (ascii ya calculado arriba)
                 if ascii_message.startswith('*') and ascii_message.endswith('#'):
                     # Es un mensaje NMEA, extraer coordenadas correctamente
                     parts = ascii_message[1:-1].split(',')  # Remover * y #
@@ -1177,68 +1390,32 @@ class TQServerRPG:
             'reenvios_equipos_configurados': sorted(self._reenvios_by_device.keys()),
             'reenvios_total_reglas': sum(len(v) for v in self._reenvios_by_device.values()),
             'terminal_id': self.terminal_id,
+            'device_sessions': len(self.sessions),
             'connected_clients': len(self.clients),
             'total_messages': self.message_count,
             'filtered_positions': self.filtered_positions_count,
             'geocoding_enabled': geocoding_stats['enabled'],
             'geocoding_cache_size': geocoding_stats['cache_size'],
             'clients': list(self.clients.keys()),
-            'uptime_seconds': uptime_seconds
+            'uptime_seconds': uptime_seconds,
+            # Estado de reenvíos por destino: circuito, RTT de conexión, colas y spool
+            'forwarding': {
+                'tcp': self.tcp_pool.stats(),
+                'udp': self.udp_sender.stats(),
+                'queues': self.forwarder.stats(),
+            },
+            'packet_capture': self.packet_capture.stats() if self.packet_capture is not None else None,
+            'log_archive': self.log_archiver.stats() if self.log_archiver is not None else None,
         }
     
     def create_health_handler(self):
         """Crea el handler para el servidor HTTP de health check"""
-        server_instance = self
-        
-        class HealthCheckHandler(BaseHTTPRequestHandler):
-            def log_message(self, format, *args):
-                """Silenciar logs HTTP para no contaminar el log principal"""
-                pass
-            
-            def do_GET(self):
-                """Maneja peticiones GET al endpoint /health"""
-                if self.path == '/health':
-                    try:
-                        # Obtener estado del servidor
-                        status_data = server_instance.get_status()
-                        
-                        # Preparar respuesta JSON
-                        response = {
-                            'status': 'ok' if server_instance.running else 'stopped',
-                            'timestamp': datetime.now().isoformat(),
-                            'uptime_seconds': status_data['uptime_seconds'],
-                            'clients': status_data['connected_clients'],
-                            'messages': status_data['total_messages'],
-                            'terminal_id': status_data['terminal_id']
-                        }
-                        
-                        # Enviar respuesta
-                        self.send_response(200)
-                        self.send_header('Content-Type', 'application/json')
-                        self.end_headers()
-                        self.wfile.write(json.dumps(response).encode('utf-8'))
-                        
-                    except Exception as e:
-                        # Error interno
-                        self.send_response(500)
-                        self.send_header('Content-Type', 'application/json')
-                        self.end_headers()
-                        error_response = {
-                            'status': 'error',
-                            'message': str(e)
-                        }
-                        self.wfile.write(json.dumps(error_response).encode('utf-8'))
-                else:
-                    # Endpoint no encontrado
-                    self.send_response(404)
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({'status': 'not_found'}).encode('utf-8'))
-        
-        return HealthCheckHandler
+        return build_health_handler(self)
     
     def start_health_server(self):
         """Inicia el servidor HTTP de health check en un thread separado"""
+        if not self.health_port:
+            return
         try:
             handler_class = self.create_health_handler()
             self.health_server = HTTPServer(('0.0.0.0', self.health_port), handler_class)
@@ -1331,6 +1508,7 @@ class TQServerRPG:
     def cleanup_inactive_connections(self):
         """Limpia conexiones inactivas periódicamente"""
         INACTIVE_TIMEOUT_SECONDS = 600  # 10 minutos sin actividad
+        SESSION_IDLE_SECONDS = 86400  # Sesiones de equipos sin mensajes en 24 hs
         
         while not self.cleanup_stop_event.is_set():
             try:
@@ -1372,6 +1550,9 @@ class TQServerRPG:
                     except Exception as e:
                         self.logger.error(f"Error cerrando conexión inactiva {client_id}: {e}")
                 
+                # Descartar sesiones de equipos que dejaron de reportar
+                self.sessions.remove_idle(SESSION_IDLE_SECONDS)
+                
                 # Esperar 60 segundos antes de la próxima verificación
                 if self.cleanup_stop_event.wait(60):
                     break
@@ -1417,6 +1598,8 @@ class TQServerRPG:
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.reuse_port:
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             self.server_socket.settimeout(5.0)  # Timeout para aceptar conexiones
             self.server_socket.bind((self.host, self.port))
             self.server_socket.listen(5)
@@ -1429,13 +1612,19 @@ class TQServerRPG:
 
             # Iniciar recarga automática de reglas de reenvío
             self.start_reenvios_reload()
-            
-            # Limpiar logs antiguos (mantener solo últimos 30 días)
-            print("🧹 Limpiando logs antiguos...")
-            cleanup_stats = funciones.cleanup_old_logs(days_to_keep=30)
-            if cleanup_stats.get('deleted_count', 0) > 0:
-                self.logger.info(f"Logs limpiados: {cleanup_stats['deleted_count']} archivos, "
-                               f"{cleanup_stats['size_freed_mb']} MB liberados")
+
+            # Reanudar reenvíos pendientes en el spool de disco (de una ejecución anterior)
+            if self.forwarder.resume_spooled():
+                print(f"📦 Reenvíos pendientes en spool: se reanudan ({self.spool_dir})")
+            
+            # Comprimir los logs de días anteriores y borrar los viejos (en background); con
+            # --log-archive-days=0 solo se borran los de más de 30 días
+            if self.log_cleanup:
+                self.log_archiver = LogArchiver.for_days(
+                    ("logs", "logsUDP"), self.log_archive_days, logger=self.logger
+                )
+                self.log_archiver.start()
+                print(f"🗜️  Archivo de logs: {self.log_archiver.describe()}")
             
             # Iniciar servidor de health check
             self.start_health_server()
@@ -1460,6 +1649,13 @@ class TQServerRPG:
                 f"{len(self._reenvios_by_device)} equipos)"
             )
             print("📡 Esperando conexiones de equipos...")
+
+            if self.ingest_mode == 'selectors':
+                self.logger.info(f"Ingesta TCP por event loop (selectors, {self.ingest_loops} loop/s)")
+                SelectorIngest(self, loops=self.ingest_loops).run()
+                if self.running and not self.is_port_listening():
+                    self.notify_port_closed("socket de escucha cerrado")
+                return
             
             while self.running:
                 try:
@@ -1478,7 +1674,10 @@ class TQServerRPG:
                     )
                     client_thread.daemon = True
                     client_thread.start()
-                    
+
+                except socket.timeout:
+                    # Sin conexiones nuevas en el intervalo: no es un error
+                    continue
                 except socket.error as e:
                     if self.running:
                         self.logger.error(f"Error aceptando conexión o puerto cerrado: {e}")
@@ -1493,15 +1692,7 @@ class TQServerRPG:
                             
                             if socket_closed:
                                 # El socket está cerrado
-                                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                                message = (
-                                    f"🚨 *Puerto {self.port} Cerrado*\n"
-                                    f"⏰ Hora: {timestamp}\n"
-                                    f"🔌 El puerto de escucha {self.port} se ha cerrado inesperadamente\n"
-                                    f"❌ Error: {str(e)}"
-                                )
-                                funciones.send_telegram_notification(message)
-                                self.logger.error(f"Puerto {self.port} cerrado - notificación enviada")
+                                self.notify_port_closed(str(e))
                                 break  # Salir del bucle si el puerto está cerrado
                         except Exception as check_error:
                             self.logger.error(f"Error verificando estado del puerto: {check_error}")
@@ -1529,6 +1720,18 @@ class TQServerRPG:
             )
             funciones.send_telegram_notification(message)
             
+    def notify_port_closed(self, error: str) -> None:
+        """Notifica por Telegram que el puerto de escucha se cerró inesperadamente"""
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        message = (
+            f"🚨 *Puerto {self.port} Cerrado*\n"
+            f"⏰ Hora: {timestamp}\n"
+            f"🔌 El puerto de escucha {self.port} se ha cerrado inesperadamente\n"
+            f"❌ Error: {error}"
+        )
+        funciones.send_telegram_notification(message)
+        self.logger.error(f"Puerto {self.port} cerrado - notificación enviada")
+
     def stop(self):
         """Detiene el servidor"""
         was_running = self.running
@@ -1545,6 +1748,14 @@ class TQServerRPG:
         
         # Detener limpieza de conexiones
         self.stop_connection_cleanup()
+
+        if self.log_archiver is not None:
+            self.log_archiver.stop()
+
+        # Vaciar las colas de reenvío y cerrar las conexiones salientes
+        self.forwarder.close(timeout=2.0)
+        self.tcp_pool.close_all()
+        self.udp_sender.flush(timeout=1.0)
         
         if self.server_socket:
             try:
@@ -1553,10 +1764,14 @@ class TQServerRPG:
                 self.logger.error(f"Error cerrando socket: {e}")
         
         self.logger.info("Servidor detenido")
+        # Bajar a disco las líneas de log pendientes
+        log_writer.get_writer().flush()
+        if self.packet_capture is not None:
+            self.packet_capture.flush()
         print("🛑 Servidor detenido")
         
         # Enviar notificación por Telegram si el servidor estaba corriendo
-        if was_running:
+        if was_running and self.notify_on_stop:
             try:
                 timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 message = (
@@ -1579,20 +1794,24 @@ class TQServerRPG:
         
         self.logger.info(f"Nueva conexión desde {client_id}")
         print(f"🔗 Nueva conexión desde {client_id}")
+        # Buffer de reensamblado: un recv puede traer varias tramas o una parcial
+        reassembler = TQStreamReassembler()
         
         try:
             while self.running:
                 try:
                     # Recibir datos del cliente
-                    data = client_socket.recv(1024)
+                    data = client_socket.recv(4096)
                     if not data:
                         break
                     
                     # Actualizar última actividad
                     self.client_last_activity[client_id] = datetime.now()
                     
-                    # Procesar el mensaje recibido con conversión RPG y reenvío UDP
-                    self.process_message_with_rpg(data, client_id)
+                    # Procesar las tramas completas con conversión RPG y reenvío UDP
+                    frames = reassembler.feed(data)
+                    if frames:
+                        self.process_frames_with_rpg(frames, client_id)
                     
                 except socket.timeout:
                     # Timeout de inactividad - cerrar conexión
@@ -1608,17 +1827,25 @@ class TQServerRPG:
             print(f"❌ Error con cliente {client_id}: {e}")
             
         finally:
-            # Limpiar conexión
-            try:
-                client_socket.close()
-            except:
-                pass
-            if client_id in self.clients:
-                del self.clients[client_id]
-            if client_id in self.client_last_activity:
-                del self.client_last_activity[client_id]
-            self.logger.info(f"Conexión cerrada: {client_id}")
-            print(f"🔌 Conexión cerrada: {client_id}")
+            if len(reassembler):
+                self.logger.debug(
+                    f"Conexión {client_id}: se descartan {len(reassembler)} bytes de trama incompleta"
+                )
+            self.release_client(client_id, client_socket)
+
+    def release_client(self, client_id: str, client_socket: socket.socket) -> None:
+        """Cierra el socket del cliente y lo quita de las tablas de conexiones"""
+        try:
+            client_socket.close()
+        except:
+            pass
+        if client_id in self.clients:
+            del self.clients[client_id]
+        if client_id in self.client_last_activity:
+            del self.client_last_activity[client_id]
+        self.client_terminal_ids.pop(client_id, None)
+        self.logger.info(f"Conexión cerrada: {client_id}")
+        print(f"🔌 Conexión cerrada: {client_id}")
 
     def show_terminal_info(self):
         """Muestra información detallada del TerminalID"""
@@ -1727,21 +1954,8 @@ class TQServerRPG:
             # Formato RPG correcto según el manual: >RGP[timestamp][lat][lon][heading][speed][status]&[seq];ID=[id];#[seq]*[checksum]<
             # Ejemplo: >RGP210825145011-3416.9932-05855.05980000003000001;&01;ID=38312;#0001*62<
             
-            # Convertir coordenadas al formato RPG/GEO5 (signo explícito c/e: + Norte/Este, - Sur/Oeste)
-            lat_abs = abs(latitude)
-            lat_deg = int(lat_abs)
-            lat_min = (lat_abs - lat_deg) * 60.0
-            lat_str = ("-" if latitude < 0 else "+") + f"{lat_deg:02d}{lat_min:07.4f}"
-
-            lon_abs = abs(longitude)
-            lon_deg = int(lon_abs)
-            lon_min = (lon_abs - lon_deg) * 60.0
-            lon_str = ("-" if longitude < 0 else "+") + f"{lon_deg:03d}{lon_min:07.4f}"
-            
-            # CORREGIDO: Formatear rumbo (3 dígitos) y velocidad (3 dígitos)
-            # Usar los valores extraídos directamente sin conversiones adicionales
-            heading_str = f"{int(heading):03d}"
-            speed_str = f"{int(speed):03d}"
+            # Coordenadas en formato RPG/GEO5 (signo explícito c/e: + Norte/Este, - Sur/Oeste),
+            # velocidad y rumbo en 3 dígitos: los formatea geo5_codec
             
             # Estado (1=Activo, 0=Inactivo)
             status = "1" if abs(latitude) > 0.000001 and abs(longitude) > 0.000001 else "0"
@@ -1762,31 +1976,16 @@ class TQServerRPG:
                 # Si no hay hex_data, usar valor por defecto
                 evento = "01"
             
-            # Secuencial (siempre 01 para este caso)
-            seq = "01"
-            
-            # Construir mensaje RPG principal
-            rpg_main = f"RGP{timestamp}{lat_str}{lon_str}{speed_str}{heading_str}{status}"
-            
-            # Construir mensaje completo con formato correcto
-            # CORREGIDO: Usar el evento extraído del flag de ignición
-            # Agregar "000001" antes del ";&[evento]" según protocolo GEO5
-            rpg_message = f">{rpg_main}000001;&{evento};ID={terminal_id};#0001"
-            
-            # Agregar asterisco para el cálculo del checksum
-            rpg_message_with_asterisk = rpg_message + "*"
-            
-            # Calcular checksum usando la función correcta del protocolo
-            # CORREGIDO: Pasar el mensaje con asterisco para que sacar_checksum() incluya el '*' en el XOR
-            checksum = self.calculate_rpg_checksum(rpg_message_with_asterisk)
-            
-            # Agregar checksum y cerrar mensaje
-            rpg_message += f"*{checksum}<"
+            # Construir mensaje completo: >RGP...[status]000001;&[evento];ID=[id];#0001*[checksum]<
+            # El checksum (XOR desde '>' hasta '*') se acumula por segmentos en el encoder
+            rpg_message = geo5_codec.encode_position(
+                timestamp, latitude, longitude, speed, heading, status, evento, terminal_id
+            ).decode('ascii')
             
             # No loggear verbose - mensaje ya se guardará con guardarLogUDP
             
             # ACTUALIZAR ÚLTIMA POSICIÓN VÁLIDA para filtros futuros
-            self.last_valid_position = position_data.copy()
+            self.remember_valid_position(position_data)
             
             return rpg_message
             
@@ -1833,16 +2032,82 @@ def main():
     print("🚀 SERVIDOR TCP PROTOCOLO TQ + RPG")
     print("=" * 60)
     
-    # Crear y configurar servidor
-    server = TQServerRPG(host='0.0.0.0', port=5003, 
+    args = sys.argv[1:]
+
+    # Modo de ingesta: --event-loop (selectors) o threads (default, para comparar)
+    # --event-loop-threads=N reparte las conexiones en N loops
+    ingest_mode = 'selectors' if '--event-loop' in args else 'threads'
+    ingest_loops = 1
+    # --workers=N: N procesos con SO_REUSEPORT en el puerto 5003 (ver tq_workers.py)
+    workers = 1
+    # --capture-dir=PATH: captura binaria de paquetes (default: variable LOG_PACKET_CAPTURE_DIR)
+    # Sin LOG_PACKET_CAPTURE_TEXT=1 las líneas de paquetes dejan de escribirse en LOG_*.txt, de
+    # las que dependen el índice por equipo (log_index.py) y /search de la administración
+    capture_dir = os.getenv('LOG_PACKET_CAPTURE_DIR', '').strip() or None
+    # --capture-keep-days=N: días que se conservan los segmentos de captura (0 = no borrar)
+    capture_keep_days = 7.0
+    # --log-archive-days=N: días que se conservan los logs comprimidos (0 = no archivar: los
+    # logs sin comprimir se borran a los 30 días)
+    log_archive_days = 365
+    for arg in args:
+        if arg.startswith('--event-loop-threads='):
+            try:
+                ingest_loops = int(arg.split('=', 1)[1])
+            except ValueError:
+                print(f"⚠️  Valor inválido en {arg}; se usa 1 loop")
+        elif arg.startswith('--workers='):
+            try:
+                workers = int(arg.split('=', 1)[1])
+            except ValueError:
+                print(f"⚠️  Valor inválido en {arg}; se usa 1 proceso")
+        elif arg.startswith('--capture-dir='):
+            capture_dir = arg.split('=', 1)[1].strip() or None
+        elif arg.startswith('--capture-keep-days='):
+            try:
+                capture_keep_days = float(arg.split('=', 1)[1])
+            except ValueError:
+                print(f"⚠️  Valor inválido en {arg}; se conservan 7 días de captura")
+        elif arg.startswith('--log-archive-days='):
+            try:
+                log_archive_days = int(arg.split('=', 1)[1])
+            except ValueError:
+                print(f"⚠️  Valor inválido en {arg}; se conservan 365 días")
+    
+    server_kwargs = dict(host='0.0.0.0', port=5003,
                          udp_host='179.43.115.190', udp_port=7007,
                          heartbeat_enabled=True,  # Heartbeat habilitado
                          heartbeat_udp_host='127.0.0.1',  # IP del monitor (127.0.0.1 = mismo servidor, o IP remota)
                          heartbeat_udp_port=9001,  # Puerto UDP del monitor (debe coincidir con ControlTQ/config.py)
-                         heartbeat_interval_seconds=300)  # 5 minutos
+                         heartbeat_interval_seconds=300,  # 5 minutos
+                         ingest_mode=ingest_mode,
+                         ingest_loops=ingest_loops,
+                         # --gt06-ack: responder login/heartbeat de equipos GT06 (7878)
+                         gt06_ack='--gt06-ack' in args,
+                         capture_dir=capture_dir,
+                         capture_keep_days=capture_keep_days,
+                         log_archive_days=log_archive_days)
+    print(f"📥 Modo de ingesta: {ingest_mode}")
+    if capture_dir:
+        print(f"🎞️  Captura binaria de paquetes en {capture_dir} (ver: python packet_capture.py {capture_dir})")
+        if os.getenv('LOG_PACKET_CAPTURE_TEXT', '').strip() not in ('1', 'true', 'TRUE', 'yes', 'YES'):
+            print("⚠️  Las líneas de paquetes ya no van a LOG_*.txt: el índice por equipo y /search "
+                  "no las verán (LOG_PACKET_CAPTURE_TEXT=1 las mantiene)")
+    
+    if workers > 1:
+        from tq_workers import WorkerSupervisor, reuse_port_supported
+        if not reuse_port_supported():
+            print("❌ SO_REUSEPORT no disponible en esta plataforma; use un solo proceso")
+            return
+        # Modo supervisor: no interactivo, los workers atienden el puerto TCP
+        WorkerSupervisor(workers, server_kwargs, health_port=5004).run()
+        print("👋 Supervisor cerrado correctamente")
+        return
+    
+    # Crear y configurar servidor
+    server = TQServerRPG(**server_kwargs)
     
     # Verificar si se ejecuta en modo no interactivo (background)
-    if len(sys.argv) > 1 and sys.argv[1] == '--daemon':
+    if '--daemon' in args:
         print("🔄 Modo daemon activado - ejecutando en segundo plano")
         print("📡 Para detener el servidor: pkill -f tq_server_rpg.py")
         
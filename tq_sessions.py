@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Tabla de sesiones por equipo para el servidor TQ.
+
+Reemplaza los campos globales `terminal_id` / `last_valid_position` de `TQServerRPG`:
+cada equipo (clave = ID completo de 10 dígitos) tiene su propio registro con la última
+posición válida, la hora GPS ya parseada, el tipo de protocolo y contadores.
+
+La tabla está particionada en franjas (lock striping): equipos distintos caen, en
+general, en franjas distintas y pueden procesarse en paralelo sin contención.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_STRIPES = 32
+
+
+class DeviceSession:
+    """Estado de un equipo. Se modifica solo con el lock de su franja tomado."""
+
+    __slots__ = (
+        "device_id",
+        "rpg_id",
+        "protocol",
+        "client_id",
+        "last_lat",
+        "last_lon",
+        "last_speed",
+        "last_gps_time",
+        "has_position",
+        "messages",
+        "positions",
+        "filtered",
+        "last_seen",
+    )
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        # ID usado en GEO5 (últimos 5 dígitos)
+        self.rpg_id = device_id[-5:] if len(device_id) >= 5 else device_id.zfill(5)
+        self.protocol = ""
+        self.client_id = ""
+        self.last_lat = 0.0
+        self.last_lon = 0.0
+        self.last_speed = 0.0
+        self.last_gps_time: Optional[datetime] = None
+        self.has_position = False
+        self.messages = 0
+        self.positions = 0
+        self.filtered = 0
+        self.last_seen = 0.0
+
+    def remember_position(self, latitude: float, longitude: float, speed: float,
+                          gps_time: Optional[datetime]) -> None:
+        """Guarda la última posición válida (referencia para los filtros de calidad)."""
+        self.last_lat = latitude
+        self.last_lon = longitude
+        self.last_speed = speed
+        self.last_gps_time = gps_time
+        self.has_position = True
+        self.positions += 1
+
+    def as_dict(self) -> Dict:
+        return {
+            "device_id": self.device_id,
+            "rpg_id": self.rpg_id,
+            "protocol": self.protocol,
+            "client_id": self.client_id,
+            "last_lat": self.last_lat,
+            "last_lon": self.last_lon,
+            "last_gps_time": self.last_gps_time.isoformat() if self.last_gps_time else None,
+            "messages": self.messages,
+            "positions": self.positions,
+            "filtered": self.filtered,
+            "last_seen": self.last_seen,
+        }
+
+
+class _Stripe:
+    __slots__ = ("lock", "sessions")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, DeviceSession] = {}
+
+
+class SessionTable:
+    """Sesiones por equipo con lock striping por hash del ID."""
+
+    def __init__(self, stripes: int = DEFAULT_STRIPES):
+        self._stripes = [_Stripe() for _ in range(max(1, int(stripes)))]
+        # Último equipo visto (solo informativo: status / health)
+        self.last_device_id = ""
+
+    def _stripe(self, device_id: str) -> _Stripe:
+        return self._stripes[hash(device_id) % len(self._stripes)]
+
+    @contextmanager
+    def session(self, device_id: str, client_id: str = "", protocol: str = "") -> Iterator[DeviceSession]:
+        """
+        Entrega la sesión del equipo (creándola si no existe) con el lock de su franja
+        tomado durante el bloque `with`.
+        """
+        stripe = self._stripe(device_id)
+        with stripe.lock:
+            sess = stripe.sessions.get(device_id)
+            if sess is None:
+                sess = DeviceSession(device_id)
+                stripe.sessions[device_id] = sess
+            if client_id:
+                sess.client_id = client_id
+            if protocol:
+                sess.protocol = protocol
+            sess.last_seen = time.time()
+            self.last_device_id = device_id
+            yield sess
+
+    def touch(self, device_id: str, client_id: str = "", protocol: str = "") -> str:
+        """Registra un mensaje del equipo y devuelve su ID RPG (5 dígitos)."""
+        with self.session(device_id, client_id, protocol) as sess:
+            sess.messages += 1
+            return sess.rpg_id
+
+    def get(self, device_id: str) -> Optional[DeviceSession]:
+        stripe = self._stripe(device_id)
+        with stripe.lock:
+            return stripe.sessions.get(device_id)
+
+    def remove_idle(self, max_idle_seconds: float) -> int:
+        """Elimina sesiones sin mensajes hace más de `max_idle_seconds`. Devuelve cuántas."""
+        cutoff = time.time() - max_idle_seconds
+        removed = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                stale = [k for k, s in stripe.sessions.items() if s.last_seen < cutoff]
+                for k in stale:
+                    del stripe.sessions[k]
+                removed += len(stale)
+        return removed
+
+    def snapshot(self) -> List[Dict]:
+        out: List[Dict] = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                out.extend(s.as_dict() for s in stripe.sessions.values())
+        return out
+
+    def __len__(self) -> int:
+        return sum(len(s.sessions) for s in self._stripes)
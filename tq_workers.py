@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Modo multi-proceso del servidor TQ con SO_REUSEPORT.
+
+El supervisor lanza N procesos worker; cada uno crea su propio `TQServerRPG` y hace
+bind del mismo puerto (5003) con SO_REUSEPORT, así el kernel reparte las conexiones
+de los equipos entre procesos (y núcleos). El supervisor:
+  - reinicia los workers que terminan inesperadamente,
+  - atiende /health (puerto 5004) sumando los contadores de todos los workers,
+  - envía el heartbeat UDP al monitor con los totales.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import HTTPServer
+from typing import Dict, List, Optional
+
+# Cada cuánto un worker publica sus contadores al supervisor
+STATUS_INTERVAL_SECONDS = 2.0
+# Reinicio de workers caídos: espera inicial y máxima (backoff si caen enseguida)
+RESTART_DELAY_SECONDS = 1.0
+RESTART_DELAY_MAX_SECONDS = 30.0
+# Un worker que vivió menos que esto se considera "caída rápida" (aumenta el backoff)
+FAST_CRASH_SECONDS = 10.0
+
+
+def _worker_main(index: int, server_kwargs: Dict, status_queue) -> None:
+    """Punto de entrada de cada proceso worker."""
+    from tq_server_rpg import TQServerRPG
+
+    def _on_sigterm(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _on_sigterm)
+
+    kwargs = dict(server_kwargs)
+    # El puerto de health y el heartbeat los atiende el supervisor
+    kwargs.update(reuse_port=True, health_port=0, heartbeat_enabled=False, notify_on_stop=False)
+    # Cada worker tiene su propio spool de reenvíos (los segmentos no se comparten entre procesos)
+    if kwargs.get('spool_dir') != '':
+        base_spool = kwargs.get('spool_dir') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool')
+        kwargs['spool_dir'] = os.path.join(base_spool, f'worker{index}')
+    # Ídem la captura binaria de paquetes (packet_capture.py mezcla las carpetas al leer)
+    if kwargs.get('capture_dir'):
+        kwargs['capture_dir'] = os.path.join(kwargs['capture_dir'], f'worker{index}')
+    # Los logs diarios los archiva el supervisor (uno solo para todos los procesos)
+    kwargs['log_cleanup'] = False
+    server = TQServerRPG(**kwargs)
+
+    stop_event = threading.Event()
+
+    def _publish_status() -> None:
+        while not stop_event.wait(STATUS_INTERVAL_SECONDS):
+            try:
+                st = server.get_status()
+                status_queue.put_nowait({
+                    'worker': index,
+                    'pid': multiprocessing.current_process().pid,
+                    'running': st['running'],
+                    'connected_clients': st['connected_clients'],
+                    'total_messages': st['total_messages'],
+                    'filtered_positions': st['filtered_positions'],
+                    'device_sessions': st.get('device_sessions', 0),
+                    'terminal_id': st['terminal_id'],
+                    'uptime_seconds': st['uptime_seconds'],
+                    'forwarding': st.get('forwarding', {}),
+                    'packet_capture': st.get('packet_capture'),
+                    'updated': time.time(),
+                })
+            except Exception:
+                pass
+
+    publisher = threading.Thread(target=_publish_status, daemon=True)
+    publisher.start()
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.stop()
+
+
+class WorkerSupervisor:
+    """Lanza, vigila y reinicia los procesos worker; agrega sus contadores para /health."""
+
+    def __init__(self, workers: int, server_kwargs: Dict, health_port: int = 5004):
+        self.workers = max(1, int(workers))
+        self.server_kwargs = dict(server_kwargs)
+        self.health_port = health_port
+        self.heartbeat_enabled = bool(self.server_kwargs.get('heartbeat_enabled', True))
+        self.heartbeat_udp_host = self.server_kwargs.get('heartbeat_udp_host', '127.0.0.1')
+        self.heartbeat_udp_port = int(self.server_kwargs.get('heartbeat_udp_port', 9001))
+        self.heartbeat_interval_seconds = int(self.server_kwargs.get('heartbeat_interval_seconds', 300))
+        self.port = int(self.server_kwargs.get('port', 5003))
+
+        self._ctx = multiprocessing.get_context('spawn')
+        self._status_queue = self._ctx.Queue()
+        self._procs: List[Optional[multiprocessing.process.BaseProcess]] = [None] * self.workers
+        self._started_at: List[float] = [0.0] * self.workers
+        self._restart_delay: List[float] = [RESTART_DELAY_SECONDS] * self.workers
+        self._restart_at: List[float] = [0.0] * self.workers
+        self._restarts = [0] * self.workers
+        self._worker_status: Dict[int, Dict] = {}
+        self._status_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.health_server = None
+        self.running = False
+        self.start_time: Optional[datetime] = None
+        self.log_archiver = None
+        self.logger = self._setup_logging()
+
+    @staticmethod
+    def _setup_logging() -> logging.Logger:
+        import funciones
+        import log_writer
+
+        logger = logging.getLogger('TQServerRPG.supervisor')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            fh = log_writer.DailyLogHandler(funciones.DAILY_LOG_PATTERN)
+            fh.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s',
+                                              datefmt='%Y-%m-%d %H:%M:%S'))
+            logger.addHandler(fh)
+        return logger
+
+    def _spawn(self, index: int) -> None:
+        p = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.server_kwargs, self._status_queue),
+            name=f"tq-worker-{index}",
+            daemon=False,
+        )
+        p.start()
+        self._procs[index] = p
+        self._started_at[index] = time.monotonic()
+        self.logger.info(f"Worker {index} iniciado (PID {p.pid})")
+        print(f"👷 Worker {index} iniciado (PID {p.pid})")
+
+    def _drain_status(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                st = self._status_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self._status_lock:
+                self._worker_status[st['worker']] = st
+
+    def _check_workers(self) -> None:
+        now = time.monotonic()
+        for i, p in enumerate(self._procs):
+            if p is not None and p.is_alive():
+                continue
+            if p is not None:
+                lived = now - self._started_at[i]
+                self.logger.error(f"Worker {i} (PID {p.pid}) terminó con código {p.exitcode}; se reinicia")
+                print(f"⚠️  Worker {i} terminó (código {p.exitcode}) - reiniciando")
+                if lived < FAST_CRASH_SECONDS:
+                    self._restart_delay[i] = min(self._restart_delay[i] * 2, RESTART_DELAY_MAX_SECONDS)
+                else:
+                    self._restart_delay[i] = RESTART_DELAY_SECONDS
+                self._restart_at[i] = now + self._restart_delay[i]
+                self._procs[i] = None
+                with self._status_lock:
+                    self._worker_status.pop(i, None)
+            if now >= self._restart_at[i]:
+                if self._started_at[i]:
+                    self._restarts[i] += 1
+                self._spawn(i)
+
+    def get_status(self) -> Dict:
+        """Estado agregado de todos los workers (mismo formato que TQServerRPG.get_status)."""
+        with self._status_lock:
+            per_worker = [dict(v) for _, v in sorted(self._worker_status.items())]
+        uptime_seconds = 0
+        if self.start_time:
+            uptime_seconds = int((datetime.now() - self.start_time).total_seconds())
+        last = max(per_worker, key=lambda w: w.get('updated', 0), default={})
+        for w in per_worker:
+            w['restarts'] = self._restarts[w['worker']]
+        return {
+            'running': self.running,
+            'port': self.port,
+            'uptime_seconds': uptime_seconds,
+            'connected_clients': sum(w.get('connected_clients', 0) for w in per_worker),
+            'total_messages': sum(w.get('total_messages', 0) for w in per_worker),
+            'filtered_positions': sum(w.get('filtered_positions', 0) for w in per_worker),
+            'device_sessions': sum(w.get('device_sessions', 0) for w in per_worker),
+            'terminal_id': last.get('terminal_id', ''),
+            'workers': per_worker,
+        }
+
+    def _start_health_server(self) -> None:
+        if not self.health_port:
+            return
+        from tq_server_rpg import build_health_handler
+
+        try:
+            self.health_server = HTTPServer(('0.0.0.0', self.health_port), build_health_handler(self))
+        except Exception as e:
+            self.logger.error(f"Error iniciando health check server: {e}")
+            print(f"⚠️  No se pudo iniciar health check server: {e}")
+            return
+        t = threading.Thread(target=self.health_server.serve_forever, daemon=True)
+        t.start()
+        print(f"💚 Health check endpoint: http://localhost:{self.health_port}/health")
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop_event.wait(self.heartbeat_interval_seconds):
+            st = self.get_status()
+            heartbeat_data = {
+                'timestamp': datetime.now().isoformat(),
+                'server_id': 'tq_server_rpg',
+                'status': 'running' if self.running else 'stopped',
+                'uptime_seconds': st['uptime_seconds'],
+                'port': self.port,
+                'clients': st['connected_clients'],
+                'messages': st['total_messages'],
+                'workers': len(st['workers']),
+            }
+            try:
+                with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                    sock.sendto(json.dumps(heartbeat_data).encode('utf-8'),
+                                (self.heartbeat_udp_host, self.heartbeat_udp_port))
+            except Exception as e:
+                self.logger.debug(f"Error enviando heartbeat (monitor puede no estar disponible): {e}")
+
+    def run(self) -> None:
+        """Bloquea hasta SIGTERM/SIGINT; luego detiene los workers."""
+        def _on_sigterm(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, _on_sigterm)
+
+        self.running = True
+        self.start_time = datetime.now()
+        print(f"🚀 Supervisor: {self.workers} workers en puerto {self.port} (SO_REUSEPORT)")
+        threading.Thread(target=self._drain_status, daemon=True).start()
+        self._start_health_server()
+        if self.heartbeat_enabled:
+            threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+        if self.server_kwargs.get('log_cleanup', True):
+            from log_archive import LogArchiver
+
+            archive_days = int(self.server_kwargs.get('log_archive_days', 365))
+            self.log_archiver = LogArchiver.for_days(("logs", "logsUDP"), archive_days, logger=self.logger)
+            self.log_archiver.start()
+        try:
+            while self.running:
+                self._check_workers()
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            print("\n🛑 Interrupción detectada...")
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        self.running = False
+        self._stop_event.set()
+        for p in self._procs:
+            if p is not None and p.is_alive():
+                p.terminate()
+        for p in self._procs:
+            if p is not None:
+                p.join(timeout=10.0)
+                if p.is_alive():
+                    p.kill()
+        if self.log_archiver is not None:
+            self.log_archiver.stop()
+        if self.health_server:
+            try:
+                self.health_server.shutdown()
+            except Exception:
+                pass
+        self.logger.info("Supervisor detenido")
+        print("🛑 Supervisor detenido")
+
+
+def reuse_port_supported() -> bool:
+    return hasattr(socket, 'SO_REUSEPORT') and sys.platform.startswith('linux')
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Envío UDP compartido: un socket `connect()`eado por destino y envío en ráfagas.
+
+Antes cada datagrama creaba un socket, hacía `sendto` (resolución de ruta por envío) y lo
+cerraba. `UdpSender` mantiene un socket UDP no bloqueante conectado por `(ip, puerto)`:
+el kernel fija la ruta una sola vez y cada envío es un `send()` directo.
+
+`send()` solo encola el datagrama y vuelve enseguida (nunca bloquea la lectura de los
+equipos). Un thread dedicado vacía la cola en ráfagas de hasta `batch_max` datagramas.
+Si el kernel no tiene buffer (EAGAIN/EWOULDBLOCK/ENOBUFS), el resto de la ráfaga vuelve
+al frente de la cola y el thread espera unos milisegundos antes de reintentar; un
+datagrama que falla `MAX_ATTEMPTS` veces se descarta y se cuenta como error. Si la cola
+llega a `queue_max`, el datagrama nuevo se descarta (contador `dropped`).
+
+Con un socket conectado, un ICMP "port unreachable" de un envío anterior aparece como
+ECONNREFUSED en el siguiente `send()`: se cuenta como error y se reintenta ese datagrama.
+
+Cada destino tiene un circuit breaker (`circuit_breaker.py`) alimentado por esos errores:
+con el circuito abierto `send()` descarta el datagrama enseguida (devuelve False) en vez
+de encolarlo para un destino que no responde. Como el rechazo de un datagrama se conoce
+recién en el envío siguiente, un envío solo cuenta como éxito si el siguiente no falla.
+"""
+
+from __future__ import annotations
+
+import errno
+import select
+import socket
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from circuit_breaker import CircuitBreaker
+
+DEFAULT_QUEUE_MAX = 50000
+DEFAULT_BATCH_MAX = 256
+# Intentos por datagrama ante buffer lleno / error transitorio
+MAX_ATTEMPTS = 3
+# Espera cuando el kernel no tiene buffer (segundos)
+BACKPRESSURE_WAIT = 0.005
+
+Address = Tuple[str, int]
+
+_RETRY_ERRNOS = {errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS}
+
+
+class _Destination:
+    __slots__ = ("sock", "breaker", "last_ok", "sent", "errors", "dropped", "retries", "last_error")
+
+    def __init__(self):
+        self.sock: Optional[socket.socket] = None
+        self.breaker = CircuitBreaker()
+        # El envío anterior por este socket no devolvió error
+        self.last_ok = False
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.retries = 0
+        self.last_error = ""
+
+    def close(self) -> None:
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+class UdpSender:
+    """Cola de datagramas + thread de envío con sockets conectados por destino."""
+
+    def __init__(self, queue_max: int = DEFAULT_QUEUE_MAX, batch_max: int = DEFAULT_BATCH_MAX):
+        self.queue_max = queue_max
+        self.batch_max = batch_max
+        # (destino, datagrama, intentos)
+        self._queue: Deque[Tuple[Address, bytes, int]] = deque()
+        self._cond = threading.Condition()
+        self._dests: Dict[Address, _Destination] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._in_flight = 0
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def send(self, host: str, port: int, data: bytes) -> bool:
+        """Encola un datagrama. Devuelve False si se descartó (cola llena o circuito abierto)."""
+        addr = (host, int(port))
+        dest = self._dests.get(addr)
+        if dest is not None and not dest.breaker.allow():
+            return False
+        with self._cond:
+            if len(self._queue) >= self.queue_max:
+                self._dest(addr).dropped += 1
+                return False
+            self._queue.append((addr, data, 0))
+            if not self._running:
+                self._start()
+            self._cond.notify()
+        return True
+
+    def flush(self, timeout: float = 1.0) -> bool:
+        """Espera a que la cola se vacíe (True) o a que venza `timeout` (False)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    return not self._queue and not self._in_flight
+                self._cond.wait(min(remaining, 0.05))
+        return True
+
+    def close(self, timeout: float = 1.0) -> None:
+        """Vacía la cola (hasta `timeout`), detiene el thread y cierra los sockets."""
+        self.flush(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+        with self._cond:
+            for dest in self._dests.values():
+                dest.close()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Contadores por destino (`ip:puerto`)."""
+        with self._cond:
+            return {
+                f"{host}:{port}": {
+                    "sent": d.sent,
+                    "errors": d.errors,
+                    "dropped": d.dropped,
+                    "retries": d.retries,
+                    "last_error": d.last_error,
+                    "circuit": {
+                        k: v for k, v in d.breaker.snapshot().items() if k != "connect_timeout_s"
+                    },
+                }
+                for (host, port), d in self._dests.items()
+            }
+
+    def queue_size(self) -> int:
+        return len(self._queue)
+
+    # ------------------------------------------------------------------
+    # Thread de envío
+    # ------------------------------------------------------------------
+
+    def _dest(self, addr: Address) -> _Destination:
+        dest = self._dests.get(addr)
+        if dest is None:
+            dest = _Destination()
+            self._dests[addr] = dest
+        return dest
+
+    def _start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="udp-sender", daemon=True)
+        self._thread.start()
+
+    def _socket_for(self, addr: Address, dest: _Destination) -> socket.socket:
+        if dest.sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.connect(addr)
+                sock.setblocking(False)
+            except OSError:
+                sock.close()
+                raise
+            dest.sock = sock
+        return dest.sock
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and self._running:
+                    self._cond.wait()
+                if not self._queue and not self._running:
+                    return
+                n = min(len(self._queue), self.batch_max)
+                batch = [self._queue.popleft() for _ in range(n)]
+                self._in_flight = n
+            blocked_on = self._send_batch(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+            if blocked_on is not None:
+                # Buffer del kernel lleno: esperar a que el socket sea escribible
+                try:
+                    select.select([], [blocked_on], [], BACKPRESSURE_WAIT)
+                except (OSError, ValueError):
+                    time.sleep(BACKPRESSURE_WAIT)
+
+    def _send_batch(self, batch) -> Optional[socket.socket]:
+        """Envía la ráfaga. Si el kernel no acepta más, reencola el resto y devuelve el socket."""
+        for i, (addr, data, attempts) in enumerate(batch):
+            dest = self._dests.get(addr)
+            if dest is None:
+                with self._cond:
+                    dest = self._dest(addr)
+            sock = None
+            try:
+                sock = self._socket_for(addr, dest)
+                sock.send(data)
+                dest.sent += 1
+                # Un ECONNREFUSED llega en el envío siguiente: un envío cuenta como exitoso
+                # para el circuito recién cuando el próximo tampoco falla
+                if dest.last_ok:
+                    dest.breaker.record_success()
+                dest.last_ok = True
+                continue
+            except OSError as e:
+                err = e.errno
+                dest.last_error = str(e)
+                if err in _RETRY_ERRNOS and attempts + 1 < MAX_ATTEMPTS:
+                    dest.retries += 1
+                    rest = [(addr, data, attempts + 1)] + batch[i + 1:]
+                    with self._cond:
+                        self._queue.extendleft(reversed(rest))
+                    return sock
+                dest.errors += 1
+                dest.last_ok = False
+                dest.breaker.record_failure(str(e))
+                if err == errno.ECONNREFUSED and attempts + 1 < MAX_ATTEMPTS:
+                    # Error diferido de un envío anterior: este datagrama no salió
+                    with self._cond:
+                        self._queue.appendleft((addr, data, attempts + 1))
+                    continue
+                if err not in _RETRY_ERRNOS:
+                    # Socket en mal estado (ruta, DNS, etc.): se reabre en el próximo envío
+                    dest.close()
+        return None
+
+
+_sender: Optional[UdpSender] = None
+_sender_lock = threading.Lock()
+
+
+def get_sender() -> UdpSender:
+    """Instancia compartida por proceso (servidor TQ, relay GEO5, funciones)."""
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = UdpSender()
+    return _sender